@@ -47,6 +47,9 @@ def restore_points():
             "lat_matched": lat,
             "lon_matched": lon,
             "roughness": roughness,
+            # neue numerische Felder (fehlen in alten Backups -> None)
+            "condition_code": row.get("condition_code"),
+            "iri": row.get("iri"),
         }
 
         resp = requests.post(f"{BASE_URL}/track_points", json=payload)
@@ -0,0 +1,283 @@
+import argparse
+import math
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+
+import import_roadlab_csv as importer
+
+# ============================================================
+# Verdichtung: track_point -> track_point_tile (+ Archiv)
+# ============================================================
+#
+# Jede Fahrt über dieselbe Straße hängt neue, fast gleiche Zeilen an
+# track_point an. Dieser Job fasst alle Punkte einer kleinen metrischen
+# Kachel (Standard 10 m x 10 m) zu einer Zeile in track_point_tile
+# zusammen: mittlere Position, neuester und schlechtester Zustand,
+# mittlere/maximale IRI und Anzahl Messungen. Eingearbeitete Rohpunkte
+# werden in track_point als compacted markiert.
+#
+#   python compact_track_points.py                 # neue Punkte einarbeiten
+#   python compact_track_points.py --rebuild       # Kacheln komplett neu (z. B. andere --tile-m)
+#   python compact_track_points.py --archive       # zusätzlich Rohpunkte nach track_point_archive
+#
+# Serviert wird der Zustand der NEUESTEN Messung (recorded_at = Zeit der
+# Fahrt): eine reparierte Straße wird so wieder besser. Der schlechteste
+# Zustand aller Fahrten steht nur zur Info in worst_code.
+#
+# Die API liest mit POINT_TABLE=track_point_tile nur noch die Kacheln (ein
+# Punkt pro Kachel statt einer pro Fahrt); neue Importe sind dann erst
+# nach dem nächsten Lauf sichtbar. --archive leert track_point und ist
+# deshalb nur erlaubt, wenn POINT_TABLE=track_point_tile gesetzt ist –
+# sonst hätten /road_state, /db_points und show_route2_DB keine Punkte mehr.
+
+DEFAULT_TILE_M = 10.0
+TILE_TABLE = "track_point_tile"
+FETCH_SIZE = 50_000
+EARTH_RADIUS_M = 6371000.0
+
+RAW_COLUMNS = "lat_matched, lon_matched, roughness, iri, condition_code, speed_kmh, interval_id, recorded_at"
+
+POINTS_SQL = """
+    SELECT lat_matched, lon_matched, condition_code, iri, extract(epoch FROM recorded_at)
+    FROM {table}
+    WHERE lat_matched IS NOT NULL
+      AND lon_matched IS NOT NULL
+      {pending}
+"""
+
+# Neuester Zustand gewinnt (undatierte Zeilen zählen als älteste Messung)
+UPSERT_TILES_SQL = """
+    INSERT INTO track_point_tile AS t (
+        tile_x, tile_y, tile_m, lat_matched, lon_matched,
+        condition_code, worst_code, latest_at,
+        iri, iri_max, iri_count, sample_count
+    )
+    VALUES %s
+    ON CONFLICT (tile_x, tile_y) DO UPDATE SET
+        lat_matched    = (t.lat_matched * t.sample_count + EXCLUDED.lat_matched * EXCLUDED.sample_count)
+                         / (t.sample_count + EXCLUDED.sample_count),
+        lon_matched    = (t.lon_matched * t.sample_count + EXCLUDED.lon_matched * EXCLUDED.sample_count)
+                         / (t.sample_count + EXCLUDED.sample_count),
+        condition_code = CASE WHEN t.latest_at IS NULL OR EXCLUDED.latest_at >= t.latest_at
+                              THEN EXCLUDED.condition_code ELSE t.condition_code END,
+        worst_code     = GREATEST(t.worst_code, EXCLUDED.worst_code),
+        latest_at      = GREATEST(t.latest_at, EXCLUDED.latest_at),
+        iri            = CASE WHEN t.iri_count + EXCLUDED.iri_count = 0 THEN NULL
+                              ELSE (COALESCE(t.iri, 0) * t.iri_count + COALESCE(EXCLUDED.iri, 0) * EXCLUDED.iri_count)
+                                   / (t.iri_count + EXCLUDED.iri_count) END,
+        iri_max        = GREATEST(t.iri_max, EXCLUDED.iri_max),
+        iri_count      = t.iri_count + EXCLUDED.iri_count,
+        sample_count   = t.sample_count + EXCLUDED.sample_count,
+        updated_at     = now()
+"""
+
+# Eingearbeitete Rohpunkte markieren (track_point ist währenddessen für
+# Schreiber gesperrt, es kommen also keine ungelesenen Zeilen dazu). Das
+# Flag ändert keinen Zustand -> ohne NOTIFY an die API (skip_notify, siehe
+# track_point_notify() in track_point_schema.sql).
+MARK_COMPACTED_SQL = """
+    SET LOCAL track_point.skip_notify = 'on';
+    UPDATE track_point SET compacted = true WHERE NOT compacted;
+    SET LOCAL track_point.skip_notify = 'off';
+"""
+
+# Eingearbeitete Rohpunkte in einem Schritt verschieben
+ARCHIVE_SQL = f"""
+    WITH moved AS (
+        DELETE FROM track_point
+        WHERE compacted
+        RETURNING {RAW_COLUMNS}
+    )
+    INSERT INTO track_point_archive ({RAW_COLUMNS})
+    SELECT {RAW_COLUMNS} FROM moved
+"""
+
+
+def tile_keys(lat, lon, tile_m):
+    """
+    Kachel (tile_x, tile_y) je Punkt. Zeilen sind tile_m hoch; die Breite
+    einer Spalte wird mit dem cos der Zeilenmitte gerechnet, damit die
+    Kacheln überall etwa quadratisch sind – unabhängig vom Datensatz, also
+    über mehrere Läufe stabil.
+    """
+    y_m = np.radians(lat) * EARTH_RADIUS_M
+    tile_y = np.floor(y_m / tile_m).astype(np.int64)
+    row_phi = (tile_y + 0.5) * tile_m / EARTH_RADIUS_M
+    x_m = np.radians(lon) * EARTH_RADIUS_M * np.cos(row_phi)
+    tile_x = np.floor(x_m / tile_m).astype(np.int64)
+    return tile_x, tile_y
+
+
+def aggregate_tiles(lat, lon, code, iri, recorded, tile_m):
+    """
+    Eine Zeile pro Kachel (Arrays gleicher Länge, Reihenfolge wie in
+    UPSERT_TILES_SQL). code: condition_code (NULL -> 0), iri/recorded:
+    NaN = unbekannt, recorded in Sekunden seit 1970.
+    """
+    tile_x, tile_y = tile_keys(lat, lon, tile_m)
+    keys = np.stack((tile_x, tile_y), axis=1)
+    uniq, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    n = len(uniq)
+
+    lat_mean = np.bincount(inverse, lat, n) / counts
+    lon_mean = np.bincount(inverse, lon, n) / counts
+
+    worst = np.zeros(n, dtype=np.int16)
+    np.maximum.at(worst, inverse, code)
+
+    has_iri = ~np.isnan(iri)
+    iri_count = np.bincount(inverse[has_iri], minlength=n)
+    iri_sum = np.bincount(inverse[has_iri], iri[has_iri], n)
+    iri_mean = np.full(n, np.nan)
+    np.divide(iri_sum, iri_count, out=iri_mean, where=iri_count > 0)
+    iri_max = np.full(n, -np.inf)
+    np.maximum.at(iri_max, inverse[has_iri], iri[has_iri])
+    iri_max[iri_count == 0] = np.nan
+
+    # Neueste Messung je Kachel: sortiert nach (Kachel, Zeit, Code) ist es
+    # der letzte Eintrag; bei gleicher Zeit gewinnt der schlechtere Code.
+    rec = np.where(np.isnan(recorded), -np.inf, recorded)
+    order = np.lexsort((code, rec, inverse))
+    last = order[np.r_[np.flatnonzero(np.diff(inverse[order])), len(order) - 1]]
+
+    return {
+        "tile_x": uniq[:, 0], "tile_y": uniq[:, 1],
+        "lat": lat_mean, "lon": lon_mean,
+        "worst": worst, "latest_code": code[last], "latest_at": rec[last],
+        "iri": iri_mean, "iri_max": iri_max, "iri_count": iri_count,
+        "count": counts,
+    }
+
+
+def fetch_points(cur, table, pending_only=False):
+    """
+    Punkte aus table als Arrays (lat, lon, code, iri, recorded).
+    pending_only: nur noch nicht eingearbeitete Zeilen (nur track_point).
+    """
+    cur.execute(POINTS_SQL.format(table=table, pending="AND NOT compacted" if pending_only else ""))
+    chunks = []
+    while True:
+        rows = cur.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.float64))   # None -> NaN
+
+    data = np.concatenate(chunks) if chunks else np.empty((0, 5))
+    code = np.nan_to_num(data[:, 2], nan=0).astype(np.int16)
+    return data[:, 0], data[:, 1], code, data[:, 3], data[:, 4]
+
+
+def tile_rows(tiles, tile_m):
+    """Arrays aus aggregate_tiles -> Tupel für execute_values (NaN -> NULL)."""
+    def opt(v):
+        return None if math.isnan(v) or math.isinf(v) else float(v)
+
+    def ts(v):
+        return None if math.isinf(v) else datetime.fromtimestamp(v, timezone.utc)
+
+    for i in range(len(tiles["count"])):
+        yield (
+            int(tiles["tile_x"][i]), int(tiles["tile_y"][i]), tile_m,
+            float(tiles["lat"][i]), float(tiles["lon"][i]),
+            int(tiles["latest_code"][i]), int(tiles["worst"][i]), ts(tiles["latest_at"][i]),
+            opt(tiles["iri"][i]), opt(tiles["iri_max"][i]),
+            int(tiles["iri_count"][i]), int(tiles["count"][i]),
+        )
+
+
+def compact(conn, tile_m=DEFAULT_TILE_M, rebuild=False, archive=False):
+    """
+    Verdichtet track_point in track_point_tile (eine Transaktion, davor
+    das Schema in einer eigenen).
+    rebuild: Kacheln leeren und aus Archiv + ganz track_point neu berechnen,
+             sonst nur die noch nicht eingearbeiteten Zeilen.
+    archive: eingearbeitete Rohpunkte nach track_point_archive verschieben
+             (nur wenn die Server POINT_TABLE=track_point_tile lesen).
+    Rückgabe: (Anzahl gelesene Punkte, Anzahl Kacheln danach)
+    """
+    cur = conn.cursor()
+    # Schema in eigener Transaktion: ALTER/Trigger sperren track_point und
+    # track_point_tile exklusiv, das darf nicht bis zum Ende des Jobs halten
+    importer.ensure_schema(cur)
+    conn.commit()
+
+    # Importe warten, bis der Job fertig ist (Lesen bleibt möglich)
+    cur.execute("LOCK TABLE track_point IN SHARE ROW EXCLUSIVE MODE;")
+
+    cur.execute("SELECT DISTINCT tile_m FROM track_point_tile;")
+    sizes = {round(r[0], 3) for r in cur.fetchall()}
+    if not rebuild and sizes and sizes != {round(tile_m, 3)}:
+        raise SystemExit(f"track_point_tile hat Kachelgröße {sorted(sizes)} m, "
+                         f"angefordert {tile_m} m -> mit --rebuild neu aufbauen")
+
+    sources = ["track_point"]
+    if rebuild:
+        cur.execute("TRUNCATE track_point_tile;")
+        sources.insert(0, "track_point_archive")
+
+    read = 0
+    for table in sources:
+        pending_only = table == "track_point" and not rebuild
+        lat, lon, code, iri, recorded = fetch_points(cur, table, pending_only)
+        read += len(lat)
+        if len(lat):
+            tiles = aggregate_tiles(lat, lon, code, iri, recorded, tile_m)
+            execute_values(cur, UPSERT_TILES_SQL, tile_rows(tiles, tile_m), page_size=1000)
+
+    cur.execute(MARK_COMPACTED_SQL)
+    if archive:
+        cur.execute(ARCHIVE_SQL)
+
+    # Datenstand (/data_version) zählt der Trigger auf track_point_tile hoch
+    cur.execute("SELECT COUNT(*) FROM track_point_tile;")
+    tiles_total = cur.fetchone()[0]
+
+    conn.commit()
+    cur.close()
+    return read, tiles_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="track_point zu Kacheln verdichten")
+    parser.add_argument("--tile-m", type=float, default=DEFAULT_TILE_M,
+                        help="Kantenlänge einer Kachel in Metern")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Kacheln leeren und aus Archiv + track_point neu berechnen")
+    parser.add_argument("--archive", action="store_true",
+                        help="Rohpunkte nach track_point_archive verschieben "
+                             "(nur mit POINT_TABLE=track_point_tile)")
+    args = parser.parse_args()
+
+    # Die Server lesen POINT_TABLE (Standard track_point): ohne Umstellung
+    # würde das Archivieren ihre Datenquelle leeren
+    if args.archive and os.getenv("POINT_TABLE", "track_point") != TILE_TABLE:
+        raise SystemExit(f"--archive leert track_point; erst API/show_route2_DB auf "
+                         f"POINT_TABLE={TILE_TABLE} umstellen und hier ebenfalls setzen")
+
+    conn = psycopg2.connect(
+        host=importer.HOST,
+        port=importer.PORT,
+        dbname=importer.DBNAME,
+        user=importer.USER,
+        password=importer.PASSWORD,
+        sslmode="require",
+    )
+
+    t0 = time.perf_counter()
+    read, tiles_total = compact(conn, args.tile_m, rebuild=args.rebuild, archive=args.archive)
+    conn.close()
+
+    print(f"{read} Punkte verarbeitet, {tiles_total} Kacheln in track_point_tile "
+          f"({time.perf_counter() - t0:.2f} s)")
+
+    importer.reload_api_snapshot()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+import os
+
 import pandas as pd
 import psycopg2
 import numpy as np  # falls NumPy-Skalare vorkommen
+import requests
+from pathlib import Path
 
 
 HOST = "roadquality-db.ce9gmcmsmoc6.us-east-1.rds.amazonaws.com"
@@ -12,7 +16,53 @@ PASSWORD = "UAS2025!"
 #finde für mich den Pfad zur CSV-Datei mit den gematchten Punkten
 
 
-CSV_FILE = "c:\\Users\\alzub\\OneDrive - Frankfurt UAS\\MeRo2\\MERO_Code\\Python_Code\\Find_IRI\\RoadLabPro\\f_Link_0002_Path_2025_11_17_08_33_matched.csv"  # nur lat_matched, lon_matched, Roughness
+CSV_FILE = "c:\\Users\\alzub\\OneDrive - Frankfurt UAS\\MeRo2\\MERO_Code\\Python_Code\\Find_IRI\\RoadLabPro\\f_Link_0002_Path_2025_11_17_08_33_matched.csv"  # lat_matched, lon_matched, Roughness (+ iri, condition_code, speed_kmh, interval_id, recorded_at)
+
+# Intervall-Segmente aus match_osrm.py (eine Zeile pro RoadLab-Intervall)
+INTERVALS_CSV_FILE = CSV_FILE.replace("_Path_", "_Roughness_").replace("_matched.csv", "_intervals.csv")
+
+# Schema-Erweiterung (iri, condition_code, speed_kmh, interval_id, track_interval)
+SCHEMA_SQL = Path(__file__).resolve().parent / "track_point_schema.sql"
+
+# Road State API im Speicher-Modus (ROAD_STATE_MODE=memory): nach dem Import
+# neuen Snapshot anstoßen, z. B. API_BASE_URL=http://127.0.0.1:8000
+API_BASE_URL = os.getenv("API_BASE_URL", "")
+
+# Zeilen pro INSERT-Anweisung: der NOTIFY-Trigger auf track_point feuert
+# pro Anweisung, ein Import mit 100k Punkten ergibt so 100 statt 100k Meldungen
+INSERT_BATCH_ROWS = 1000
+
+TRACK_POINT_INSERT_SQL = """
+    INSERT INTO track_point (
+        lat_matched,
+        lon_matched,
+        roughness,
+        iri,
+        condition_code,
+        speed_kmh,
+        interval_id,
+        recorded_at
+    )
+    VALUES {values}
+"""
+TRACK_POINT_ROW = "(%s, %s, %s, %s, %s, %s, %s, %s)"
+
+# condition_code für Zeilen ohne Code aus dem Text in roughness ableiten
+# (gleiche Zuordnung wie in track_point_schema.sql). Nur dieses UPDATE läuft
+# in der Import-Transaktion; das Schema (ALTER/Trigger, exklusive Sperren)
+# wird vorher in einer eigenen Transaktion angelegt.
+BACKFILL_CODES_SQL = """
+    UPDATE track_point
+    SET condition_code = CASE upper(trim(roughness))
+            WHEN 'VERY GOOD' THEN 1
+            WHEN 'GOOD'      THEN 2
+            WHEN 'FAIR'      THEN 3
+            WHEN 'POOR'      THEN 4
+            WHEN 'VERY POOR' THEN 5
+            ELSE 0
+        END
+    WHERE condition_code IS NULL
+"""
 
 
 def to_float(v):
@@ -47,6 +97,120 @@ def to_py(v):
     return v
 
 
+def to_int(v):
+    """Wie to_float, aber als int (z. B. condition_code, interval_id)."""
+    f = to_float(v)
+    return None if f is None else int(f)
+
+
+def to_timestamp(v):
+    """Zeitstempel aus der CSV (z. B. '2025-11-17 08:32:40') als ISO-Text, sonst None."""
+    if v is None or (isinstance(v, float) and np.isnan(v)) or str(v).strip() == "":
+        return None
+    try:
+        return pd.Timestamp(str(v).strip()).isoformat(sep=" ")
+    except ValueError:
+        return None
+
+
+def ensure_schema(cur):
+    """Legt die zusätzlichen Spalten/Tabellen an und füllt condition_code für Altdaten."""
+    cur.execute(SCHEMA_SQL.read_text(encoding="utf-8"))
+
+
+def import_intervals(cur, csv_file):
+    """Intervall-Segmente (Start/Ende, Länge, IRI, Code) nach track_interval schreiben."""
+    if not Path(csv_file).exists():
+        print("Keine Intervall-CSV gefunden, überspringe:", csv_file)
+        return 0
+
+    df = pd.read_csv(csv_file)
+    cur.execute("DELETE FROM track_interval;")
+
+    inserted = 0
+    for row in df.itertuples(index=False):
+        cur.execute(
+            """
+            INSERT INTO track_interval (
+                interval_id, start_lat, start_lon, end_lat, end_lon,
+                length_m, iri, condition_code
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                to_int(row.interval_id),
+                to_float(row.start_lat), to_float(row.start_lon),
+                to_float(row.end_lat), to_float(row.end_lon),
+                to_float(row.length_m), to_float(row.Roughness),
+                to_int(row.condition_code) or 0,
+            ),
+        )
+        inserted += 1
+    return inserted
+
+
+def import_track_points(cur, df):
+    """
+    Schreibt die Zeilen der gematchten CSV nach track_point, je
+    INSERT_BATCH_ROWS Zeilen in einer Anweisung. Zeilen ohne lat/lon werden
+    übersprungen. Rückgabe: Anzahl Inserts.
+    """
+    inserted = 0
+    batch = []
+
+    def flush():
+        values = ", ".join([TRACK_POINT_ROW] * len(batch))
+        cur.execute(TRACK_POINT_INSERT_SQL.format(values=values),
+                    [v for params in batch for v in params])
+        batch.clear()
+
+    for _, row in df.iterrows():
+        lat_m = to_float(row.get("lat_matched"))
+        lon_m = to_float(row.get("lon_matched"))
+
+        roughness = row.get("Roughness")
+        # Roughness optional als Text bereinigen
+        if isinstance(roughness, str):
+            roughness = roughness.strip()
+            if roughness == "":
+                roughness = None
+        roughness = to_py(roughness)
+
+        # Falls lat/lon nicht vorhanden, Zeile überspringen
+        if lat_m is None or lon_m is None:
+            continue
+
+        # Numerische Werte (ältere CSVs ohne diese Spalten -> NULL;
+        # condition_code wird dann per Backfill aus roughness gesetzt)
+        iri = to_float(row.get("iri"))
+        condition_code = to_int(row.get("condition_code"))
+        speed_kmh = to_float(row.get("speed_kmh"))
+        interval_id = to_int(row.get("interval_id"))
+        # Zeit der Fahrt (nicht des Imports): bestimmt den "neuesten" Zustand
+        # bei der Verdichtung (compact_track_points.py)
+        recorded_at = to_timestamp(row.get("recorded_at"))
+
+        batch.append((lat_m, lon_m, roughness, iri, condition_code, speed_kmh, interval_id, recorded_at))
+        inserted += 1
+        if len(batch) >= INSERT_BATCH_ROWS:
+            flush()
+
+    if batch:
+        flush()
+    return inserted
+
+
+def reload_api_snapshot():
+    """Snapshot der API neu laden lassen (nur wenn API_BASE_URL gesetzt ist)."""
+    if not API_BASE_URL:
+        return
+    try:
+        resp = requests.post(f"{API_BASE_URL}/snapshot/reload", timeout=60)
+        print("API-Snapshot neu geladen:", resp.status_code, resp.text)
+    except requests.RequestException as e:
+        print("API-Snapshot konnte nicht neu geladen werden:", e)
+
+
 def main():
     # -----------------------------------------------------------------
     # 0) CSV laden
@@ -73,6 +237,10 @@ def main():
     )
     cur = conn.cursor()
 
+    # Neue Spalten/Tabellen anlegen (idempotent)
+    ensure_schema(cur)
+    conn.commit()
+
     # -----------------------------------------------------------------
     # 1a) ALLE bestehenden track_point-Daten löschen
     # -----------------------------------------------------------------
@@ -87,46 +255,28 @@ def main():
     print("Zeilen in track_point nach dem Löschen:", count_after_delete)
 
     # -----------------------------------------------------------------
-    # 2) Track-Points importieren (nur 3 Spalten)
+    # 2) Track-Points importieren (Koordinaten, Kategorie + Messwerte)
     # -----------------------------------------------------------------
-    inserted = 0
+    inserted = import_track_points(cur, df)
 
-    for _, row in df.iterrows():
-        lat_m = to_float(row.get("lat_matched"))
-        lon_m = to_float(row.get("lon_matched"))
+    # condition_code für Zeilen ohne Code aus roughness ableiten
+    cur.execute(BACKFILL_CODES_SQL)
 
-        roughness = row.get("Roughness")
-        # Roughness optional als Text bereinigen
-        if isinstance(roughness, str):
-            roughness = roughness.strip()
-            if roughness == "":
-                roughness = None
-        roughness = to_py(roughness)
-
-        # Falls lat/lon nicht vorhanden, Zeile überspringen
-        if lat_m is None or lon_m is None:
-            continue
-
-        params = (lat_m, lon_m, roughness)
-
-        cur.execute(
-            """
-            INSERT INTO track_point (
-                lat_matched,
-                lon_matched,
-                roughness
-            )
-            VALUES (%s, %s, %s)
-            """,
-            params,
-        )
-        inserted += 1
+    # -----------------------------------------------------------------
+    # 3) Intervall-Segmente importieren
+    # -----------------------------------------------------------------
+    intervals = import_intervals(cur, INTERVALS_CSV_FILE)
 
+    # Datenstand (/data_version) zählt der Trigger auf track_point einmal
+    # pro Transaktion hoch (DELETE oben und Import hier je einmal)
     conn.commit()
     cur.close()
     conn.close()
 
     print(f"{inserted} Zeilen aus der CSV neu importiert.")
+    print(f"{intervals} Intervall-Segmente importiert.")
+
+    reload_api_snapshot()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+-- ============================================================
+-- track_point: numerische Messwerte statt nur Text-Kategorie
+-- ============================================================
+-- Kann beliebig oft ausgeführt werden (IF NOT EXISTS / nur NULL-Zeilen).
+
+ALTER TABLE track_point ADD COLUMN IF NOT EXISTS iri            REAL;      -- Roughness (IRI, m/km)
+ALTER TABLE track_point ADD COLUMN IF NOT EXISTS condition_code SMALLINT;  -- 0=NOT MEASURED .. 5=VERY POOR
+ALTER TABLE track_point ADD COLUMN IF NOT EXISTS speed_kmh      REAL;
+ALTER TABLE track_point ADD COLUMN IF NOT EXISTS interval_id    INTEGER;
+ALTER TABLE track_point ADD COLUMN IF NOT EXISTS recorded_at    TIMESTAMPTZ;  -- Zeit der Fahrt (Path "Time"), NULL = unbekannt
+ALTER TABLE track_point ADD COLUMN IF NOT EXISTS compacted      BOOLEAN NOT NULL DEFAULT false;  -- in track_point_tile eingearbeitet
+
+-- Erste Version hatte DEFAULT now(): das ist die Importzeit, nicht die Fahrtzeit
+ALTER TABLE track_point ALTER COLUMN recorded_at DROP DEFAULT;
+
+-- Altdaten: condition_code einmalig aus dem Text in roughness ableiten.
+-- Reihenfolge wie STATE_NAMES in FindeRoad/road_states.py.
+UPDATE track_point
+SET condition_code = CASE upper(trim(roughness))
+        WHEN 'VERY GOOD' THEN 1
+        WHEN 'GOOD'      THEN 2
+        WHEN 'FAIR'      THEN 3
+        WHEN 'POOR'      THEN 4
+        WHEN 'VERY POOR' THEN 5
+        ELSE 0
+    END
+WHERE condition_code IS NULL;
+
+CREATE INDEX IF NOT EXISTS track_point_lat_lon_idx ON track_point (lat_matched, lon_matched);
+
+-- ============================================================
+-- track_interval: eine Zeile pro RoadLab-Intervall (Start -> Ende)
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS track_interval (
+    id               SERIAL PRIMARY KEY,
+    interval_id      INTEGER  NOT NULL,
+    start_lat        DOUBLE PRECISION NOT NULL,
+    start_lon        DOUBLE PRECISION NOT NULL,
+    end_lat          DOUBLE PRECISION NOT NULL,
+    end_lon          DOUBLE PRECISION NOT NULL,
+    length_m         REAL,
+    iri              REAL,
+    condition_code   SMALLINT NOT NULL DEFAULT 0
+);
+
+-- ============================================================
+-- track_data_version: Datenstand von track_point (eine Zeile)
+-- ============================================================
+-- Wird vom Änderungs-Trigger (unten) einmal pro Transaktion hochgezählt,
+-- die track_point oder track_point_tile ändert. Clients (show_route2.py)
+-- nutzen den Wert über GET /data_version als Teil ihrer Cache-Schlüssel.
+
+CREATE TABLE IF NOT EXISTS track_data_version (
+    id          SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version     BIGINT      NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    bumped_txid BIGINT                                   -- Transaktion der letzten Erhöhung
+);
+
+ALTER TABLE track_data_version ADD COLUMN IF NOT EXISTS bumped_txid BIGINT;
+
+INSERT INTO track_data_version (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+-- ============================================================
+-- track_point_tile: verdichtete Punkte, einer pro Kachel
+-- ============================================================
+-- Wird von AWS_Creat/compact_track_points.py gefüllt. Gleiche
+-- Spaltennamen wie track_point (lat_matched, lon_matched, condition_code,
+-- iri), damit die API sie mit POINT_TABLE=track_point_tile direkt lesen
+-- kann. Die Größe wächst mit dem abgedeckten Straßennetz, nicht mit der
+-- Anzahl Fahrten.
+
+CREATE TABLE IF NOT EXISTS track_point_tile (
+    tile_x          INTEGER  NOT NULL,
+    tile_y          INTEGER  NOT NULL,
+    tile_m          REAL     NOT NULL,                   -- Kantenlänge der Kachel in Metern
+    lat_matched     DOUBLE PRECISION NOT NULL,           -- Mittelwert der Punkte
+    lon_matched     DOUBLE PRECISION NOT NULL,
+    condition_code  SMALLINT NOT NULL,                   -- Zustand der neuesten Messung (Serving-Wert)
+    worst_code      SMALLINT NOT NULL,                   -- schlechtester Zustand aller Fahrten (Info)
+    latest_at       TIMESTAMPTZ,                         -- Fahrtzeit der neuesten Messung
+    iri             REAL,                                -- Mittelwert (nur Punkte mit IRI)
+    iri_max         REAL,
+    iri_count       INTEGER  NOT NULL DEFAULT 0,
+    sample_count    INTEGER  NOT NULL,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (tile_x, tile_y)
+);
+
+-- Erste Version: condition_code = schlechtester, latest_code = neuester Zustand
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'track_point_tile' AND column_name = 'latest_code') THEN
+        ALTER TABLE track_point_tile RENAME COLUMN condition_code TO worst_code;
+        ALTER TABLE track_point_tile RENAME COLUMN latest_code TO condition_code;
+    END IF;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS track_point_tile_lat_lon_idx ON track_point_tile (lat_matched, lon_matched);
+
+-- ============================================================
+-- track_point_archive: verdichtete Rohpunkte
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS track_point_archive (
+    lat_matched     DOUBLE PRECISION,
+    lon_matched     DOUBLE PRECISION,
+    roughness       TEXT,
+    iri             REAL,
+    condition_code  SMALLINT,
+    speed_kmh       REAL,
+    interval_id     INTEGER,
+    recorded_at     TIMESTAMPTZ,
+    archived_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- ============================================================
+-- Änderungs-Benachrichtigung (LISTEN/NOTIFY)
+-- ============================================================
+-- Jede Anweisung, die track_point oder track_point_tile ändert, schickt
+-- auf Kanal 'track_point_changed' ein JSON mit Tabelle, Operation,
+-- Zeilenanzahl, neuem Datenstand (version) und der Bounding Box
+-- [min_lat, max_lat, min_lon, max_lon] der betroffenen Zeilen (null =
+-- alles, z. B. TRUNCATE). Die API (LISTEN_CHANGES=1) lädt dann nur dieses
+-- Gebiet neu. Zugestellt wird erst beim COMMIT.
+--
+-- track_data_version zählt der Trigger nur bei der ersten Anweisung einer
+-- Transaktion hoch (bumped_txid = txid_current()): ein Import mit vielen
+-- INSERT-Anweisungen ändert die Zeile so einmal, jede andere Änderung an
+-- track_point (auch ein DELETE von Hand) aber ebenfalls.
+-- Änderungen ohne Einfluss auf den Zustand (z. B. das compacted-Flag der
+-- Verdichtung) schicken keine Meldung, wenn der Schreiber vorher
+--   SET LOCAL track_point.skip_notify = 'on';
+-- setzt.
+-- Zum Testen:
+--   python FindeRoad/change_listener.py     # druckt alle Meldungen
+
+CREATE OR REPLACE FUNCTION track_point_notify() RETURNS trigger AS $$
+DECLARE
+    box     record;
+    ver     bigint;
+BEGIN
+    IF current_setting('track_point.skip_notify', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'TRUNCATE' THEN
+        SELECT NULL::float8 AS min_lat, NULL::float8 AS max_lat,
+               NULL::float8 AS min_lon, NULL::float8 AS max_lon, -1::bigint AS n
+        INTO box;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT min(lat_matched) AS min_lat, max(lat_matched) AS max_lat,
+               min(lon_matched) AS min_lon, max(lon_matched) AS max_lon, count(*) AS n
+        INTO box
+        FROM (SELECT lat_matched, lon_matched FROM changed_rows
+              UNION ALL
+              SELECT lat_matched, lon_matched FROM old_rows) r;
+    ELSE
+        SELECT min(lat_matched) AS min_lat, max(lat_matched) AS max_lat,
+               min(lon_matched) AS min_lon, max(lon_matched) AS max_lon, count(*) AS n
+        INTO box
+        FROM changed_rows;
+    END IF;
+
+    IF box.n = 0 THEN
+        RETURN NULL;   -- Anweisung hat keine Zeile geändert
+    END IF;
+
+    UPDATE track_data_version
+    SET version = version + 1, updated_at = now(), bumped_txid = txid_current()
+    WHERE id = 1 AND bumped_txid IS DISTINCT FROM txid_current();
+    SELECT version INTO ver FROM track_data_version WHERE id = 1;
+
+    PERFORM pg_notify('track_point_changed', json_build_object(
+        'table',   TG_TABLE_NAME,
+        'op',      lower(TG_OP),
+        'rows',    box.n,
+        'version', ver,
+        'bbox',    CASE WHEN box.min_lat IS NULL THEN NULL
+                        ELSE json_build_array(box.min_lat, box.max_lat, box.min_lon, box.max_lon) END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['track_point', 'track_point_tile'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_notify_insert', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_notify_update', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_notify_delete', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_notify_truncate', tbl);
+
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION track_point_notify()', tbl || '_notify_insert', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows OLD TABLE AS old_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION track_point_notify()', tbl || '_notify_update', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION track_point_notify()', tbl || '_notify_delete', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION track_point_notify()', tbl || '_notify_truncate', tbl);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+import synthetic
+
+# ============================================================
+# Lasttest für die Road State API (sync api.py oder api_async.py)
+# ============================================================
+#
+# Beispiel gegen eine lokale Postgres-DB:
+#   export DB_HOST=localhost DB_SSLMODE=disable
+#   python run_benchmarks.py --db postgres --only road_state   # füllt track_point
+#   uvicorn api_async:app --port 8001 --app-dir ../FindeRoad
+#   python load_test.py --url http://127.0.0.1:8001 --clients 1000 --requests 20
+#
+# Jeder Client schickt seine Requests nacheinander; alle Clients laufen
+# gleichzeitig. Ausgegeben werden Durchsatz, Fehler und Latenz-Perzentile.
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def client_loop(http, url, positions, n_requests, latencies, statuses, endpoint, batch_size):
+    for i in range(n_requests):
+        lat, lon = positions[i % len(positions)]
+        t0 = time.perf_counter()
+        try:
+            if endpoint == "batch":
+                body = {"points": [{"lat": la, "lon": lo} for la, lo in positions[:batch_size]]}
+                resp = await http.post(f"{url}/road_state/batch", json=body)
+            else:
+                resp = await http.get(f"{url}/road_state", params={"lat": lat, "lon": lon})
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+        except httpx.HTTPError as e:
+            key = type(e).__name__
+            statuses[key] = statuses.get(key, 0) + 1
+        latencies.append(time.perf_counter() - t0)
+
+
+async def run(url, clients, n_requests, endpoint, batch_size, timeout):
+    lats, lons, _, _ = synthetic.track_point_arrays(max(1000, clients))
+    positions = list(zip(lats.tolist(), lons.tolist()))
+
+    latencies = []
+    statuses = {}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as http:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(http, url, positions[c:] + positions[:c], n_requests,
+                        latencies, statuses, endpoint, batch_size)
+            for c in range(clients)
+        ))
+        elapsed = time.perf_counter() - t0
+
+    total = len(latencies)
+    return {
+        "url": url,
+        "endpoint": endpoint,
+        "clients": clients,
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(statistics.fmean(latencies) * 1000, 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest für /road_state")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=1000, help="gleichzeitige Clients")
+    parser.add_argument("--requests", type=int, default=10, help="Requests pro Client")
+    parser.add_argument("--endpoint", choices=["road_state", "batch"], default="road_state")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Ergebnis zusätzlich als JSON speichern")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.clients, args.requests, args.endpoint,
+                             args.batch_size, args.timeout))
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Module aus den Nachbarordnern importierbar machen
+BASE_DIR = Path(__file__).resolve().parent
+for sub in ("FindeRoad", "Find_IRI", "AWS_Creat"):
+    sys.path.insert(0, str(BASE_DIR.parent / sub))
+
+import synthetic
+import stubs
+
+# ============================================================
+# Benchmark-Suite für Matching, Preisberechnung und API-Lookups
+# ============================================================
+#
+# Aufruf (aus Python_Code/Benchmark):
+#   python run_benchmarks.py                       -> Preset "default"
+#   python run_benchmarks.py --preset quick
+#   python run_benchmarks.py --only road_state find_segment_state
+#   python run_benchmarks.py --compare results/alt.json results/neu.json
+#
+# Ergebnisse landen als JSON in results/<commit>_<preset>.json.
+
+RESULTS_DIR = BASE_DIR / "results"
+
+# Skalen pro Benchmark und Preset. "full" deckt 1k..10M Punkte und
+# 100..50k Routen-Vertices ab und läuft entsprechend lange.
+PRESETS = {
+    "quick": {
+        "find_segment_state": [1_000, 10_000],
+        "show_route_and_cost": [(1_000, 100)],
+        "road_state": [1_000, 10_000],
+        "match_chunk": [80],
+        "match_local": [2_000],
+        "match_pipeline": [1_000],
+        "csv_import": [1_000],
+    },
+    "default": {
+        "find_segment_state": [1_000, 10_000, 100_000],
+        "show_route_and_cost": [(1_000, 100), (10_000, 1_000)],
+        "road_state": [1_000, 100_000, 1_000_000],
+        "match_chunk": [80],
+        "match_local": [2_000, 20_000],
+        "match_pipeline": [1_000, 10_000],
+        "csv_import": [1_000, 10_000],
+    },
+    "full": {
+        "find_segment_state": [1_000, 10_000, 100_000, 1_000_000, 10_000_000],
+        "show_route_and_cost": [(1_000, 100), (10_000, 1_000), (100_000, 10_000), (1_000_000, 50_000)],
+        "road_state": [1_000, 100_000, 1_000_000, 10_000_000],
+        "match_chunk": [80],
+        "match_local": [2_000, 20_000, 200_000],
+        "match_pipeline": [1_000, 10_000, 100_000],
+        "csv_import": [1_000, 10_000, 100_000],
+    },
+}
+
+# Obergrenze für Punkt*Segment-Distanzberechnungen pro Messung, damit
+# find_segment_state bei 10M Punkten nicht stundenlang läuft
+MAX_DISTANCE_EVALS = 2_000_000
+
+ROAD_STATE_QUERIES = 200
+
+# "sqlite" (Standard) oder "postgres" (lokale DB aus DB_HOST/DB_PORT/...)
+DB_BACKEND = "sqlite"
+
+
+def measure(func, repeat):
+    """Führt func repeat-mal aus und gibt die Laufzeiten in Sekunden zurück."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def summarize(times, per=1):
+    """min/median/mean in Sekunden, optional pro Einheit (z. B. pro Query)."""
+    return {
+        "min_s": min(times) / per,
+        "median_s": statistics.median(times) / per,
+        "mean_s": statistics.fmean(times) / per,
+        "runs": len(times),
+    }
+
+
+# ============================================================
+# Einzelne Benchmarks
+# ============================================================
+
+def bench_find_segment_state(n_points, repeat, workdir):
+    import show_route2
+
+    route = synthetic.route_coords(200)
+    db_points = show_route2_points(synthetic.track_points(n_points, route=route))
+    lat0 = route[0][0]
+    n_segments = max(1, min(len(route) - 1, MAX_DISTANCE_EVALS // n_points))
+
+    def run():
+        for i in range(n_segments):
+            (lat1, lon1), (lat2, lon2) = route[i], route[i + 1]
+            show_route2.find_segment_state(lat1, lon1, lat2, lon2, db_points, lat0, 50.0)
+
+    result = summarize(measure(run, repeat), per=n_segments)
+    result.update({"points": n_points, "segments_per_run": n_segments, "unit": "per segment"})
+    return result
+
+
+def show_route2_points(raw):
+    """/db_points-Format -> interne Punktliste von show_route2 (wie load_db_points)."""
+    return [{"lat": p["lat"], "lon": p["lon"], "code": p["condition_code"]} for p in raw]
+
+
+def bench_show_route_and_cost(scale, repeat, workdir):
+    import show_route2
+
+    n_points, n_vertices = scale
+    route = synthetic.route_coords(n_vertices)
+    points = synthetic.track_points(n_points, route=route)
+    prices = {"VERY GOOD": 0.40, "GOOD": 0.50, "FAIR": 0.70, "POOR": 0.80, "VERY POOR": 0.90, "NOT MEASURED": 0.30}
+    multipliers = {"unknown": 1.0, "low": 1.0, "moderate": 1.2, "heavy": 1.5, "severe": 2.0}
+    congestion = ["low", "moderate", "heavy", "severe", "unknown"] * (n_vertices // 5 + 1)
+    routes_data = [{"coords": route, "congestion": congestion[:n_vertices - 1]}]
+    output_html = str(Path(workdir) / "route_map.html")
+
+    with stubs.api_stub(points) as api:
+        show_route2.API_BASE_URL = api.base_url
+
+        def run():
+            show_route2.show_route_and_cost(
+                routes_data, prices, traffic_multipliers=multipliers,
+                max_dist_m=50.0, output_html=output_html,
+            )
+
+        result = summarize(measure(run, repeat))
+
+    result.update({"points": n_points, "route_vertices": n_vertices, "unit": "per call"})
+    return result
+
+
+def bench_road_state(n_points, repeat, workdir):
+    import api
+
+    lats, lons, codes, iri = synthetic.track_point_arrays(n_points)
+    if DB_BACKEND == "postgres":
+        conn = stubs.postgres_track_points(api.DB_CONFIG, lats, lons, codes, iri)
+    else:
+        conn = stubs.sqlite_track_points(str(Path(workdir) / "road_state.sqlite"), lats, lons, codes, iri)
+    queries = list(zip(lats[:ROAD_STATE_QUERIES].tolist(), lons[:ROAD_STATE_QUERIES].tolist()))
+
+    original = api.get_db_connection
+    api.get_db_connection = lambda: conn
+    try:
+        def run():
+            for lat, lon in queries:
+                try:
+                    api.road_state(lat, lon, radius_m=50)
+                except api.HTTPException:
+                    pass
+
+        result = summarize(measure(run, repeat), per=len(queries))
+    finally:
+        api.get_db_connection = original
+        conn.really_close()
+
+    result.update({"points": n_points, "queries": len(queries), "db": DB_BACKEND, "unit": "per query"})
+    return result
+
+
+def bench_match_chunk(n_points, repeat, workdir):
+    import match_osrm
+    from roadlab_reader import iter_path_chunks
+
+    csv_path = Path(workdir) / "match_chunk_path.csv"
+    synthetic.write_roadlab_path_csv(csv_path, n_points)
+    chunk = next(iter_path_chunks(csv_path, n_points))
+
+    with stubs.osrm_stub() as osrm:
+        match_osrm.OSRM_BASE_URL = osrm.base_url
+        result = summarize(measure(lambda: match_osrm.match_chunk(chunk), repeat))
+
+    result.update({"points": len(chunk), "osrm": "stub", "unit": "per chunk"})
+    return result
+
+
+def bench_match_local(n_points, repeat, workdir):
+    import match_local
+
+    osm_path = Path(workdir) / "grid.osm"
+    network_path = Path(workdir) / "grid_network.npz"
+    synthetic.write_osm_grid(osm_path)
+    match_local.build_network(*match_local.read_osm(osm_path)).save(network_path)
+    lats, lons, _, _ = synthetic.grid_drive(n_points)
+
+    matcher = match_local.LocalMatcher(network_path)
+    try:
+        matcher.match(lats[:10], lons[:10])  # Netz laden
+        result = summarize(measure(lambda: matcher.match(lats, lons), repeat))
+    finally:
+        matcher.close()
+
+    result.update({"points": n_points, "workers": matcher.workers, "unit": "per track"})
+    return result
+
+
+def bench_match_pipeline(n_points, repeat, workdir):
+    import match_osrm
+
+    path_csv = Path(workdir) / f"pipeline_path_{n_points}.csv"
+    rough_csv = Path(workdir) / f"pipeline_rough_{n_points}.csv"
+    lats, lons = synthetic.write_roadlab_path_csv(path_csv, n_points)
+    synthetic.write_roadlab_roughness_csv(rough_csv, lats, lons)
+
+    match_osrm.INPUT_CSV = path_csv
+    match_osrm.ROUGHNESS_CSV = rough_csv
+    match_osrm.OUTPUT_CSV = Path(workdir) / "pipeline_matched.csv"
+    match_osrm.OUTPUT_INTERVALS_CSV = Path(workdir) / "pipeline_intervals.csv"
+
+    with stubs.osrm_stub() as osrm:
+        match_osrm.OSRM_BASE_URL = osrm.base_url
+        with open(os.devnull, "w") as devnull:
+            stdout = sys.stdout
+            sys.stdout = devnull  # Fortschrittsausgabe unterdrücken
+            try:
+                result = summarize(measure(match_osrm.main, repeat))
+            finally:
+                sys.stdout = stdout
+
+    result.update({"points": n_points, "osrm": "stub", "unit": "per run"})
+    return result
+
+
+def bench_csv_import(n_points, repeat, workdir):
+    import pandas as pd
+    import import_roadlab_csv
+
+    csv_path = Path(workdir) / f"import_{n_points}.csv"
+    synthetic.write_matched_csv(csv_path, n_points)
+    db_path = str(Path(workdir) / "import.sqlite")
+
+    def run():
+        conn = stubs.SqliteConnection(db_path)
+        conn._conn.executescript("DROP TABLE IF EXISTS track_point;" + stubs.TRACK_POINT_SQLITE_SCHEMA)
+        df = pd.read_csv(csv_path)
+        import_roadlab_csv.import_track_points(conn.cursor(), df)
+        conn.commit()
+        conn.really_close()
+
+    result = summarize(measure(run, repeat))
+    result.update({"rows": n_points, "db": "sqlite", "unit": "per import"})
+    return result
+
+
+BENCHMARKS = {
+    "find_segment_state": bench_find_segment_state,
+    "show_route_and_cost": bench_show_route_and_cost,
+    "road_state": bench_road_state,
+    "match_chunk": bench_match_chunk,
+    "match_local": bench_match_local,
+    "match_pipeline": bench_match_pipeline,
+    "csv_import": bench_csv_import,
+}
+
+
+# ============================================================
+# Ergebnisse speichern / vergleichen
+# ============================================================
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run_suite(preset, only, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, scales in PRESETS[preset].items():
+            if only and name not in only:
+                continue
+            for scale in scales:
+                print(f"▶ {name} {scale} ...", flush=True)
+                res = BENCHMARKS[name](scale, repeat, workdir)
+                res["benchmark"] = name
+                results.append(res)
+                print(f"  median {res['median_s'] * 1000:.3f} ms ({res['unit']})")
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "preset": preset,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def result_key(res):
+    """Schlüssel zum Zuordnen gleicher Messungen über zwei Läufe."""
+    params = {k: v for k, v in res.items() if k not in ("min_s", "median_s", "mean_s", "runs")}
+    return json.dumps(params, sort_keys=True)
+
+
+def compare(old_file, new_file):
+    old = json.loads(Path(old_file).read_text(encoding="utf-8"))
+    new = json.loads(Path(new_file).read_text(encoding="utf-8"))
+    old_by_key = {result_key(r): r for r in old["results"]}
+
+    print(f"Vergleich {old['commit']} -> {new['commit']} (median)")
+    for res in new["results"]:
+        before = old_by_key.get(result_key(res))
+        if before is None:
+            continue
+        ratio = res["median_s"] / before["median_s"] if before["median_s"] else float("inf")
+        scale = res.get("points") or res.get("rows")
+        print(
+            f"  {res['benchmark']:<22} {scale!s:>10}: "
+            f"{before['median_s'] * 1000:10.3f} ms -> {res['median_s'] * 1000:10.3f} ms  (x{ratio:.2f})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks für Matching, Pricing und API-Lookups")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="default")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="nur diese Benchmarks")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db", choices=["sqlite", "postgres"], default="sqlite",
+                        help="Datenbank für road_state (postgres: nur localhost)")
+    parser.add_argument("--output", help="JSON-Datei (Standard: results/<commit>_<preset>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("ALT", "NEU"), help="zwei Ergebnisdateien vergleichen")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    global DB_BACKEND
+    DB_BACKEND = args.db
+
+    report = run_suite(args.preset, args.only, args.repeat)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{report['commit']}_{args.preset}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print("Ergebnisse gespeichert als:", output)
+
+
+if __name__ == "__main__":
+    main()
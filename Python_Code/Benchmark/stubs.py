@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# ============================================================
+# Lokale Stellvertreter für OSRM, die Road-State-API und Postgres
+# ============================================================
+#
+# Damit die Benchmarks ohne Netzwerk und ohne AWS laufen. Die Stubs
+# antworten im gleichen Format wie die echten Dienste, rechnen aber
+# (fast) nichts, damit nur unser eigener Code gemessen wird.
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    routes = {}
+
+    def do_GET(self):
+        parsed = urlsplit(self.path)  # urlparse würde ";" als Parameter abtrennen
+        for prefix, handler in self.routes.items():
+            if parsed.path.startswith(prefix):
+                status, body = handler(parsed.path[len(prefix):], parse_qs(parsed.query))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+        self.send_error(404)
+
+    def log_message(self, *args):
+        pass  # keine Ausgabe pro Request
+
+
+class StubServer:
+    """
+    Kleiner HTTP-Server in einem Hintergrund-Thread.
+    routes: {pfad_prefix: handler(rest_pfad, query) -> (status, bytes)}
+    """
+
+    def __init__(self, routes):
+        handler = type("Handler", (_StubHandler,), {"routes": routes})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _parse_coords(coord_str):
+    """'lon,lat;lon,lat;...' -> [[lon, lat], ...]"""
+    return [[float(v) for v in c.split(",")] for c in coord_str.split(";") if c]
+
+
+def osrm_stub():
+    """
+    OSRM-Stub: /match gibt jeden Punkt als gematchten Tracepoint zurück,
+    /route liefert die Wegpunkte als (gerade) Geometrie (GeoJSON oder polyline6).
+    """
+    def match(rest, query):
+        coords = _parse_coords(rest.split("/", 2)[-1])
+        body = {"code": "Ok", "tracepoints": [{"location": c} for c in coords]}
+        return 200, json.dumps(body).encode()
+
+    def route(rest, query):
+        coords = _parse_coords(rest.split("/", 2)[-1].split("?")[0])
+        if query.get("geometries") == ["polyline6"]:
+            import polyline  # FindeRoad liegt beim Benchmark-Lauf auf sys.path
+            geometry = polyline.encode([(lat, lon) for lon, lat in coords])
+        else:
+            geometry = {"type": "LineString", "coordinates": coords}
+        body = {"code": "Ok", "routes": [{"geometry": geometry}]}
+        return 200, json.dumps(body).encode()
+
+    return StubServer({"/match/v1/": match, "/route/v1/": route})
+
+
+def api_stub(points):
+    """Road-State-API-Stub: /db_points liefert die übergebenen Punkte (einmal serialisiert)."""
+    payload = json.dumps(points).encode()
+
+    return StubServer({
+        "/db_points": lambda rest, query: (200, payload),
+        "/health": lambda rest, query: (200, b'{"status": "ok"}'),
+    })
+
+
+# ============================================================
+# SQLite als lokaler Ersatz für Postgres
+# ============================================================
+
+class SqliteCursor:
+    """Cursor-Wrapper: übersetzt die psycopg2-Platzhalter %s nach ?."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql, params=()):
+        return self._cur.execute(sql.replace("%s", "?"), params)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size):
+        return self._cur.fetchmany(size)
+
+    def close(self):
+        self._cur.close()
+
+
+class SqliteConnection:
+    """Verbindungs-Wrapper mit der von api.py benutzten psycopg2-Schnittstelle."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, *args, **kwargs):
+        return SqliteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        pass  # Verbindung wird vom Benchmark wiederverwendet
+
+    def really_close(self):
+        self._conn.close()
+
+
+TRACK_POINT_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS track_point (
+    lat_matched    REAL,
+    lon_matched    REAL,
+    roughness      TEXT,
+    iri            REAL,
+    condition_code INTEGER,
+    speed_kmh      REAL,
+    interval_id    INTEGER,
+    recorded_at    TEXT
+);
+CREATE INDEX IF NOT EXISTS track_point_lat_lon_idx ON track_point (lat_matched, lon_matched);
+"""
+
+
+def sqlite_track_points(path, lats, lons, codes, iri):
+    """Legt track_point in SQLite an und füllt sie mit den synthetischen Punkten."""
+    conn = SqliteConnection(path)
+    conn._conn.executescript("DROP TABLE IF EXISTS track_point;" + TRACK_POINT_SQLITE_SCHEMA)
+    conn._conn.executemany(
+        "INSERT INTO track_point (lat_matched, lon_matched, condition_code, iri) VALUES (?, ?, ?, ?)",
+        zip(lats.tolist(), lons.tolist(), codes.tolist(), iri.tolist()),
+    )
+    conn.commit()
+    return conn
+
+
+class _PostgresConnection:
+    """Hält eine psycopg2-Verbindung offen, close() aus api.py wird ignoriert."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return self._conn.cursor(*args, **kwargs)
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        pass
+
+    def really_close(self):
+        self._conn.close()
+
+
+def postgres_track_points(db_config, lats, lons, codes, iri):
+    """
+    Füllt track_point in einer LOKALEN Postgres-DB mit den synthetischen
+    Punkten. Bricht ab, wenn DB_HOST nicht auf localhost zeigt, damit nie
+    versehentlich die produktive Tabelle überschrieben wird.
+    """
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    if db_config["host"] not in ("localhost", "127.0.0.1"):
+        raise RuntimeError("Postgres-Benchmark nur gegen localhost (DB_HOST setzen).")
+
+    config = dict(db_config, sslmode=os.getenv("DB_SSLMODE", "disable"))
+    conn = psycopg2.connect(**config)
+    cur = conn.cursor()
+    cur.execute(TRACK_POINT_SQLITE_SCHEMA)
+    cur.execute("TRUNCATE track_point;")
+    execute_values(
+        cur,
+        "INSERT INTO track_point (lat_matched, lon_matched, condition_code, iri) VALUES %s",
+        zip(lats.tolist(), lons.tolist(), codes.tolist(),
+            [None if v != v else v for v in iri.tolist()]),
+        page_size=10_000,
+    )
+    conn.commit()
+    cur.close()
+    return _PostgresConnection(conn)
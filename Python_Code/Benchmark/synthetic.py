@@ -0,0 +1,252 @@
+import math
+
+import numpy as np
+
+# ============================================================
+# Synthetische Testdaten rund um Frankfurt
+# ============================================================
+#
+# Alle Generatoren sind deterministisch (fester Seed), damit Messungen
+# über mehrere Commits hinweg vergleichbar bleiben.
+
+# Bounding Box um die Beispielfahrt (RoadLabPro/f_Link_0002_*) mit Rand
+FRANKFURT_BBOX = {
+    "min_lat": 50.08,
+    "max_lat": 50.20,
+    "min_lon": 8.58,
+    "max_lon": 8.78,
+}
+
+# Startpunkt der Beispielfahrt
+FRANKFURT_START = (50.12969589, 8.67326259)
+
+METERS_PER_DEG_LAT = 111_320.0
+
+# Anteil der Punkte, die entlang von "Straßen" (Random Walks) liegen;
+# der Rest ist gleichmäßig in der Bounding Box verteilt.
+ROAD_SHARE = 0.8
+
+
+def _rng(seed):
+    return np.random.default_rng(seed)
+
+
+def random_walk(n, start=FRANKFURT_START, step_m=15.0, seed=0):
+    """
+    Polyline mit n Vertices als Random Walk (Schrittweite ~step_m Meter,
+    Richtung ändert sich langsam). Rückgabe: (lats, lons) als NumPy-Arrays.
+    """
+    rng = _rng(seed)
+    lat0, lon0 = start
+    m_per_deg_lon = METERS_PER_DEG_LAT * math.cos(math.radians(lat0))
+
+    heading = np.cumsum(rng.normal(0.0, 0.15, n)) + rng.uniform(0, 2 * math.pi)
+    steps = rng.uniform(0.5, 1.5, n) * step_m
+    steps[0] = 0.0
+
+    lats = lat0 + np.cumsum(steps * np.cos(heading)) / METERS_PER_DEG_LAT
+    lons = lon0 + np.cumsum(steps * np.sin(heading)) / m_per_deg_lon
+
+    # an der Bounding Box spiegeln, damit der Walk in Frankfurt bleibt
+    lats = _reflect(lats, FRANKFURT_BBOX["min_lat"], FRANKFURT_BBOX["max_lat"])
+    lons = _reflect(lons, FRANKFURT_BBOX["min_lon"], FRANKFURT_BBOX["max_lon"])
+    return lats, lons
+
+
+def _reflect(values, lo, hi):
+    span = hi - lo
+    v = np.mod(values - lo, 2 * span)
+    return lo + np.where(v > span, 2 * span - v, v)
+
+
+def route_coords(n_vertices, seed=1):
+    """Route als Liste von (lat, lon) wie von build_route_coords geliefert."""
+    lats, lons = random_walk(n_vertices, seed=seed)
+    return list(zip(lats.tolist(), lons.tolist()))
+
+
+def track_point_arrays(n_points, route=None, seed=2):
+    """
+    Punktwolke mit n_points Messpunkten: lats, lons, condition_codes, iri.
+
+    ROAD_SHARE der Punkte liegt mit 0-20 m Rauschen entlang von Fahrten
+    (bei übergebener Route entlang dieser), der Rest gleichmäßig in der
+    Bounding Box.
+    """
+    rng = _rng(seed)
+    n_road = int(n_points * ROAD_SHARE)
+    n_uniform = n_points - n_road
+
+    if route is not None and len(route) > 1:
+        r_lats = np.array([p[0] for p in route])
+        r_lons = np.array([p[1] for p in route])
+    else:
+        r_lats, r_lons = random_walk(max(2, n_road // 4 + 2), seed=seed + 100)
+
+    idx = rng.integers(0, len(r_lats) - 1, n_road)
+    t = rng.uniform(0, 1, n_road)
+    noise_deg = rng.normal(0.0, 10.0, (2, n_road)) / METERS_PER_DEG_LAT
+    road_lats = r_lats[idx] + t * (r_lats[idx + 1] - r_lats[idx]) + noise_deg[0]
+    road_lons = r_lons[idx] + t * (r_lons[idx + 1] - r_lons[idx]) + noise_deg[1]
+
+    uni_lats = rng.uniform(FRANKFURT_BBOX["min_lat"], FRANKFURT_BBOX["max_lat"], n_uniform)
+    uni_lons = rng.uniform(FRANKFURT_BBOX["min_lon"], FRANKFURT_BBOX["max_lon"], n_uniform)
+
+    lats = np.concatenate((road_lats, uni_lats))
+    lons = np.concatenate((road_lons, uni_lons))
+
+    # Codes 0..5 (siehe FindeRoad/road_states.py), IRI passend dazu
+    codes = rng.choice(6, n_points, p=[0.35, 0.2, 0.25, 0.1, 0.05, 0.05]).astype("int16")
+    iri = np.where(codes == 0, np.nan, codes * 1.5 + rng.uniform(0, 1.5, n_points))
+    return lats, lons, codes, iri.astype("float32")
+
+
+def track_points(n_points, route=None, seed=2):
+    """Punktwolke im Format von /db_points (Liste von Dicts)."""
+    lats, lons, codes, iri = track_point_arrays(n_points, route=route, seed=seed)
+    return [
+        {"lat": la, "lon": lo, "condition_code": c, "iri": None if math.isnan(i) else i}
+        for la, lo, c, i in zip(lats.tolist(), lons.tolist(), codes.tolist(), iri.tolist())
+    ]
+
+
+# ============================================================
+# Synthetische RoadLab-Exporte
+# ============================================================
+
+def write_roadlab_path_csv(path, n_points, seed=3):
+    """
+    Schreibt eine Path-CSV im RoadLab-Format (inkl. Komma am Zeilenende),
+    ein Fix alle 5 Sekunden, ca. 100 m pro Intervall.
+    """
+    lats, lons = random_walk(n_points, step_m=40.0, seed=seed)
+    chainage = np.arange(n_points) * 40.0
+    intervals = 5 + (chainage // 100).astype(int)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('"Time","Road_Identification","Interval_Number","Point_Latitude",'
+                '"Point_Longitude","Point_Altitude","Speed"\n')
+        for i in range(n_points):
+            sec = 8 * 3600 + 5 * i
+            t = f"{sec // 3600 % 24:02d}:{sec // 60 % 60:02d}:{sec % 60:02d} 2025-November-17"
+            f.write(f'"{t}","f","{intervals[i]:04d}","{lats[i]:.8f}","{lons[i]:.8f}","0","30",\n')
+    return lats, lons
+
+
+def write_roadlab_roughness_csv(path, path_lats, path_lons, seed=4):
+    """
+    Schreibt eine passende Roughness-CSV (eine Zeile pro ~100 m Intervall)
+    mit den 53 Spalten des Originalexports.
+    """
+    rng = _rng(seed)
+    names = ["NOT MEASURED", "VERY GOOD", "GOOD", "FAIR", "POOR", "VERY POOR"]
+    header = (
+        ["Time", "Road_Identification"] + [f"Road_Field_{k}" for k in range(37)]
+        + ["Interval_Number", "Interval_Start_Latitude", "Interval_Start_Longitude",
+           "Interval_Start_Altitude", "Interval_End_Latitude", "Interval_End_Longitude",
+           "Interval_End_Altitude", "Interval_Length", "Suspension_Type", "Is_Fixed",
+           "Speed", "St_Dev_Vert_Accel", "Roughness", "Condition_Category"]
+    )
+    # 100 m Intervalle bei 40 m Fix-Abstand -> 2.5 Fixes pro Intervall
+    bounds = np.unique(np.append(np.arange(0, len(path_lats), 2.5).astype(int), len(path_lats) - 1))
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(f'"{h}"' for h in header) + "\n")
+        for k in range(len(bounds) - 1):
+            a, b = bounds[k], bounds[k + 1]
+            code = int(rng.integers(0, 6))
+            iri = "" if code == 0 else f"{code * 1.5 + rng.uniform(0, 1.5):.2f}"
+            values = (
+                ["08:00:00 2025-November-17", "f"] + [""] * 37
+                + [f"{5 + k:04d}", f"{path_lats[a]:.8f}", f"{path_lons[a]:.8f}", "0",
+                   f"{path_lats[b]:.8f}", f"{path_lons[b]:.8f}", "0", f"{(b - a) * 40.0:.2f}",
+                   "CAR HARD SUSPENSION", "false", "30", "0.05", iri, names[code]]
+            )
+            f.write(",".join(f'"{v}"' for v in values) + ",\n")
+
+
+def write_matched_csv(path, n_points, seed=5):
+    """Gematchte CSV wie von match_osrm.py (Eingabe für import_roadlab_csv.py)."""
+    import pandas as pd
+
+    lats, lons, codes, iri = track_point_arrays(n_points, seed=seed)
+    names = np.array(["NOT MEASURED", "VERY GOOD", "GOOD", "FAIR", "POOR", "VERY POOR"])
+    pd.DataFrame({
+        "lat_matched": lats,
+        "lon_matched": lons,
+        "Roughness": names[codes],
+        "iri": iri,
+        "condition_code": codes,
+        "speed_kmh": np.full(n_points, 30.0, dtype="float32"),
+        "interval_id": 5 + np.arange(n_points) // 3,
+        "recorded_at": pd.Timestamp("2025-11-17 08:32:40") + pd.to_timedelta(np.arange(n_points), unit="s"),
+    }).to_csv(path, index=False)
+
+
+# ============================================================
+# Synthetisches Straßennetz (OSM) + Fahrt darauf
+# ============================================================
+
+def _grid_latlon(row, col, spacing_m, start=FRANKFURT_START):
+    lat0, lon0 = start
+    m_per_deg_lon = METERS_PER_DEG_LAT * math.cos(math.radians(lat0))
+    return lat0 + row * spacing_m / METERS_PER_DEG_LAT, lon0 + col * spacing_m / m_per_deg_lon
+
+
+def write_osm_grid(path, n=40, spacing_m=100.0):
+    """
+    OSM-XML mit einem Straßenraster n x n (Abstand spacing_m), jede Zeile
+    und Spalte ein Weg "residential" in beide Richtungen.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for r in range(n):
+            for c in range(n):
+                lat, lon = _grid_latlon(r, c, spacing_m)
+                f.write(f'  <node id="{r * n + c + 1}" lat="{lat:.8f}" lon="{lon:.8f}"/>\n')
+        way_id = 1
+        for r in range(n):
+            refs = [r * n + c + 1 for c in range(n)]
+            f.write(f'  <way id="{way_id}">' + "".join(f'<nd ref="{x}"/>' for x in refs)
+                    + '<tag k="highway" v="residential"/></way>\n')
+            way_id += 1
+        for c in range(n):
+            refs = [r * n + c + 1 for r in range(n)]
+            f.write(f'  <way id="{way_id}">' + "".join(f'<nd ref="{x}"/>' for x in refs)
+                    + '<tag k="highway" v="residential"/></way>\n')
+            way_id += 1
+        f.write("</osm>\n")
+
+
+def grid_drive(n_points, n=40, spacing_m=100.0, step_m=10.0, noise_m=5.0, seed=6):
+    """
+    Fahrt über das Raster aus write_osm_grid: an jeder Kreuzung geradeaus
+    oder abbiegen, alle step_m ein Fix mit GPS-Rauschen (noise_m).
+    Rückgabe: (lats, lons) verrauscht, (true_lats, true_lons) auf der Straße.
+    """
+    rng = _rng(seed)
+    directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    r, c = n // 2, n // 2
+    heading = 0
+    rows, cols = [], []
+    per_block = int(round(spacing_m / step_m))
+
+    while len(rows) < n_points:
+        choice = [heading, (heading + 1) % 4, (heading + 3) % 4]
+        rng.shuffle(choice[1:])
+        for h in ([heading] if rng.random() < 0.6 else []) + choice:
+            dr, dc = directions[h]
+            if 0 <= r + dr < n and 0 <= c + dc < n:
+                heading = h
+                break
+        dr, dc = directions[heading]
+        for k in range(per_block):
+            rows.append(r + dr * k / per_block)
+            cols.append(c + dc * k / per_block)
+        r, c = r + dr, c + dc
+
+    true_lats, true_lons = _grid_latlon(np.array(rows[:n_points]), np.array(cols[:n_points]), spacing_m)
+    noise = rng.normal(0.0, noise_m, (2, n_points))
+    lats = true_lats + noise[0] / METERS_PER_DEG_LAT
+    lons = true_lons + noise[1] / (METERS_PER_DEG_LAT * math.cos(math.radians(FRANKFURT_START[0])))
+    return lats, lons, true_lats, true_lons
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+# ==============================
+# Intervall-Join entlang der Fahrt
+# ==============================
+#
+# Idee: Die Roughness-Intervalle bilden (in Reihenfolge der Interval_Number)
+# eine Referenzlinie der Fahrt. Auf dieser Linie bekommt jedes Intervall
+# eine Spanne [chainage_start, chainage_end] in Metern; die Spanne ist die
+# vom Gerät gemessene Interval_Length (nur wenn sie fehlt, die Luftlinie
+# Start -> Ende), Lücken zwischen zwei Intervallen zählen mit der Luftlinie.
+# Die Path-Punkte bekommen ihre Chainage über die kumulierte Distanz ihrer
+# GPS-Fixes. Beide Linien beginnen im selben Fix (der erste Path-Punkt ist
+# der Start des ersten Intervalls).
+#
+# Die Fix-Summe enthält Zickzack und Stand-Rauschen und läuft deshalb auf
+# langen Fahrten der Referenzlinie davon. Sie wird daher an jedem
+# Intervallstart neu verankert: Der erste Fix, der näher als
+# ANCHOR_RADIUS_M am Start des nächsten Intervalls liegt (und nicht mehr
+# als ANCHOR_WINDOW_M von dessen Chainage entfernt ist), bekommt genau
+# dessen chainage_start. Der Fehler bleibt so auf ein Intervall begrenzt.
+#
+# Die Zuordnung Punkt -> Intervall ist dann eine binäre Suche in den
+# sortierten Intervall-Starts (np.searchsorted), insgesamt O(n log m).
+
+EARTH_RADIUS_M = 6371000.0
+
+# Verankerung der Path-Chainage an den Intervallstarts
+ANCHOR_RADIUS_M = 15.0
+ANCHOR_WINDOW_M = 200.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Vektorisierte Haversine-Distanz in Metern (NumPy-Arrays oder Skalare)."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def condition_codes(categories: pd.Series) -> np.ndarray:
+    """Kategorie-Spalte -> int8-Codes (unbekannt/leer = 0, NOT MEASURED)."""
+    return np.maximum(categories.cat.codes.to_numpy(), 0).astype("int8")
+
+
+def interval_segments(df_rough: pd.DataFrame) -> pd.DataFrame:
+    """
+    Baut aus der Roughness-CSV eine Tabelle mit einer Zeile pro Intervall:
+    interval_id, Start-/Endkoordinaten, Länge, Chainage-Spanne und Zustand.
+
+    Die Tabelle kann direkt gespeichert werden (z. B. als CSV oder in der DB)
+    und ist deutlich kleiner als die Punktliste.
+    """
+    df = df_rough.sort_values("Interval_Number").reset_index(drop=True)
+
+    start_lat = df["Interval_Start_Latitude"].to_numpy()
+    start_lon = df["Interval_Start_Longitude"].to_numpy()
+    end_lat = df["Interval_End_Latitude"].to_numpy()
+    end_lon = df["Interval_End_Longitude"].to_numpy()
+
+    # Länge jedes Intervalls (gemessen, sonst Start -> Ende) und Lücke zum nächsten Start
+    seg_len = df["Interval_Length"].to_numpy(dtype="float64")
+    missing = ~np.isfinite(seg_len) | (seg_len <= 0)
+    seg_len[missing] = haversine_m(start_lat[missing], start_lon[missing], end_lat[missing], end_lon[missing])
+    gap_len = np.zeros(len(df))
+    if len(df) > 1:
+        gap_len[1:] = haversine_m(end_lat[:-1], end_lon[:-1], start_lat[1:], start_lon[1:])
+
+    # Chainage: Lücken und Intervalle abwechselnd aufsummieren
+    chainage_start = np.cumsum(gap_len) + np.concatenate(([0.0], np.cumsum(seg_len)[:-1]))
+    chainage_end = chainage_start + seg_len
+
+    return pd.DataFrame({
+        "interval_id": df["Interval_Number"].to_numpy(),
+        "start_lat": start_lat,
+        "start_lon": start_lon,
+        "end_lat": end_lat,
+        "end_lon": end_lon,
+        "length_m": df["Interval_Length"].to_numpy(),
+        "chainage_start_m": chainage_start,
+        "chainage_end_m": chainage_end,
+        "Roughness": df["Roughness"].to_numpy(),
+        "Condition_Category": df["Condition_Category"],
+        "condition_code": condition_codes(df["Condition_Category"]),
+    })
+
+
+class IntervalJoiner:
+    """
+    Ordnet Path-Punkte chunkweise dem Intervall zu, dessen Chainage-Spanne
+    sie enthält. Der Zustand (letzter Fix, bisherige Chainage, nächster
+    Intervallstart zum Verankern) wird zwischen den Chunks mitgeführt, damit
+    die Zuordnung beim Streaming stimmt.
+    """
+
+    def __init__(self, df_rough: pd.DataFrame):
+        self.segments = interval_segments(df_rough)
+        self._starts = self.segments["chainage_start_m"].to_numpy()
+        self._ends = self.segments["chainage_end_m"].to_numpy()
+        self._start_lat = self.segments["start_lat"].to_numpy()
+        self._start_lon = self.segments["start_lon"].to_numpy()
+
+        self._last_lat = None
+        self._last_lon = None
+        self._chainage_m = 0.0
+        self._next_anchor = 0
+
+    def track_chainage(self, lat, lon):
+        """Kumulierte Distanz (m) der Fixes entlang der Fahrt, über Chunks hinweg."""
+        lat = np.asarray(lat, dtype="float64")
+        lon = np.asarray(lon, dtype="float64")
+        if len(lat) == 0:
+            return lat
+
+        prev_lat = np.concatenate(([lat[0] if self._last_lat is None else self._last_lat], lat[:-1]))
+        prev_lon = np.concatenate(([lon[0] if self._last_lon is None else self._last_lon], lon[:-1]))
+
+        chainage = self._chainage_m + np.cumsum(haversine_m(prev_lat, prev_lon, lat, lon))
+        self._anchor(lat, lon, chainage)
+
+        self._last_lat = lat[-1]
+        self._last_lon = lon[-1]
+        self._chainage_m = chainage[-1]
+        return chainage
+
+    def _anchor(self, lat, lon, chainage):
+        """
+        Setzt die Chainage (in place) an jedem Intervallstart, den die Fahrt
+        in diesem Chunk erreicht, auf dessen chainage_start. Ein Start, an
+        dem die Fahrt nie nah genug vorbeikommt (GPS-Lücke), wird
+        übersprungen, sobald die Chainage ANCHOR_WINDOW_M dahinter liegt;
+        der nächste Start wird erst ab dieser Stelle gesucht.
+        """
+        pos = 0
+        while self._next_anchor < len(self._starts) and pos < len(chainage):
+            k = self._next_anchor
+            near = haversine_m(lat[pos:], lon[pos:], self._start_lat[k], self._start_lon[k]) <= ANCHOR_RADIUS_M
+            near &= np.abs(chainage[pos:] - self._starts[k]) <= ANCHOR_WINDOW_M
+            hits = np.flatnonzero(near)
+            if len(hits):
+                j = pos + hits[0]
+                chainage[j:] += self._starts[k] - chainage[j]
+                pos = j + 1
+            else:
+                past = np.flatnonzero(chainage[pos:] > self._starts[k] + ANCHOR_WINDOW_M)
+                if len(past) == 0:
+                    break  # Start kommt evtl. erst im nächsten Chunk
+                pos += past[0]
+            self._next_anchor += 1
+
+    def assign(self, chainage):
+        """
+        Index des Intervalls pro Chainage-Wert. Liegt ein Wert in einer Lücke
+        zwischen zwei Intervallen, gewinnt das näher gelegene.
+        """
+        if len(self._starts) == 0:
+            return np.full(len(chainage), -1, dtype="int64")
+
+        # letztes Intervall, dessen Start <= Chainage ist
+        idx = np.searchsorted(self._starts, chainage, side="right") - 1
+        idx = np.clip(idx, 0, len(self._starts) - 1)
+
+        # in einer Lücke (hinter dem Ende) -> ggf. das folgende Intervall nehmen
+        nxt = np.minimum(idx + 1, len(self._starts) - 1)
+        past_end = chainage - self._ends[idx]
+        before_next = self._starts[nxt] - chainage
+        use_next = (past_end > 0) & (nxt != idx) & (before_next < past_end)
+        return np.where(use_next, nxt, idx)
+
+    def join(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Hängt interval_id, Roughness, Condition_Category und condition_code
+        an einen (zeitlich sortierten) Chunk mit den Spalten lat/lon.
+        """
+        chainage = self.track_chainage(chunk["lat"].to_numpy(), chunk["lon"].to_numpy())
+        idx = self.assign(chainage)
+
+        seg = self.segments.iloc[idx].reset_index(drop=True)
+        out = chunk.reset_index(drop=True).copy()
+        out["chainage_m"] = chainage
+        out["interval_id"] = seg["interval_id"].to_numpy()
+        out["Roughness"] = seg["Roughness"].to_numpy()
+        out["Condition_Category"] = seg["Condition_Category"].to_numpy()
+        out["condition_code"] = seg["condition_code"].to_numpy()
+        return out
@@ -0,0 +1,535 @@
+import argparse
+import heapq
+import math
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# ============================================================
+# Lokales Map Matching (HMM/Viterbi) ohne OSRM
+# ============================================================
+#
+# Ersatz für match_osrm.match_chunk, der ohne Netzwerk läuft:
+#
+#   1. Straßennetz aus einem OSM-Extrakt bauen (einmalig, .osm als XML;
+#      .osm.pbf vorher z. B. mit "osmium cat extrakt.osm.pbf -o extrakt.osm"):
+#        python match_local.py build extrakt.osm --out road_network.npz
+#   2. Fahrt matchen (gleiche Ein-/Ausgabedateien wie match_osrm.py):
+#        python match_local.py match --network road_network.npz --workers 8
+#
+# Verfahren (Newson & Krumm): Jeder GPS-Punkt bekommt als Kandidaten die
+# Projektionen auf alle Kanten im Umkreis radius_m (Raster über die Kanten,
+# wie point_index). Emission = Gauß im Abstand Punkt–Kante (sigma_m),
+# Übergang = Exponential in |Fahrweg im Netz – Luftlinie| (beta_m). Der
+# Fahrweg kommt aus einem Dijkstra, der bei einer Obergrenze abbricht
+# (Umwege, die viel länger als die Luftlinie sind, sind ohnehin
+# unwahrscheinlich). Viterbi wählt die wahrscheinlichste Kandidatenfolge.
+#
+# Punkte ohne Kandidaten bleiben NaN (wie ein None-Tracepoint bei OSRM),
+# danach beginnt eine neue Kette. Lange Fahrten werden in überlappende
+# Teile zerlegt und parallel auf mehreren Prozessen gematcht.
+
+EARTH_RADIUS_M = 6371000.0
+
+# Straßentypen, auf denen ein Auto fährt
+DRIVABLE_HIGHWAYS = {
+    "motorway", "motorway_link", "trunk", "trunk_link",
+    "primary", "primary_link", "secondary", "secondary_link",
+    "tertiary", "tertiary_link", "unclassified", "residential",
+    "living_street", "service", "road",
+}
+
+# Rasterzelle für die Kantensuche in Metern
+DEFAULT_CELL_M = 50.0
+
+# HMM-Parameter (Werte aus Newson & Krumm, für Smartphone-GPS etwas größer)
+DEFAULT_RADIUS_M = 40.0
+DEFAULT_SIGMA_M = 8.0
+DEFAULT_BETA_M = 5.0
+DEFAULT_MAX_CANDIDATES = 8
+
+# Obergrenze für den Fahrweg zwischen zwei Punkten:
+# max(Luftlinie * FACTOR, Luftlinie + MIN_M)
+ROUTE_LIMIT_FACTOR = 2.0
+ROUTE_LIMIT_MIN_M = 150.0
+
+# GPS-Rauschen im Stand: so weit darf ein Punkt auf derselben Kante
+# "rückwärts" springen, ohne dass es als Wenden zählt
+BACKWARD_TOLERANCE_M = 5.0
+
+# Parallelisierung: Punkte pro Teil und Überlappung (Punkte je Seite,
+# deren Ergebnis verworfen wird, damit die Teilgrenzen sauber sind)
+PART_SIZE = 1000
+PART_OVERLAP = 25
+
+
+# ============================================================
+# Straßennetz
+# ============================================================
+class RoadNetwork:
+    """
+    Knoten:  lat, lon            float64
+             x, y                float64  Meter relativ zu lat0 (äquirektangular)
+    Kanten:  u, v                int32    gerichtet (Einbahnstraßen nur in Fahrtrichtung)
+             length_m            float64
+    CSR:     indptr              int64    ausgehende Kanten von Knoten n:
+             indices, edge       int32    indices/edge[indptr[n]:indptr[n+1]]
+    Raster:  cell_keys           int64    belegte Zellen, aufsteigend
+             cell_start          int64    Offset in cell_edges je Zelle (+ Ende)
+             cell_edges          int32    Kanten, die die Zelle berühren
+    """
+
+    def __init__(self, lat, lon, u, v, cell_m=DEFAULT_CELL_M, lat0=None):
+        self.lat = np.asarray(lat, dtype="float64")
+        self.lon = np.asarray(lon, dtype="float64")
+        self.u = np.asarray(u, dtype="int32")
+        self.v = np.asarray(v, dtype="int32")
+        self.cell_m = float(cell_m)
+        self.lat0 = float(lat0 if lat0 is not None else (self.lat.mean() if len(self.lat) else 0.0))
+        self._cos0 = math.cos(math.radians(self.lat0))
+
+        self.x, self.y = self.project(self.lat, self.lon)
+        self.length_m = np.hypot(self.x[self.v] - self.x[self.u], self.y[self.v] - self.y[self.u])
+        self._build_csr()
+        self._build_grid()
+        self._lists = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    def project(self, lat, lon):
+        """(lat, lon) -> Meter (x, y) relativ zu lat0 (wie point_index)."""
+        x = EARTH_RADIUS_M * np.radians(lon) * self._cos0
+        y = EARTH_RADIUS_M * np.radians(lat)
+        return x, y
+
+    def unproject(self, x, y):
+        lat = np.degrees(np.asarray(y) / EARTH_RADIUS_M)
+        lon = np.degrees(np.asarray(x) / (EARTH_RADIUS_M * self._cos0))
+        return lat, lon
+
+    def _build_csr(self):
+        order = np.argsort(self.u, kind="stable")
+        self.indices = self.v[order]
+        self.edge = order.astype("int32")
+        self.indptr = np.zeros(len(self.lat) + 1, dtype="int64")
+        np.cumsum(np.bincount(self.u, minlength=len(self.lat)), out=self.indptr[1:])
+
+    def _build_grid(self):
+        """
+        Jede Kante wird in allen Zellen eingetragen, die sie berührt: Stützpunkte
+        alle cell_m/2 entlang der Kante, (Zelle, Kante) eindeutig, nach Zelle sortiert.
+        """
+        n_edges = len(self.u)
+        if len(self.x):
+            self.cx_min = int(np.floor(self.x.min() / self.cell_m))
+            self.cy_min = int(np.floor(self.y.min() / self.cell_m))
+            self.nx = int(np.floor(self.x.max() / self.cell_m)) - self.cx_min + 1
+        else:
+            self.cx_min = self.cy_min = 0
+            self.nx = 1
+
+        steps = np.ceil(self.length_m / (self.cell_m / 2)).astype("int64") + 1
+        edge_of = np.repeat(np.arange(n_edges, dtype="int64"), steps)
+        first = np.repeat(np.cumsum(steps) - steps, steps)
+        t = (np.arange(len(edge_of)) - first) / np.maximum(steps[edge_of] - 1, 1)
+
+        ax, ay = self.x[self.u][edge_of], self.y[self.u][edge_of]
+        bx, by = self.x[self.v][edge_of], self.y[self.v][edge_of]
+        keys = self._cell_key(ax + t * (bx - ax), ay + t * (by - ay))
+
+        pairs = np.unique(np.stack((keys, edge_of), axis=1), axis=0)
+        self.cell_keys, start = np.unique(pairs[:, 0], return_index=True)
+        self.cell_start = np.append(start, len(pairs)).astype("int64")
+        self.cell_edges = pairs[:, 1].astype("int32")
+
+    def _cell_key(self, x, y):
+        cx = np.floor(x / self.cell_m).astype("int64") - self.cx_min
+        cy = np.floor(y / self.cell_m).astype("int64") - self.cy_min
+        return cy * self.nx + cx
+
+    # --------------------------------------------------------
+    # Speichern / Laden
+    # --------------------------------------------------------
+    def save(self, path):
+        np.savez_compressed(path, lat=self.lat, lon=self.lon, u=self.u, v=self.v,
+                            cell_m=self.cell_m, lat0=self.lat0)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["lat"], data["lon"], data["u"], data["v"],
+                   cell_m=float(data["cell_m"]), lat0=float(data["lat0"]))
+
+    # --------------------------------------------------------
+    # Kandidaten
+    # --------------------------------------------------------
+    def edges_near(self, qx, qy, radius_m):
+        """Kanten in den Zellen, die den Radius überdecken (grob, ohne Abstandstest)."""
+        if not (math.isfinite(qx) and math.isfinite(qy)):
+            return np.empty(0, dtype="int32")
+        # Stützpunkte liegen höchstens cell_m/4 von jedem Kantenpunkt entfernt
+        r = radius_m + self.cell_m / 4
+        cx0 = max(int(math.floor((qx - r) / self.cell_m)) - self.cx_min, 0)
+        cx1 = min(int(math.floor((qx + r) / self.cell_m)) - self.cx_min, self.nx - 1)
+        cy0 = max(int(math.floor((qy - r) / self.cell_m)) - self.cy_min, 0)
+        cy1 = int(math.floor((qy + r) / self.cell_m)) - self.cy_min
+        if cx0 > cx1 or cy0 > cy1:
+            return np.empty(0, dtype="int32")
+
+        parts = []
+        for cy in range(cy0, cy1 + 1):
+            lo = np.searchsorted(self.cell_keys, cy * self.nx + cx0, side="left")
+            hi = np.searchsorted(self.cell_keys, cy * self.nx + cx1, side="right")
+            if lo < hi:
+                parts.append(self.cell_edges[self.cell_start[lo]:self.cell_start[hi]])
+        if not parts:
+            return np.empty(0, dtype="int32")
+        return np.unique(np.concatenate(parts))
+
+    def candidates(self, qx, qy, radius_m, max_candidates):
+        """
+        Projektionen des Punkts auf die Kanten im Umkreis, nach Abstand sortiert.
+        Rückgabe: (edge, offset_m ab Kantenanfang, dist_m, x, y) als Arrays.
+        """
+        edges = self.edges_near(qx, qy, radius_m)
+        ax, ay = self.x[self.u[edges]], self.y[self.u[edges]]
+        dx, dy = self.x[self.v[edges]] - ax, self.y[self.v[edges]] - ay
+        length = self.length_m[edges]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(length > 0, ((qx - ax) * dx + (qy - ay) * dy) / (length * length), 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        px, py = ax + t * dx, ay + t * dy
+        dist = np.hypot(qx - px, qy - py)
+
+        keep = np.flatnonzero(dist <= radius_m)
+        keep = keep[np.argsort(dist[keep], kind="stable")[:max_candidates]]
+        return edges[keep], t[keep] * length[keep], dist[keep], px[keep], py[keep]
+
+    def search_lists(self):
+        # Python-Listen sind in der Dijkstra-Schleife deutlich schneller als NumPy-Skalare
+        if self._lists is None:
+            self._lists = (self.indptr.tolist(), self.indices.tolist(), self.edge.tolist(),
+                           self.length_m.tolist(), self.u.tolist(), self.v.tolist())
+        return self._lists
+
+
+# ============================================================
+# Netz aus OSM bauen
+# ============================================================
+def _oneway(tags):
+    """+1 = nur in Zeichenrichtung, -1 = nur entgegen, 0 = beide Richtungen."""
+    value = tags.get("oneway", "")
+    if value in ("yes", "true", "1"):
+        return 1
+    if value == "-1":
+        return -1
+    if value == "no":
+        return 0
+    if tags.get("junction") in ("roundabout", "circular") or tags.get("highway") == "motorway":
+        return 1
+    return 0
+
+
+def read_osm(path):
+    """
+    Liest ein OSM-XML gestreamt ein. Rückgabe: (Knoten {id: (lat, lon)},
+    Wege [(Knoten-IDs, oneway)]) – nur befahrbare Wege und deren Knoten.
+    """
+    coords = {}
+    ways = []
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == "node":
+            coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+            elem.clear()
+        elif elem.tag == "way":
+            tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+            if tags.get("highway") in DRIVABLE_HIGHWAYS and tags.get("area") != "yes":
+                refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                ways.append((refs, _oneway(tags)))
+            elem.clear()
+
+    used = {ref for refs, _ in ways for ref in refs}
+    return {n: coords[n] for n in used if n in coords}, ways
+
+
+def build_network(nodes, ways, cell_m=DEFAULT_CELL_M):
+    """RoadNetwork aus read_osm-Ergebnis (fehlende Knoten trennen einen Weg auf)."""
+    ids = np.fromiter(nodes.keys(), dtype="int64", count=len(nodes))
+    ids.sort()
+    latlon = np.array([nodes[i] for i in ids.tolist()], dtype="float64").reshape(-1, 2)
+
+    u_list, v_list = [], []
+    for refs, oneway in ways:
+        refs = np.asarray(refs, dtype="int64")
+        pos = np.searchsorted(ids, refs)
+        pos = np.minimum(pos, len(ids) - 1)
+        ok = ids[pos] == refs
+        a, b = pos[:-1], pos[1:]
+        seg = ok[:-1] & ok[1:] & (a != b)
+        a, b = a[seg], b[seg]
+        if oneway >= 0:
+            u_list.append(a)
+            v_list.append(b)
+        if oneway <= 0:
+            u_list.append(b)
+            v_list.append(a)
+
+    u = np.concatenate(u_list) if u_list else np.empty(0, dtype="int64")
+    v = np.concatenate(v_list) if v_list else np.empty(0, dtype="int64")
+
+    # doppelte gerichtete Kanten (überlappende Wege) nur einmal
+    _, first = np.unique(u * len(ids) + v, return_index=True)
+    u, v = u[first], v[first]
+    return RoadNetwork(latlon[:, 0], latlon[:, 1], u, v, cell_m=cell_m)
+
+
+# ============================================================
+# Fahrweg zwischen Kandidaten
+# ============================================================
+def bounded_dijkstra(lists, source, targets, limit_m):
+    """Kürzeste Wege (m) von source zu den targets, Suche endet bei limit_m."""
+    indptr, indices, edges, length = lists[:4]
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    remaining = set(targets)
+    found = {}
+
+    while heap and remaining:
+        d, node = heapq.heappop(heap)
+        if d > dist.get(node, math.inf):
+            continue
+        if node in remaining:
+            remaining.discard(node)
+            found[node] = d
+        for k in range(indptr[node], indptr[node + 1]):
+            nd = d + length[edges[k]]
+            nxt = indices[k]
+            if nd <= limit_m and nd < dist.get(nxt, math.inf):
+                dist[nxt] = nd
+                heapq.heappush(heap, (nd, nxt))
+    return found
+
+
+def route_distances(lists, prev, cur, limit_m):
+    """
+    Matrix (Kandidaten prev x cur) der Fahrwege in m, inf = nicht erreichbar
+    innerhalb limit_m. prev/cur: (edge, offset_m) als Listen.
+    """
+    length, edge_u, edge_v = lists[3], lists[4], lists[5]
+    prev_edge, prev_off = prev
+    cur_edge, cur_off = cur
+    routes = np.full((len(prev_edge), len(cur_edge)), np.inf)
+    targets = {edge_u[e] for e in cur_edge}
+    reached = {}
+
+    for i, (ea, oa) in enumerate(zip(prev_edge, prev_off)):
+        rest = length[ea] - oa
+        end = edge_v[ea]
+        if end not in reached:
+            reached[end] = bounded_dijkstra(lists, end, targets, limit_m)
+        from_end = reached[end]
+
+        for j, (eb, ob) in enumerate(zip(cur_edge, cur_off)):
+            if eb == ea and ob >= oa - BACKWARD_TOLERANCE_M:
+                routes[i, j] = max(ob - oa, 0.0)
+                continue
+            d = from_end.get(edge_u[eb])
+            if d is not None:
+                routes[i, j] = rest + d + ob
+    return routes
+
+
+# ============================================================
+# Viterbi
+# ============================================================
+def match_track(network, lat, lon, radius_m=DEFAULT_RADIUS_M, sigma_m=DEFAULT_SIGMA_M,
+                beta_m=DEFAULT_BETA_M, max_candidates=DEFAULT_MAX_CANDIDATES):
+    """
+    Gematchte Koordinaten für eine zeitlich sortierte Punktfolge.
+    Rückgabe: (lat_matched, lon_matched) als Arrays, NaN = kein Match.
+    Punkte ohne gültige Koordinate (NaN) bleiben ungematcht und beenden die
+    Kette wie Punkte ohne Kandidaten.
+    """
+    x, y = network.project(np.asarray(lat, dtype="float64"), np.asarray(lon, dtype="float64"))
+    n = len(x)
+    out_x = np.full(n, np.nan)
+    out_y = np.full(n, np.nan)
+    lists = network.search_lists()
+
+    chain = []      # pro Punkt der aktuellen Kette: (Index, px, py, Rückzeiger)
+    score = None    # log-Wahrscheinlichkeit je Kandidat des letzten Punkts
+    prev = None     # (edge, offset) des letzten Punkts
+
+    def finish():
+        # wahrscheinlichsten Pfad der Kette rückwärts ablesen
+        if not chain:
+            return
+        j = int(np.argmax(score))
+        for i, px, py, back in reversed(chain):
+            out_x[i], out_y[i] = px[j], py[j]
+            j = back[j] if back is not None else j
+        chain.clear()
+
+    finite = np.isfinite(x) & np.isfinite(y)
+    for i in range(n):
+        if finite[i]:
+            edges, offsets, dists, px, py = network.candidates(x[i], y[i], radius_m, max_candidates)
+        if not finite[i] or len(edges) == 0:
+            finish()
+            score = prev = None
+            continue
+
+        emission = -0.5 * (dists / sigma_m) ** 2
+        cur = (edges.tolist(), offsets.tolist())
+        back = None
+
+        if prev is not None:
+            gc = math.hypot(x[i] - x[i - 1], y[i] - y[i - 1])
+            limit = max(gc * ROUTE_LIMIT_FACTOR, gc + ROUTE_LIMIT_MIN_M)
+            routes = route_distances(lists, prev, cur, limit)
+            total = score[:, None] - np.abs(routes - gc) / beta_m
+            back = np.argmax(total, axis=0)
+            best = total[back, np.arange(len(edges))]
+            if np.isfinite(best).any():
+                score = best + emission
+            else:
+                # keine Verbindung im Netz (Lücke, fehlende Straße) -> neue Kette
+                finish()
+                back = None
+
+        if back is None:
+            score = emission
+        chain.append((i, px, py, None if back is None else back.tolist()))
+        prev = cur
+
+    finish()
+    return network.unproject(out_x, out_y)
+
+
+# ============================================================
+# Parallel über mehrere Prozesse
+# ============================================================
+_worker_network = None
+
+
+def _init_worker(network_path):
+    global _worker_network
+    _worker_network = RoadNetwork.load(network_path)
+
+
+def _match_part(args):
+    lat, lon, keep_from, keep_to, params = args
+    lat_m, lon_m = match_track(_worker_network, lat, lon, **params)
+    return lat_m[keep_from:keep_to], lon_m[keep_from:keep_to]
+
+
+def split_parts(n, part_size=PART_SIZE, overlap=PART_OVERLAP):
+    """[(von, bis, behalte_von, behalte_bis)] – Teile mit Überlappung, Ergebnis ohne Rand."""
+    parts = []
+    for start in range(0, n, part_size):
+        stop = min(start + part_size, n)
+        lo, hi = max(start - overlap, 0), min(stop + overlap, n)
+        parts.append((lo, hi, start - lo, stop - lo))
+    return parts
+
+
+class LocalMatcher:
+    """
+    Hält das Netz (und bei workers > 1 einen Prozess-Pool, jeder Worker lädt
+    das Netz einmal). match_chunk ist ein Ersatz für match_osrm.match_chunk.
+    """
+
+    def __init__(self, network_path, workers=None, part_size=PART_SIZE, overlap=PART_OVERLAP, **params):
+        self.network_path = network_path
+        self.workers = workers or os.cpu_count() or 1
+        self.part_size = part_size
+        self.overlap = overlap
+        self.params = params
+        self._network = None
+        self._pool = None
+
+    @property
+    def network(self):
+        if self._network is None:
+            self._network = RoadNetwork.load(self.network_path)
+        return self._network
+
+    def match(self, lat, lon):
+        lat = np.asarray(lat, dtype="float64")
+        lon = np.asarray(lon, dtype="float64")
+        parts = split_parts(len(lat), self.part_size, self.overlap)
+
+        if self.workers <= 1 or len(parts) <= 1:
+            return match_track(self.network, lat, lon, **self.params)
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                             initargs=(str(self.network_path),))
+        jobs = [(lat[lo:hi], lon[lo:hi], keep_from, keep_to, self.params)
+                for lo, hi, keep_from, keep_to in parts]
+        results = list(self._pool.map(_match_part, jobs))
+        return (np.concatenate([r[0] for r in results]),
+                np.concatenate([r[1] for r in results]))
+
+    def match_chunk(self, chunk):
+        """Wie match_osrm.match_chunk: Chunk mit lat/lon -> Kopie mit lat_matched/lon_matched."""
+        out = chunk.copy()
+        if len(chunk) == 0:
+            return out
+        lat_m, lon_m = self.match(chunk["lat"].to_numpy(), chunk["lon"].to_numpy())
+        out["lat_matched"] = lat_m
+        out["lon_matched"] = lon_m
+        return out
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+# ============================================================
+# Kommandozeile
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Lokales Map Matching (HMM) ohne OSRM")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Straßennetz aus OSM-XML bauen")
+    p_build.add_argument("osm", help="OSM-Extrakt (.osm)")
+    p_build.add_argument("--out", default="road_network.npz")
+    p_build.add_argument("--cell-m", type=float, default=DEFAULT_CELL_M)
+
+    p_match = sub.add_parser("match", help="Fahrt matchen (Pfade wie in match_osrm.py)")
+    p_match.add_argument("--network", default="road_network.npz")
+    p_match.add_argument("--workers", type=int, default=None, help="Prozesse (Standard: alle Kerne)")
+    p_match.add_argument("--chunk-size", type=int, default=20_000,
+                         help="Punkte pro Matching-Aufruf (wird intern parallel aufgeteilt)")
+    p_match.add_argument("--radius-m", type=float, default=DEFAULT_RADIUS_M)
+    p_match.add_argument("--sigma-m", type=float, default=DEFAULT_SIGMA_M)
+    p_match.add_argument("--beta-m", type=float, default=DEFAULT_BETA_M)
+
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        nodes, ways = read_osm(args.osm)
+        network = build_network(nodes, ways, cell_m=args.cell_m)
+        network.save(args.out)
+        print(f"{len(network)} Knoten, {len(network.u)} gerichtete Kanten -> {args.out}")
+        return
+
+    import match_osrm
+
+    matcher = LocalMatcher(args.network, workers=args.workers, radius_m=args.radius_m,
+                           sigma_m=args.sigma_m, beta_m=args.beta_m)
+    try:
+        match_osrm.main(match=matcher.match_chunk, chunk_size=args.chunk_size, label="lokal")
+    finally:
+        matcher.close()
+
+
+if __name__ == "__main__":
+    main()
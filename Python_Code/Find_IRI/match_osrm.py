@@ -1,8 +1,13 @@
 import pandas as pd
+import numpy as np
 import requests
 import math
 from pathlib import Path
 
+from roadlab_reader import iter_path_chunks, load_roughness
+from interval_join import IntervalJoiner
+from track_filter import TrackFilter, with_lookahead
+
 # ==============================
 # 1. KONFIGURATION
 # ==============================
@@ -10,6 +15,7 @@ from pathlib import Path
 # OSRM-Server:
 # - Public Demo: "https://router.project-osrm.org"
 # - Eigener Server: z.B. "http://localhost:5000"
+# - Ganz ohne Server: match_local.py (HMM-Matching auf einem OSM-Extrakt)
 OSRM_BASE_URL = "https://router.project-osrm.org"
 
 # Ordner, in dem dieses Skript liegt (AWS_Creat)
@@ -24,32 +30,37 @@ ROUGHNESS_CSV = BASE_DIR.parent / "Find_IRI" / "RoadLabPro" / "f_Link_0002_Rough
 # Ausgabe-Datei (mit gesnappten Punkten + Zustand)
 OUTPUT_CSV = BASE_DIR.parent / "Find_IRI" / "f_Link_0002_Path_2025_11_17_08_33_matched.csv"
 
-# ==============================
-# 2. CSV EINLESEN UND VORBEREITEN
-# ==============================
-
-print("Lese CSV ein:", INPUT_CSV)
-df = pd.read_csv(INPUT_CSV)
+# Ausgabe-Datei mit einer Zeile pro Roughness-Intervall (Geometrie + Zustand)
+OUTPUT_INTERVALS_CSV = BASE_DIR.parent / "Find_IRI" / "f_Link_0002_Roughness_2025_11_17_08_33_intervals.csv"
 
-# Zeitstempel steht in deinem Export im Index (z. B. "08:32:40 2025-November-17")
-# -> Index in Spalte holen und in datetime umwandeln
-df = df.rename_axis("timestamp_str").reset_index()
-df["timestamp"] = pd.to_datetime(df["timestamp_str"])
+# Spalten der Ausgabe-CSV (werden von AWS_Creat/import_roadlab_csv.py gelesen)
+OUTPUT_COLUMNS = [
+    "lat_matched", "lon_matched", "Roughness",
+    "iri", "condition_code", "speed_kmh", "interval_id", "recorded_at",
+]
 
-# Lat/Lon aus RoadLab (in deinem Export so beobachtet):
-# Interval_Number ≈ Breitengrad (lat, ca. 50.x)
-# Point_Latitude  ≈ Längengrad (lon, ca. 8.x)
-df["lat"] = df["Interval_Number"]
-df["lon"] = df["Point_Latitude"]
+# OSRM kann bis zu ca. 100 Koordinaten pro Request, wir nehmen 80 zur Sicherheit
+CHUNK_SIZE = 80
 
-# Sicherheitsfilter: Koordinaten (0,0) entfernen
-df = df[(df["lat"] != 0) & (df["lon"] != 0)].reset_index(drop=True)
+# So viele Path-Zeilen werden auf einmal gelesen und vorgefiltert; die
+# verbliebenen Punkte gehen dann in Requests zu je CHUNK_SIZE an OSRM
+READ_CHUNK_SIZE = 2000
 
-print("Anzahl Punkte nach Filter:", len(df))
+# Vorfilter (track_filter.py): Sprünge, Standzeiten, dichte Punkte werden
+# nicht gematcht, bekommen aber das Match ihres Vorgängers. None = aus.
+TRACK_FILTER = {
+    "max_speed_kmh": 200.0,
+    "stationary_kmh": 1.0,
+    "stationary_m": 3.0,
+    "min_distance_m": 10.0,
+    "min_interval_s": 0.0,
+}
 
+# False: gefilterte Zeilen nicht in die Ausgabe schreiben (weniger Zeilen in der DB)
+KEEP_FILTERED_ROWS = True
 
 # ==============================
-# 3. FUNKTION: EINEN CHUNK MIT OSRM MAP MATCHING SCHICKEN
+# 2. FUNKTION: EINEN CHUNK MIT OSRM MAP MATCHING SCHICKEN
 # ==============================
 
 def match_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
@@ -108,66 +119,88 @@ def match_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-# ==============================
-# 4. TRACK IN CHUNKS TEILEN & MATCHEN
-# ==============================
-
-# OSRM kann bis zu ca. 100 Koordinaten pro Request, wir nehmen 80 zur Sicherheit
-chunk_size = 80
-chunks = [df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
-
-matched_chunks = []
-for i, ch in enumerate(chunks, start=1):
-    print(f"Bearbeite Chunk {i}/{len(chunks)} mit {len(ch)} Punkten...")
-    matched_chunks.append(match_chunk(ch))
-
-df_matched = pd.concat(matched_chunks, ignore_index=True)
-
-print("Map Matching (OSRM) fertig, Gesamtpunkte:", len(df_matched))
-
-
-# ==============================
-# 4b. ROUGHNESS / IRI DAZUJOINEN
-# ==============================
-
-print("Lese Roughness-CSV ein:", ROUGHNESS_CSV)
-df_rough = pd.read_csv(ROUGHNESS_CSV)
-
-print("Spalten in Roughness-CSV:", df_rough.columns.tolist())
-
-# Nur relevante Spalten auswählen und bei Bedarf hier anpassen:
-# Mindestens: Interval_Number, Roughness
-rough_cols = ["Interval_Number", "Roughness"]
-# Falls eine IRI-Spalte existiert, einfach hinzufügen:
-# rough_cols = ["Interval_Number", "Roughness", "IRI"]
-
-df_rough_small = df_rough[rough_cols].copy()
-
-# Nach Interval_Number sortieren (wichtig für merge_asof)
-df_matched_sorted = df_matched.sort_values("Interval_Number")
-df_rough_sorted = df_rough_small.sort_values("Interval_Number")
-
-# Nächsten passenden Roughness-Eintrag an jeden Punkt hängen
-df_final = pd.merge_asof(
-    df_matched_sorted,
-    df_rough_sorted,
-    on="Interval_Number",
-    direction="nearest"
-)
+def match_selected(chunk, keep, match, chunk_size, track_filter):
+    """
+    Nur die Zeilen mit keep=True matchen (in Teilen zu chunk_size) und
+    lat_matched/lon_matched für alle Zeilen des Chunks zurückgeben.
+    """
+    selected = chunk[keep]
+    lat_m = np.empty(0)
+    lon_m = np.empty(0)
+    if len(selected):
+        parts = [match(selected.iloc[k:k + chunk_size]) for k in range(0, len(selected), chunk_size)]
+        matched = pd.concat(parts)
+        lat_m = matched["lat_matched"].to_numpy(dtype="float64")
+        lon_m = matched["lon_matched"].to_numpy(dtype="float64")
 
-print("Nach Join: Spalten in df_final:", df_final.columns.tolist())
+    if track_filter is None:
+        return lat_m, lon_m
+    return track_filter.expand(keep, lat_m, lon_m)
 
 
 # ==============================
-# 5. ERGEBNIS ALS NEUE CSV SPEICHERN
+# 3. TRACK CHUNKWEISE MATCHEN & SPEICHERN
 # ==============================
 
-# Nur relevante Spalten behalten
-df_final = df_final[["lat_matched", "lon_matched", "Roughness"]]
-
-# Optional: nur Zeilen mit gültigen Matches
-# df_final = df_final.dropna(subset=["lat_matched", "lon_matched"])
-
-df_final.to_csv(OUTPUT_CSV, index=False)
-print("Gespeichert als:", OUTPUT_CSV)
-print("Fertig! :)")
+def main(match=match_chunk, chunk_size=CHUNK_SIZE, label="OSRM"):
+    """
+    match: Funktion Chunk -> Chunk mit lat_matched/lon_matched (Standard:
+    OSRM /match, lokal: match_local.LocalMatcher.match_chunk).
+    """
+    # Roughness-CSV ist klein (eine Zeile pro Intervall) -> einmal vorab laden
+    print("Lese Roughness-CSV ein:", ROUGHNESS_CSV)
+    df_rough = load_roughness(ROUGHNESS_CSV)
+    print("Intervalle in Roughness-CSV:", len(df_rough))
+
+    # Intervall-Geometrie (Start/Ende, Länge, Chainage, Zustand) speichern
+    joiner = IntervalJoiner(df_rough)
+    joiner.segments.to_csv(OUTPUT_INTERVALS_CSV, index=False)
+    print("Intervall-Segmente gespeichert als:", OUTPUT_INTERVALS_CSV)
+
+    # Path-CSV wird gestreamt: lesen -> matchen -> Intervall zuordnen -> anhängen.
+    # Es liegt immer nur ein Chunk im Speicher.
+    print("Lese CSV ein:", INPUT_CSV)
+    total_points = 0
+    first = True
+    track_filter = TrackFilter(**TRACK_FILTER) if TRACK_FILTER is not None else None
+
+    # die letzten Zeilen jedes Chunks kommen erst mit dem nächsten dran,
+    # damit der Sprung-Test am Chunkende den Folgepunkt kennt
+    chunks = with_lookahead(iter_path_chunks(INPUT_CSV, max(chunk_size, READ_CHUNK_SIZE)))
+    for i, (ch, ahead) in enumerate(chunks, start=1):
+        keep = track_filter.select(ch, ahead) if track_filter else np.ones(len(ch), dtype=bool)
+        print(f"Bearbeite Chunk {i} mit {len(ch)} Punkten ({int(keep.sum())} zum Matching)...")
+        lat_m, lon_m = match_selected(ch, keep, match, chunk_size, track_filter)
+
+        # Intervall-Join über alle Originalzeilen (Chainage wie ohne Filter)
+        df_final = joiner.join(ch.assign(lat_matched=lat_m, lon_matched=lon_m))
+        if not KEEP_FILTERED_ROWS:
+            df_final = df_final[keep]
+
+        # Nur relevante Spalten behalten. "Roughness" enthält in der
+        # Ausgabe wie bisher die Zustandskategorie (GOOD, FAIR, ...),
+        # der numerische IRI-Wert steht in "iri".
+        df_final = df_final.rename(columns={
+            "Roughness": "iri",
+            "Speed": "speed_kmh",
+            "timestamp": "recorded_at",   # Zeit der Fahrt (Path "Time")
+        })
+        df_final = df_final.rename(columns={"Condition_Category": "Roughness"})
+        df_final = df_final[OUTPUT_COLUMNS]
+
+        # Optional: nur Zeilen mit gültigen Matches
+        # df_final = df_final.dropna(subset=["lat_matched", "lon_matched"])
+
+        df_final.to_csv(OUTPUT_CSV, mode="w" if first else "a", header=first, index=False)
+        first = False
+        total_points += len(df_final)
+
+    if track_filter:
+        print("Vorfilter:", track_filter.summary())
+    print(f"Map Matching ({label}) fertig, Gesamtpunkte:", total_points)
+    print("Gespeichert als:", OUTPUT_CSV)
+    print("Fertig! :)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import pandas as pd
+
+# ==============================
+# RoadLab-Export: Spalten & Datentypen
+# ==============================
+
+# Hinweis zum Export-Format:
+# Jede Datenzeile endet mit einem zusätzlichen Komma. Ohne index_col=False
+# nimmt pandas deshalb die erste Spalte ("Time") als Index und alle
+# Spaltennamen rutschen um eins nach links (Interval_Number enthielt dann
+# den Breitengrad usw.). Mit index_col=False passen Namen und Werte wieder.
+
+# Path-CSV: nur die Spalten, die wir fürs Matching brauchen
+PATH_COLUMNS = ["Time", "Interval_Number", "Point_Latitude", "Point_Longitude", "Speed"]
+PATH_DTYPES = {
+    "Time": "string",
+    "Interval_Number": "int32",
+    "Point_Latitude": "float64",
+    "Point_Longitude": "float64",
+    "Speed": "float32",
+}
+
+# Zustandskategorien in Code-Reihenfolge: .cat.codes ergibt direkt den
+# condition_code (wie STATE_NAMES in FindeRoad/road_states.py)
+CONDITION_CATEGORIES = ["NOT MEASURED", "VERY GOOD", "GOOD", "FAIR", "POOR", "VERY POOR"]
+
+# Roughness-CSV: von den 50+ Spalten brauchen wir nur diese
+ROUGHNESS_COLUMNS = [
+    "Interval_Number",
+    "Interval_Start_Latitude", "Interval_Start_Longitude",
+    "Interval_End_Latitude", "Interval_End_Longitude",
+    "Interval_Length",
+    "Roughness", "Condition_Category",
+]
+ROUGHNESS_DTYPES = {
+    "Interval_Number": "int32",
+    "Interval_Start_Latitude": "float64",
+    "Interval_Start_Longitude": "float64",
+    "Interval_End_Latitude": "float64",
+    "Interval_End_Longitude": "float64",
+    "Interval_Length": "float32",
+    "Roughness": "float32",  # IRI in m/km, leer = nicht gemessen
+    "Condition_Category": pd.CategoricalDtype(CONDITION_CATEGORIES),
+}
+
+# Zeitformat im Export, z. B. "08:32:40 2025-November-17"
+TIME_FORMAT = "%H:%M:%S %Y-%B-%d"
+
+
+# ==============================
+# Path-CSV streamen
+# ==============================
+
+def iter_path_chunks(csv_path, chunk_size=80):
+    """
+    Liest eine RoadLab-Path-CSV stückweise ein und gibt DataFrames mit
+    höchstens chunk_size Punkten zurück (Generator).
+
+    Jeder Chunk enthält zusätzlich die Spalten timestamp, lat und lon;
+    Punkte mit Koordinaten (0,0) sind bereits entfernt. Es liegt immer nur
+    ein Chunk im Speicher, egal wie lang die Fahrt ist.
+    """
+    reader = pd.read_csv(
+        csv_path,
+        index_col=False,
+        usecols=PATH_COLUMNS,
+        dtype=PATH_DTYPES,
+        chunksize=chunk_size,
+    )
+
+    for chunk in reader:
+        chunk = chunk.rename(columns={"Point_Latitude": "lat", "Point_Longitude": "lon"})
+
+        # Sicherheitsfilter: Koordinaten (0,0) entfernen
+        chunk = chunk[(chunk["lat"] != 0) & (chunk["lon"] != 0)]
+        if chunk.empty:
+            continue
+
+        chunk = chunk.assign(
+            timestamp=pd.to_datetime(chunk["Time"], format=TIME_FORMAT)
+        ).reset_index(drop=True)
+        yield chunk
+
+
+# ==============================
+# Roughness-CSV (klein: eine Zeile pro Intervall)
+# ==============================
+
+def load_roughness(csv_path):
+    """
+    Lädt aus der RoadLab-Roughness-CSV nur Interval_Number, Start-/End-
+    Koordinaten, Interval_Length, Roughness (IRI) und Condition_Category,
+    sortiert nach Interval_Number.
+    """
+    df = pd.read_csv(
+        csv_path,
+        index_col=False,
+        usecols=ROUGHNESS_COLUMNS,
+        dtype=ROUGHNESS_DTYPES,
+    )
+    return df.sort_values("Interval_Number").reset_index(drop=True)
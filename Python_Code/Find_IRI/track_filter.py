@@ -0,0 +1,252 @@
+import numpy as np
+import pandas as pd
+
+from interval_join import haversine_m
+
+# ==============================
+# Vorfilter vor dem Map Matching
+# ==============================
+#
+# Der Path-Export enthält viele Punkte, die fürs Matching nichts beitragen:
+# Standzeiten (Speed 0, gleiche Koordinate), sehr dicht liegende Fixes und
+# einzelne GPS-Sprünge. TrackFilter wählt pro Chunk die Punkte aus, die
+# wirklich gematcht werden, in vier Schritten (alle vektorisiert, jeder
+# einzeln abschaltbar mit 0/None):
+#
+#   1. Sprünge: Verbindung mit unplausibler Geschwindigkeit (> max_speed_kmh).
+#      Gestrichen wird der Endpunkt, ohne den die Fahrt wieder plausibel ist
+#      (Ausreißer); bleibt sie auch dann unplausibel, ist es eine echte Lücke.
+#   2. Stand: Speed <= stationary_kmh und weniger als stationary_m vom
+#      vorigen Punkt entfernt (gleiche Koordinate wird immer gestrichen).
+#   3. Abstand: höchstens ein Punkt pro min_distance_m gefahrener Strecke.
+#   4. Zeit: höchstens ein Punkt pro min_interval_s.
+#
+# Zuordnung zurück: expand() gibt jeder Originalzeile das Match des
+# letzten ausgewählten Punkts davor (Stand/Duplikat -> gleicher Ort). Die
+# Zeilen bleiben also erhalten und der Intervall-Join läuft wie bisher
+# über alle Originalpunkte. Der Zustand (letzte Punkte, Strecke, Match)
+# wird zwischen den Chunks mitgeführt.
+#
+# Chunkgrenzen: Ob ein Punkt ein Sprung ist, hängt auch vom folgenden
+# Punkt ab. with_lookahead() hält deshalb die letzten _CONTEXT Zeilen jedes
+# Chunks zurück und reicht sie als Vorschau an select() weiter; entschieden
+# werden sie erst mit dem nächsten Chunk (bzw. am Dateiende). Das Ergebnis
+# ist so unabhängig von der Chunkgröße.
+
+DEFAULT_MAX_SPEED_KMH = 200.0
+DEFAULT_STATIONARY_KMH = 1.0
+DEFAULT_STATIONARY_M = 3.0
+DEFAULT_MIN_DISTANCE_M = 10.0
+DEFAULT_MIN_INTERVAL_S = 0.0
+
+# Zeitstempel haben Sekundenauflösung -> für die Geschwindigkeit mind. 1 s
+MIN_DT_S = 1.0
+
+# Punkte aus dem vorigen Chunk, die für den Sprung-Test mitgeführt werden,
+# und zurückgehaltene Punkte am Chunkende
+_CONTEXT = 2
+
+REASONS = ("jump", "stationary", "distance", "interval")
+
+
+def with_lookahead(chunks, rows=_CONTEXT):
+    """
+    (chunk, vorschau) je Chunk: die letzten rows Zeilen werden zurückgehalten
+    und stehen am Anfang des nächsten Chunks; bis dahin sind sie die Vorschau
+    (None beim letzten Chunk).
+    """
+    held = None
+    for chunk in chunks:
+        if held is not None:
+            chunk = pd.concat([held, chunk], ignore_index=True)
+        if len(chunk) <= rows:
+            held = chunk
+            continue
+        held = chunk.iloc[-rows:].reset_index(drop=True)
+        yield chunk.iloc[:-rows].reset_index(drop=True), held
+    if held is not None and len(held):
+        yield held, None
+
+
+def _columns(chunk):
+    lat = chunk["lat"].to_numpy(dtype="float64")
+    lon = chunk["lon"].to_numpy(dtype="float64")
+    t = chunk["timestamp"].to_numpy().astype("datetime64[ms]").astype("int64") / 1000.0
+    return lat, lon, t
+
+
+class TrackFilter:
+    def __init__(self, max_speed_kmh=DEFAULT_MAX_SPEED_KMH, stationary_kmh=DEFAULT_STATIONARY_KMH,
+                 stationary_m=DEFAULT_STATIONARY_M, min_distance_m=DEFAULT_MIN_DISTANCE_M,
+                 min_interval_s=DEFAULT_MIN_INTERVAL_S):
+        self.max_speed_kmh = max_speed_kmh
+        self.stationary_kmh = stationary_kmh
+        self.stationary_m = stationary_m
+        self.min_distance_m = min_distance_m
+        self.min_interval_s = min_interval_s
+
+        # Rohpunkte vom Ende des vorigen Chunks (lat, lon, Sekunden)
+        self._ctx = (np.empty(0), np.empty(0), np.empty(0))
+        # letzter nicht als Sprung gestrichener Punkt und Strecke bis dahin
+        self._last = None
+        self._distance_m = 0.0
+        self._t0 = None
+        self._last_bucket = {"distance": None, "interval": None}
+        self._last_match = (np.nan, np.nan)
+
+        self.stats = {"total": 0, "kept": 0, **{r: 0 for r in REASONS}}
+
+    # --------------------------------------------------------
+    # Auswahl
+    # --------------------------------------------------------
+    def select(self, chunk, ahead=None):
+        """
+        Boolesche Maske: welche Zeilen des Chunks (lat, lon, timestamp, Speed)
+        gematcht werden. ahead sind die folgenden Zeilen der Fahrt (aus
+        with_lookahead), die hier nur für den Sprung-Test gelesen werden.
+        """
+        lat, lon, t = _columns(chunk)
+        speed = chunk["Speed"].to_numpy(dtype="float64")
+        n = len(lat)
+        keep = np.ones(n, dtype=bool)
+        if n == 0:
+            return keep
+        if self._t0 is None:
+            self._t0 = t[0]
+
+        jump = self._jumps(lat, lon, t, _columns(ahead) if ahead is not None else None)
+        keep &= ~jump
+        self.stats["jump"] += int(jump.sum())
+
+        # ab hier nur noch Punkte ohne Sprünge, mit dem letzten davon als Vorgänger
+        idx = np.flatnonzero(keep)
+        if len(idx):
+            plat, plon = lat[idx], lon[idx]
+            if self._last is None:
+                prev_lat = np.concatenate(([plat[0]], plat[:-1]))
+                prev_lon = np.concatenate(([plon[0]], plon[:-1]))
+            else:
+                prev_lat = np.concatenate(([self._last[0]], plat[:-1]))
+                prev_lon = np.concatenate(([self._last[1]], plon[:-1]))
+            step = haversine_m(prev_lat, prev_lon, plat, plon)
+            first_of_track = self._last is None
+
+            drop = np.zeros(len(idx), dtype=bool)
+            if self.stationary_kmh is not None:
+                stationary = (step == 0) | ((speed[idx] <= self.stationary_kmh) & (step < self.stationary_m))
+                if first_of_track:
+                    stationary[0] = False
+                self._drop(keep, idx, stationary, "stationary")
+                drop |= stationary
+
+            # Strecke/Zeit in Abschnitte teilen; von den noch verbliebenen
+            # Punkten bleibt nur der erste je Abschnitt
+            cum = self._distance_m + np.cumsum(step)
+            for reason, values, size in (("distance", cum, self.min_distance_m),
+                                         ("interval", t[idx] - self._t0, self.min_interval_s)):
+                alive = np.flatnonzero(~drop)
+                if not size or len(alive) == 0:
+                    continue
+                bucket = np.floor(values[alive] / size).astype("int64")
+                last = self._last_bucket[reason]
+                prev = np.concatenate(([-1 if last is None else last], bucket[:-1]))
+                repeat = np.zeros(len(idx), dtype=bool)
+                repeat[alive] = bucket == prev
+                self._drop(keep, idx, repeat, reason)
+                drop |= repeat
+                self._last_bucket[reason] = int(bucket[-1])
+
+            self._last = (plat[-1], plon[-1])
+            self._distance_m = float(cum[-1])
+
+        self._ctx = tuple(np.concatenate((c, v))[-_CONTEXT:] for c, v in zip(self._ctx, (lat, lon, t)))
+        self.stats["total"] += n
+        self.stats["kept"] += int(keep.sum())
+        return keep
+
+    def _drop(self, keep, idx, mask, reason):
+        keep[idx[mask]] = False
+        self.stats[reason] += int(mask.sum())
+
+    def _jumps(self, lat, lon, t, ahead=None):
+        """
+        Ausreißer je Punkt. Für jede unplausible Verbindung k -> k+1 wird k
+        gestrichen, wenn k-1 -> k+1 plausibel ist, sonst k+1, wenn k -> k+2
+        plausibel ist. Die letzten Punkte des vorigen Chunks dienen als
+        Vorgänger, die Vorschau (ahead) als Nachfolger; beide werden hier
+        nicht entschieden.
+        """
+        n = len(lat)
+        if not self.max_speed_kmh:
+            return np.zeros(n, dtype=bool)
+
+        c = len(self._ctx[0])
+        parts = [self._ctx, (lat, lon, t)] + ([ahead] if ahead is not None else [])
+        lat, lon, t = (np.concatenate(cols) for cols in zip(*parts))
+        m = len(lat)
+        max_mps = self.max_speed_kmh / 3.6
+
+        def plausible(lag):
+            # Verbindung i -> i+lag (Länge m - lag)
+            if m <= lag:
+                return np.zeros(0, dtype=bool)
+            d = haversine_m(lat[:-lag], lon[:-lag], lat[lag:], lon[lag:])
+            dt = np.maximum(t[lag:] - t[:-lag], MIN_DT_S)
+            return d / dt <= max_mps
+
+        ok1 = plausible(1)
+        ok2 = plausible(2)
+        bad = np.flatnonzero(~ok1)
+
+        # k-1 -> k+1 plausibel -> k ist der Ausreißer
+        skip_k = np.zeros(len(bad), dtype=bool)
+        has_prev = bad >= 1
+        skip_k[has_prev] = ok2[bad[has_prev] - 1]
+        # sonst k -> k+2 plausibel -> k+1 ist der Ausreißer
+        skip_next = np.zeros(len(bad), dtype=bool)
+        has_next = bad + 2 < m
+        skip_next[has_next] = ok2[bad[has_next]]
+        skip_next &= ~skip_k
+
+        jump = np.zeros(m, dtype=bool)
+        jump[bad[skip_k]] = True
+        jump[bad[skip_next] + 1] = True
+        return jump[c:c + n]
+
+    # --------------------------------------------------------
+    # Zuordnung zurück auf die Originalzeilen
+    # --------------------------------------------------------
+    def expand(self, keep, lat_matched, lon_matched):
+        """
+        Match der ausgewählten Punkte (in Reihenfolge) -> Arrays für alle
+        Zeilen des Chunks. Gestrichene Zeilen bekommen das Match des letzten
+        ausgewählten Punkts davor (am Fahrtanfang: des nächsten danach).
+        """
+        n = len(keep)
+        idx = np.flatnonzero(keep)
+        lat_matched = np.asarray(lat_matched, dtype="float64")
+        lon_matched = np.asarray(lon_matched, dtype="float64")
+        lat_out = np.full(n, np.nan)
+        lon_out = np.full(n, np.nan)
+        if len(idx) == 0:
+            lat_out[:], lon_out[:] = self._last_match
+            return lat_out, lon_out
+
+        # Position des letzten ausgewählten Punkts <= Zeile (-1 = keiner im Chunk)
+        rep = np.searchsorted(idx, np.arange(n), side="right") - 1
+        before = rep < 0
+        lat_out[~before] = lat_matched[rep[~before]]
+        lon_out[~before] = lon_matched[rep[~before]]
+        if np.isnan(self._last_match[0]):
+            lat_out[before], lon_out[before] = lat_matched[0], lon_matched[0]
+        else:
+            lat_out[before], lon_out[before] = self._last_match
+
+        self._last_match = (lat_out[-1], lon_out[-1])
+        return lat_out, lon_out
+
+    def summary(self):
+        s = self.stats
+        return (f"{s['kept']} von {s['total']} Punkten gematcht "
+                f"(gestrichen: Sprung {s['jump']}, Stand {s['stationary']}, "
+                f"Abstand {s['distance']}, Zeit {s['interval']})")
@@ -1,10 +1,19 @@
+# timing zuerst: Startzeitpunkt für den Startbericht
+import timing
+
 import tkinter as tk
 from tkinter import messagebox
-import requests
 from urllib.parse import quote
 import webbrowser
+import logging
+
+import show_route2  # unser Modul (folium/requests lädt es erst bei Bedarf)
+
+timing.startup_mark("imports")
 
-import show_route2  # unser Modul
+# Startbericht (ROUTE_TIMING=1) als JSON-Zeile auf der Konsole ausgeben
+if timing.ENABLED:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 # ----------------- MAPBOX KONFIGURATION -----------------
 
@@ -28,6 +37,8 @@ MAX_MATCH_DISTANCE_M = 50.0  # Matching-Radius in Metern (Punkt→Segment)
 # Geocoding-Funktion (Adresse -> lat/lon) über Mapbox
 # ============================================================
 def geocode_address_to_latlon(address: str):
+    import requests
+
     encoded_address = quote(address)
 
     url = (
@@ -52,12 +63,15 @@ def geocode_address_to_latlon(address: str):
 def build_route_coords(start_lat, start_lon, dest_lat, dest_lon):
     """
     Nutzt OSRM Route API.
-    Rückgabe: Liste von (lat, lon).
+    Rückgabe: Array (n, 2) mit [lat, lon] (Geometrie als polyline6).
     """
+    import requests
+    import polyline
+
     url = (
         f"{OSRM_BASE_URL}/route/v1/driving/"
         f"{start_lon},{start_lat};{dest_lon},{dest_lat}"
-        "?overview=full&geometries=geojson"
+        "?overview=full&geometries=polyline6"
     )
 
     resp = requests.get(url, headers=DEFAULT_HEADERS)
@@ -67,9 +81,7 @@ def build_route_coords(start_lat, start_lon, dest_lat, dest_lon):
     if not data.get("routes"):
         raise ValueError("Keine Route von OSRM gefunden.")
 
-    coords = data["routes"][0]["geometry"]["coordinates"]  # [ [lon, lat], ... ]
-    route_coords = [(lat, lon) for lon, lat in coords]
-    return route_coords
+    return polyline.decode(data["routes"][0]["geometry"])
 
 
 # ============================================================
@@ -111,15 +123,20 @@ entry_price_f = tk.Entry(frame, width=10)
 entry_price_f.insert(0, "0.70")
 entry_price_f.grid(row=4, column=1, sticky="w")
 
-tk.Label(frame, text="Preis pro km (VERY POOR):").grid(row=5, column=0, sticky="w", padx=5)
+tk.Label(frame, text="Preis pro km (POOR):").grid(row=5, column=0, sticky="w", padx=5)
+entry_price_p = tk.Entry(frame, width=10)
+entry_price_p.insert(0, "0.80")
+entry_price_p.grid(row=5, column=1, sticky="w")
+
+tk.Label(frame, text="Preis pro km (VERY POOR):").grid(row=6, column=0, sticky="w", padx=5)
 entry_price_vp = tk.Entry(frame, width=10)
 entry_price_vp.insert(0, "0.90")
-entry_price_vp.grid(row=5, column=1, sticky="w")
+entry_price_vp.grid(row=6, column=1, sticky="w")
 
-tk.Label(frame, text="Preis pro km (NOT MEASURED):").grid(row=6, column=0, sticky="w", padx=5)
+tk.Label(frame, text="Preis pro km (NOT MEASURED):").grid(row=7, column=0, sticky="w", padx=5)
 entry_price_nm = tk.Entry(frame, width=10)
 entry_price_nm.insert(0, "0.30")
-entry_price_nm.grid(row=6, column=1, sticky="w")
+entry_price_nm.grid(row=7, column=1, sticky="w")
 
 
 # Label für Ergebnis
@@ -157,6 +174,7 @@ def on_calculate_route():
             "VERY GOOD": float(entry_price_vg.get().replace(",", ".")),
             "GOOD": float(entry_price_g.get().replace(",", ".")),
             "FAIR": float(entry_price_f.get().replace(",", ".")),
+            "POOR": float(entry_price_p.get().replace(",", ".")),
             "VERY POOR": float(entry_price_vp.get().replace(",", ".")),
             "NOT MEASURED": float(entry_price_nm.get().replace(",", ".")),
         }
@@ -179,7 +197,7 @@ def on_calculate_route():
         messagebox.showerror("Routing-Fehler", str(e))
         return
 
-    if not route_coords:
+    if len(route_coords) == 0:
         messagebox.showinfo("Info", "Es wurde keine Route gefunden.")
         return
 
@@ -235,4 +253,20 @@ btn_calc = tk.Button(
 )
 btn_calc.pack(padx=5, pady=10)
 
+
+# ----------------- Kaltstart -----------------
+# Fenster sofort zeigen; folium/requests + DB-Punkte lädt show_route2 im Hintergrund
+def on_warm_up_done():
+    timing.startup_mark("warm_up_done")
+    timing.log_startup()
+
+
+def on_first_window():
+    timing.startup_mark("first_window")
+    timing.log_startup()
+    show_route2.warm_up(on_done=on_warm_up_done)
+
+
+timing.startup_mark("gui_built")
+root.after(0, on_first_window)
 root.mainloop()
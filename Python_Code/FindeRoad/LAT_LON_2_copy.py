@@ -1,12 +1,26 @@
+# timing zuerst: Startzeitpunkt für den Startbericht
+import timing
+
 import tkinter as tk
 from tkinter import messagebox
-import requests
 from urllib.parse import quote
 import webbrowser
 import os
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
 
-# Importiert show_route2.py
+# Importiert show_route2.py (folium/requests lädt es erst bei Bedarf)
 import show_route2
+import congestion_cache
+
+timing.startup_mark("imports")
+
+# Zeitmessung (ROUTE_TIMING=1) als JSON-Zeile auf der Konsole ausgeben
+if timing.ENABLED:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 # ----------------- MAPBOX KONFIGURATION -----------------
 MAPBOX_ACCESS_TOKEN = (
@@ -19,10 +33,25 @@ DEFAULT_HEADERS = {
 
 MAX_MATCH_DISTANCE_M = 50.0  
 
+# Beobachtete Verkehrslage pro Kante/Zeitfenster (congestion_cache.py).
+# Die Datei kann groß sein -> erst beim ersten Zugriff bzw. im Hintergrund laden.
+_traffic_cache = None
+_traffic_cache_lock = threading.Lock()
+
+
+def get_traffic_cache():
+    global _traffic_cache
+    with _traffic_cache_lock:
+        if _traffic_cache is None:
+            _traffic_cache = congestion_cache.CongestionCache.load()
+        return _traffic_cache
+
 # ============================================================
 # Geocoding
 # ============================================================
 def geocode_address_to_latlon(address: str):
+    import requests
+
     encoded_address = quote(address)
     url = (
         f"https://api.mapbox.com/geocoding/v5/mapbox.places/"
@@ -41,8 +70,19 @@ def geocode_address_to_latlon(address: str):
 # ============================================================
 # Routing
 # ============================================================
-def build_route_data(waypoints, show_alternatives=False):
-    profile = "driving-traffic"
+def build_route_data(waypoints, show_alternatives=False, use_traffic_cache=False, save_traffic_cache=True):
+    """
+    use_traffic_cache=True: Route ohne Live-Verkehr anfragen ("driving", keine
+    congestion-Annotation) und die Verkehrsklassen aus traffic_cache nehmen.
+    Sonst werden die Live-Werte zusätzlich in traffic_cache gespeichert
+    (Datei nur mit save_traffic_cache=True schreiben).
+    """
+    import requests
+    import polyline
+
+    traffic_cache = get_traffic_cache()
+    profile = "driving" if use_traffic_cache else "driving-traffic"
+    annotations = "" if use_traffic_cache else "&annotations=congestion"
     coordinates_str = ";".join([f"{lon},{lat}" for lat, lon in waypoints])
     
     # Alternativen anfordern
@@ -52,7 +92,7 @@ def build_route_data(waypoints, show_alternatives=False):
 
     url = (
         f"https://api.mapbox.com/directions/v5/mapbox/{profile}/"
-        f"{coordinates_str}?geometries=geojson&overview=full&annotations=congestion"
+        f"{coordinates_str}?geometries=polyline6&overview=full{annotations}"
         f"&alternatives={alternatives_param}"
         f"&access_token={MAPBOX_ACCESS_TOKEN}"
     )
@@ -67,14 +107,21 @@ def build_route_data(waypoints, show_alternatives=False):
     all_routes_output = []
 
     for r_idx, route in enumerate(data["routes"]):
-        coords_raw = route["geometry"]["coordinates"]
-        route_coords = [(lat, lon) for lon, lat in coords_raw]
+        # polyline6-String -> Array (n, 2) [lat, lon]; show_route2 nimmt es direkt
+        route_coords = polyline.decode(route["geometry"])
 
         route_congestion = []
         if "legs" in route:
             for leg in route["legs"]:
                 if "annotation" in leg and "congestion" in leg["annotation"]:
                     route_congestion.extend(leg["annotation"]["congestion"])
+
+        if use_traffic_cache:
+            route_congestion = congestion_cache.route_congestion(route_coords.tolist(), None, traffic_cache)
+        elif route_congestion:
+            traffic_cache.record_route(route_coords.tolist(), route_congestion)
+            # Live-Lücken ("unknown") aus dem Cache füllen
+            route_congestion = congestion_cache.route_congestion(route_coords.tolist(), route_congestion, traffic_cache)
         
         all_routes_output.append({
             "coords": route_coords,
@@ -82,8 +129,82 @@ def build_route_data(waypoints, show_alternatives=False):
         })
         print(f"  -> Route {r_idx+1}: {len(route_coords)} Koordinaten")
 
+    if not use_traffic_cache and save_traffic_cache:
+        traffic_cache.save()
     return all_routes_output
 
+# ============================================================
+# Touren: Cache pro Adresse und Teilstrecke
+# ============================================================
+# Eine Tour mit n Wegpunkten wird als n-1 Teilstrecken (Wegpunkt i -> i+1)
+# geroutet. Geocoding wird pro Adresse, das Routing pro Wegpunkt-Paar
+# gecacht; die Klassifizierung jeder Teilstrecke cacht show_route2 (Geometrie
+# + Datenstand der API). Nach dem Einfügen, Löschen oder Verschieben eines
+# Stopps werden so nur die Teilstrecken neu angefragt und klassifiziert,
+# die es vorher nicht gab; die Summen werden danach zusammengeführt.
+LEG_CACHE_SIZE = 256
+# Live-Verkehr veraltet: solche Teilstrecken nach 5 min neu anfragen.
+# Teilstrecken mit Verkehr aus dem Cache gelten nur im selben Zeitfenster
+# (Wochentag + Uhrzeit-Fenster des congestion_cache), das steckt im Schlüssel.
+LIVE_LEG_TTL_S = 300
+
+_geocode_cache = OrderedDict()
+_leg_cache = OrderedDict()   # (start, ziel, alternativen, zeitfenster/None) -> (zeit, routen)
+_traffic_cache_dirty = False
+
+
+def geocode_cached(address):
+    key = " ".join(address.split()).lower()
+    latlon = _geocode_cache.get(key)
+    if latlon is None:
+        latlon = _geocode_cache[key] = geocode_address_to_latlon(address)
+        while len(_geocode_cache) > LEG_CACHE_SIZE:
+            _geocode_cache.popitem(last=False)
+    else:
+        timing.count("geocode_cache_hits")
+    return latlon
+
+
+def route_leg(start, end, show_alternatives=False, use_traffic_cache=False):
+    """Routen (wie build_route_data) von start nach end, aus dem Cache wenn möglich."""
+    global _traffic_cache_dirty
+    bucket = get_traffic_cache().bucket(datetime.now()) if use_traffic_cache else None
+    key = (start, end, bool(show_alternatives), bucket)
+    hit = _leg_cache.get(key)
+    if hit is not None and (use_traffic_cache or time.monotonic() - hit[0] < LIVE_LEG_TTL_S):
+        _leg_cache.move_to_end(key)
+        timing.count("leg_cache_hits")
+        return hit[1]
+
+    routes = build_route_data([start, end], show_alternatives=show_alternatives,
+                              use_traffic_cache=use_traffic_cache, save_traffic_cache=False)
+    _leg_cache[key] = (time.monotonic(), routes)
+    _traffic_cache_dirty = _traffic_cache_dirty or not use_traffic_cache
+    while len(_leg_cache) > LEG_CACHE_SIZE:
+        _leg_cache.popitem(last=False)
+    timing.count("legs_requested")
+    return routes
+
+
+def plan_routes(waypoints, show_alternatives=False, use_traffic_cache=False):
+    """
+    Rückgabe: (routes_data, as_tour). Zwei Wegpunkte -> Route(n) inkl.
+    Alternativen; mehr Wegpunkte -> eine Teilstrecke pro Paar (as_tour=True).
+    """
+    global _traffic_cache_dirty
+    if len(waypoints) == 2:
+        routes_data = route_leg(waypoints[0], waypoints[1], show_alternatives, use_traffic_cache)
+        as_tour = False
+    else:
+        routes_data = [route_leg(a, b, False, use_traffic_cache)[0]
+                       for a, b in zip(waypoints[:-1], waypoints[1:])]
+        as_tour = True
+
+    if _traffic_cache_dirty:
+        get_traffic_cache().save()  # einmal für alle neu angefragten Teilstrecken
+        _traffic_cache_dirty = False
+    return routes_data, as_tour
+
 # ============================================================
 # GUI
 # ============================================================
@@ -130,14 +251,18 @@ var_alternatives = tk.BooleanVar(value=False)
 chk_alt = tk.Checkbutton(buttons_frame, text="Alternativrouten suchen", variable=var_alternatives)
 chk_alt.pack(side="left")
 
+var_traffic_cache = tk.BooleanVar(value=False)
+chk_cache = tk.Checkbutton(buttons_frame, text="Verkehr aus Cache (ohne Live-Abfrage)", variable=var_traffic_cache)
+chk_cache.pack(side="left", padx=(10, 0))
+
 # Settings
 settings_frame = tk.Frame(main_frame)
 settings_frame.pack(pady=10, anchor="w", fill="x")
 
 tk.Label(settings_frame, text="1. Preis (€/km):", font=("Arial", 9, "bold")).grid(row=0, column=0, sticky="w")
 entries_price = {}
-labels_p = ["VERY GOOD", "GOOD", "FAIR", "VERY POOR", "NOT MEASURED"]
-defaults_p = ["0.40", "0.50", "0.70", "0.90", "0.30"]
+labels_p = ["VERY GOOD", "GOOD", "FAIR", "POOR", "VERY POOR", "NOT MEASURED"]
+defaults_p = ["0.40", "0.50", "0.70", "0.80", "0.90", "0.30"]
 for i, (lbl, val) in enumerate(zip(labels_p, defaults_p)):
     tk.Label(settings_frame, text=lbl).grid(row=i+1, column=0, sticky="w", padx=(0,5))
     e = tk.Entry(settings_frame, width=6)
@@ -179,18 +304,32 @@ def on_calculate_route():
     label_result.config(text="Geocoding...")
     root.update()
 
+    with timing.collect("on_calculate_route") as t:
+        calculate_and_show(addresses, price_per_km, traffic_multipliers)
+    if t is not None:
+        t.log_json()
+
+
+def calculate_and_show(addresses, price_per_km, traffic_multipliers):
     try:
-        waypoints = [geocode_address_to_latlon(a) for a in addresses]
+        with timing.span("geocode"):
+            waypoints = [geocode_cached(a) for a in addresses]
         label_result.config(text="Suche Routen...")
         root.update()
 
-        routes_data = build_route_data(waypoints, show_alternatives=var_alternatives.get())
+        with timing.span("routing"):
+            routes_data, as_tour = plan_routes(waypoints, show_alternatives=var_alternatives.get(),
+                                               use_traffic_cache=var_traffic_cache.get())
+        timing.count("route_vertices", sum(len(r["coords"]) for r in routes_data))
         
         # Info-Text, falls keine Alternativen gefunden wurden
         count = len(routes_data)
-        info_txt = f"{count} Route(n) gefunden."
-        if count == 1 and var_alternatives.get():
-            info_txt += " (Keine sinnvollen Alternativen verfügbar)"
+        if as_tour:
+            info_txt = f"Tour mit {count} Teilstrecken."
+        else:
+            info_txt = f"{count} Route(n) gefunden."
+            if count == 1 and var_alternatives.get():
+                info_txt += " (Keine sinnvollen Alternativen verfügbar)"
         
         label_result.config(text=f"{info_txt} Berechne Kosten...")
         root.update()
@@ -200,7 +339,8 @@ def on_calculate_route():
             price_per_km,
             traffic_multipliers=traffic_multipliers,
             max_dist_m=MAX_MATCH_DISTANCE_M,
-            output_html="route_map.html"
+            output_html="route_map.html",
+            as_tour=as_tour
         )
         
         lines = [info_txt]
@@ -209,7 +349,8 @@ def on_calculate_route():
             lines.append(f"Dist: {res['dist']:.2f}km | Kosten: {res['cost']:.2f}€")
         
         label_result.config(text="\n".join(lines))
-        webbrowser.open("route_map.html")
+        with timing.span("open_browser"):
+            webbrowser.open("route_map.html")
 
     except Exception as e:
         label_result.config(text="Fehler.")
@@ -218,4 +359,22 @@ def on_calculate_route():
 btn_calc = tk.Button(root, text="Route berechnen", command=on_calculate_route, bg="#4CAF50", fg="white", font=("Arial", 12, "bold"))
 btn_calc.pack(pady=10, fill="x", padx=20)
 
-root.mainloop()
\ No newline at end of file
+# ============================================================
+# Kaltstart: Fenster sofort zeigen, Schweres im Hintergrund laden
+# ============================================================
+def on_warm_up_done():
+    # läuft im Warm-up-Thread von show_route2 (nach folium + DB-Punkten)
+    get_traffic_cache()
+    timing.startup_mark("warm_up_done")
+    timing.log_startup()
+
+
+def on_first_window():
+    timing.startup_mark("first_window")
+    timing.log_startup()
+    show_route2.warm_up(on_done=on_warm_up_done)
+
+
+timing.startup_mark("gui_built")
+root.after(0, on_first_window)
+root.mainloop()
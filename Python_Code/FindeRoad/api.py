@@ -1,7 +1,27 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 import psycopg2
+import asyncio
+import json
 import math
 import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+import change_listener
+import db_replicas
+import metrics
+import point_index
+import polyline
+import stream_session
+import timing
+from route_pricing import price_route
+from road_states import NOT_MEASURED, STATE_NAMES, state_name
 
 # ============================================================
 # DB-Konfiguration
@@ -15,13 +35,268 @@ DB_CONFIG = {
     "sslmode": os.getenv("DB_SSLMODE", "require"),
 }
 
-app = FastAPI(title="Road State API")
+# Lese-Replikate (DB_REPLICA_HOSTS, siehe db_replicas.py): reine Lese-Queries
+# der Endpunkte gehen reihum an gesunde Replikate, sonst an den Primary.
+# Immer auf dem Primary (frischester Stand) laufen: Snapshot-Aufbau, LISTEN,
+# das Nachladen der Stream-Gebiete (nach einem NOTIFY vom Primary darf kein
+# nachhinkendes Replikat den alten Stand liefern) sowie /data_version und
+# /db_points (Clients cachen die Punkte unter der Version; beide müssen
+# denselben Stand zeigen).
+REPLICAS = db_replicas.ReplicaSet.from_env(DB_CONFIG)
+
+# ============================================================
+# Serving-Modus
+# ============================================================
+# "db"     : jede Anfrage liest POINT_TABLE (Standard)
+# "memory" : alle Punkte werden beim Start in einen PointIndex geladen,
+#            /road_state und /db_points laufen komplett im Prozess.
+#            Nach einem Import: POST /snapshot/reload
+# "mmap"   : wie "memory", aber der Index liegt in SNAPSHOT_FILE und wird
+#            von allen Worker-Prozessen nur lesend gemappt (gleicher RAM,
+#            egal wie viele Worker). Ersetzt ein Reload die Datei, mappen
+#            die übrigen Worker sie spätestens nach SNAPSHOT_CHECK_S neu.
+SERVING_MODE = os.getenv("ROAD_STATE_MODE", "db")
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "road_state_points.idx")
+SNAPSHOT_CHECK_S = float(os.getenv("SNAPSHOT_CHECK_S", "2"))
+
+# Quelle der Punkte: track_point (Rohpunkte) oder track_point_tile
+# (verdichtet, ein Punkt pro Kachel, siehe AWS_Creat/compact_track_points.py)
+POINT_TABLE = os.getenv("POINT_TABLE", "track_point")
+
+# Änderungen per Postgres LISTEN/NOTIFY verfolgen (Trigger aus
+# AWS_Creat/track_point_schema.sql): nur das geänderte Gebiet wird im
+# Snapshot bzw. in den Stream-Sessions neu geladen.
+LISTEN_CHANGES = os.getenv("LISTEN_CHANGES", "0") == "1"
+
+# Aktueller Snapshot (PointIndex). Wird bei einem Reload komplett neu
+# gebaut und dann mit einer einzigen Zuweisung ersetzt; laufende Anfragen
+# arbeiten bis zum Ende mit dem alten Objekt weiter.
+SNAPSHOT = None
+_reload_lock = threading.Lock()
+_next_file_check = 0.0
+
+# offene Fahrzeug-Verbindungen (für gezieltes Verwerfen ihrer Gebiete).
+# Der Event-Loop fügt hinzu/entfernt, der Listener-Thread liest: nur unter
+# _stream_sessions_lock anfassen.
+_stream_sessions = weakref.WeakSet()
+_stream_sessions_lock = threading.Lock()
+_listener = None
+
+DB_POINTS_SQL = f"""
+    SELECT lat_matched, lon_matched, condition_code, iri
+    FROM {POINT_TABLE}
+    WHERE lat_matched IS NOT NULL
+      AND lon_matched IS NOT NULL
+"""
+
+# WICHTIG: Spaltennamen an deine Tabelle anpassen
+BBOX_POINTS_SQL = f"""
+    SELECT lat_matched, lon_matched, condition_code, iri
+    FROM {POINT_TABLE}
+    WHERE lat_matched BETWEEN %s AND %s
+      AND lon_matched BETWEEN %s AND %s
+"""
+
+DATA_VERSION_SQL = "SELECT version FROM track_data_version WHERE id = 1"
+
+# max. Suchradius in Metern (der Index durchläuft radius_m / cell_m
+# Gitterzeilen, im DB-Modus wächst die Bounding Box mit)
+MAX_RADIUS_M = 1000
+
+# max. Anzahl Punkte in einer Korridor-Antwort
+MAX_CORRIDOR_K = 500
+
+# max. Anzahl Routenpunkte (alle Routen zusammen) pro /route_cost-Request
+MAX_ROUTE_POINTS = 50_000
+
+# max. Abstand Route -> Messpunkt in Metern für /route_cost
+MAX_MATCH_DIST_M = 500.0
+
+
+def init_snapshot():
+    """Snapshot beim Start laden (memory: aus der DB, mmap: Datei mappen)."""
+    if SERVING_MODE == "memory":
+        load_snapshot()
+    elif SERVING_MODE == "mmap":
+        if point_index.file_id(SNAPSHOT_FILE) is None:
+            load_snapshot()
+        else:
+            map_snapshot_file()
+
+
+def start_change_listener():
+    """Listener-Thread starten (nur mit LISTEN_CHANGES=1)."""
+    global _listener
+    if LISTEN_CHANGES and _listener is None:
+        _listener = change_listener.ChangeListener(get_db_connection, apply_changes)
+        _listener.start()
+
+
+def stop_change_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    REPLICAS.start()
+    init_snapshot()
+    start_change_listener()
+    yield
+    stop_change_listener()
+    REPLICAS.stop()
+
+
+app = FastAPI(title="Road State API", lifespan=lifespan)
+
+# ============================================================
+# Metriken (/metrics im Prometheus-Textformat)
+# ============================================================
+REQUESTS_TOTAL = metrics.Counter(
+    "road_api_requests_total", "Anzahl Requests", ("route", "method", "status"))
+REQUEST_LATENCY = metrics.Histogram(
+    "road_api_request_duration_seconds", "Request-Dauer inkl. DB", ("route", "method"))
+REQUESTS_IN_PROGRESS = metrics.Gauge(
+    "road_api_requests_in_progress", "Gerade laufende Requests")
+DB_QUERY_LATENCY = metrics.Histogram(
+    "road_api_db_query_duration_seconds", "Dauer execute + fetch", ("query",))
+DB_ROWS_FETCHED = metrics.Histogram(
+    "road_api_db_rows_fetched", "Gelesene Zeilen pro Query", ("query",), buckets=metrics.ROW_BUCKETS)
+DB_CONNECTIONS_OPENED = metrics.Counter(
+    "road_api_db_connections_opened_total", "Geöffnete DB-Verbindungen")
+DB_CONNECTIONS_IN_USE = metrics.Gauge(
+    "road_api_db_connections_in_use", "Aktuell offene DB-Verbindungen")
+DB_QUERIES = metrics.Counter(
+    "road_api_db_queries_total", "Queries je Ziel (primary oder Replikat)", ("target",))
+DB_ERRORS = metrics.Counter(
+    "road_api_db_errors_total", "Fehlgeschlagene DB-Zugriffe", ("query",))
+SNAPSHOT_POINTS = metrics.Gauge(
+    "road_api_snapshot_points", "Punkte im In-Memory-Snapshot")
+SNAPSHOT_RELOADS = metrics.Counter(
+    "road_api_snapshot_reloads_total", "Neu geladene Snapshots")
+SNAPSHOT_BUILD_SECONDS = metrics.Gauge(
+    "road_api_snapshot_build_seconds", "Dauer des letzten Snapshot-Aufbaus")
+STREAM_CONNECTIONS = metrics.Gauge(
+    "road_api_stream_connections", "Offene /road_state/stream-Verbindungen")
+STREAM_FIXES = metrics.Counter(
+    "road_api_stream_fixes_total", "Empfangene GPS-Fixes über /road_state/stream")
+STREAM_UPDATES = metrics.Counter(
+    "road_api_stream_updates_total", "Gesendete Zustandswechsel über /road_state/stream")
+CHANGE_NOTIFICATIONS = metrics.Counter(
+    "road_api_change_notifications_total", "Empfangene Änderungs-Meldungen (NOTIFY)", ("op",))
+SNAPSHOT_REGION_REFRESHES = metrics.Counter(
+    "road_api_snapshot_region_refreshes_total", "Teil-Aktualisierungen des Snapshots")
+STREAM_AREA_LOADS = metrics.Counter(
+    "road_api_stream_area_loads_total", "Nachgeladene Umgebungen im DB-Modus")
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """Latenz, Status und laufende Requests pro Route erfassen."""
+    REQUESTS_IN_PROGRESS.inc()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - t0
+        REQUESTS_IN_PROGRESS.dec()
+        # Routen-Template statt Pfad, damit unbekannte URLs keine neuen Labels erzeugen
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.observe(elapsed, route_path, request.method)
+        REQUESTS_TOTAL.inc(route_path, request.method, str(status))
+
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """
+    Bei ROUTE_TIMING=1: Zeitmessung pro Request, Ergebnis als
+    Server-Timing-Header und als JSON-Zeile im Log 'route_timing'.
+    """
+    if not timing.ENABLED:
+        return await call_next(request)
+
+    with timing.collect(f"{request.method} {request.url.path}") as t:
+        response = await call_next(request)
+
+    response.headers["Server-Timing"] = ", ".join(
+        f"{name};dur={ms}" for name, ms in t.as_dict()["spans_ms"].items()
+    )
+    t.log_json()
+    return response
 
 
 def get_db_connection():
     return psycopg2.connect(**DB_CONFIG)
 
 
+def get_read_connection():
+    """
+    Verbindung für eine reine Lese-Query: nächstes gesundes Replikat. Bei
+    einem Verbindungsfehler wird das Replikat bis zum nächsten Check
+    gemieden und das nächste versucht; ohne gesundes Replikat der Primary.
+    Der Verbindungsaufbau ist auf CONNECT_TIMEOUT_S begrenzt, damit ein
+    seit dem letzten Check unerreichbares Replikat nicht jeden Request bis
+    zum TCP-Timeout des Systems aufhält.
+    Rückgabe: (conn, Ziel-Name).
+    """
+    for _ in range(len(REPLICAS)):
+        replica = REPLICAS.next()
+        if replica is None:
+            break
+        try:
+            conn = psycopg2.connect(connect_timeout=db_replicas.CONNECT_TIMEOUT_S, **replica.config)
+            return conn, replica.name
+        except psycopg2.OperationalError:
+            REPLICAS.mark_down(replica)
+    return get_db_connection(), "primary"
+
+
+def fetch_rows(query_name, sql, params=(), primary=False):
+    """
+    Führt eine Lese-Query aus und gibt alle Zeilen zurück.
+    primary=True: immer auf dem Primary (sonst ggf. auf einem Replikat).
+    Misst Verbindungsaufbau, Query-Dauer und Zeilenanzahl (Metriken + Timing).
+    Fehler werden als HTTP 500 gemeldet.
+    """
+    try:
+        with timing.span("db_connect"):
+            if primary:
+                conn, target = get_db_connection(), "primary"
+            else:
+                conn, target = get_read_connection()
+    except Exception as e:
+        DB_ERRORS.inc(query_name)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    DB_CONNECTIONS_OPENED.inc()
+    DB_CONNECTIONS_IN_USE.inc()
+    DB_QUERIES.inc(target)
+    try:
+        cur = conn.cursor()
+        t0 = time.perf_counter()
+        with timing.span("db_query"):
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        DB_QUERY_LATENCY.observe(time.perf_counter() - t0, query_name)
+        cur.close()
+    except Exception as e:
+        DB_ERRORS.inc(query_name)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+        DB_CONNECTIONS_IN_USE.dec()
+
+    DB_ROWS_FETCHED.observe(len(rows), query_name)
+    timing.count("rows_fetched", len(rows))
+    return rows
+
+
 def haversine_distance_m(lat1, lon1, lat2, lon2):
     """Entfernung zwischen zwei GPS-Punkten in Metern."""
     R = 6371000.0  # Erdradius in m
@@ -43,62 +318,535 @@ def health():
     return {"status": "ok"}
 
 
-@app.get("/road_state")
-def road_state(lat: float, lon: float, radius_m: int = 50):
+@app.get("/metrics")
+def metrics_endpoint():
+    """Metriken im Prometheus-Textformat (z. B. per curl oder Prometheus-Scrape)."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def load_snapshot():
     """
-    Gibt NUR den Zustand (state) des nächstgelegenen Messpunkts zurück.
-    Erwartet lat, lon, optional radius_m in Metern.
+    Lädt alle Punkte aus POINT_TABLE, baut einen neuen PointIndex und
+    tauscht ihn atomar gegen den aktuellen aus.
     """
+    t0 = time.perf_counter()
+    rows = fetch_rows("snapshot", DB_POINTS_SQL, primary=True)
+    snapshot = install_snapshot(point_index.from_rows(rows, version=time.time()))
+    SNAPSHOT_RELOADS.inc()
+    SNAPSHOT_BUILD_SECONDS.set(time.perf_counter() - t0)
+    return snapshot
 
-    # 1) grobe Bounding Box um die Anfrageposition
+
+def install_snapshot(snapshot):
+    """Neuen Snapshot aktiv setzen (mmap: erst Datei ersetzen, dann mappen)."""
+    global SNAPSHOT
+    if SERVING_MODE == "mmap":
+        # Datei atomar ersetzen und selbst gleich die gemappte Version nutzen
+        point_index.save(snapshot, SNAPSHOT_FILE)
+        snapshot = point_index.load(SNAPSHOT_FILE)
+
+    SNAPSHOT = snapshot
+    SNAPSHOT_POINTS.set(len(snapshot))
+    return snapshot
+
+
+def refresh_region(bbox):
+    """Nur die Punkte in bbox (min_lat, max_lat, min_lon, max_lon) neu aus der DB lesen."""
+    snapshot = current_snapshot()
+    rows = fetch_rows("snapshot_region", BBOX_POINTS_SQL, bbox, primary=True)
+    snapshot = install_snapshot(point_index.replace_region(snapshot, bbox, rows, version=time.time()))
+    SNAPSHOT_REGION_REFRESHES.inc()
+    return snapshot
+
+
+def apply_changes(changes):
+    """
+    Meldungen des ChangeListeners verarbeiten (läuft im Listener-Thread):
+    Stream-Sessions, deren Gebiet betroffen ist, laden beim nächsten Fix neu;
+    im memory/mmap-Modus wird nur das geänderte Gebiet des Snapshots neu
+    gelesen (bbox None, z. B. TRUNCATE -> kompletter Reload).
+    """
+    changes = [c for c in changes if c["table"] == POINT_TABLE]
+    if not changes:
+        return
+    for c in changes:
+        CHANGE_NOTIFICATIONS.inc(c["op"])
+    bbox = change_listener.merge_bboxes(c["bbox"] for c in changes)
+
+    with _stream_sessions_lock:
+        sessions = list(_stream_sessions)
+    for session in sessions:
+        if session.center is None:
+            continue
+        area = bounding_box(session.center[0], session.center[1], session.area_m)
+        if bbox is None or change_listener.bbox_overlaps(bbox, area):
+            session.invalidate()
+
+    if SERVING_MODE in ("memory", "mmap") and SNAPSHOT is not None:
+        with _reload_lock:
+            if bbox is None:
+                load_snapshot()
+            else:
+                refresh_region(bbox)
+
+
+def map_snapshot_file():
+    """SNAPSHOT_FILE (neu) mappen und als aktuellen Snapshot setzen."""
+    global SNAPSHOT
+    snapshot = point_index.load(SNAPSHOT_FILE)
+    SNAPSHOT = snapshot
+    SNAPSHOT_POINTS.set(len(snapshot))
+    return snapshot
+
+
+def current_snapshot():
+    """
+    Aktueller Snapshot. Im mmap-Modus wird höchstens alle SNAPSHOT_CHECK_S
+    Sekunden per os.stat geprüft, ob ein anderer Prozess die Datei ersetzt hat.
+    """
+    global _next_file_check
+    snapshot = SNAPSHOT
+    if SERVING_MODE != "mmap":
+        return snapshot
+
+    now = time.monotonic()
+    if now < _next_file_check:
+        return snapshot
+    _next_file_check = now + SNAPSHOT_CHECK_S
+
+    file_id = point_index.file_id(SNAPSHOT_FILE)
+    if file_id is None or (snapshot is not None and file_id == snapshot.file_id):
+        return snapshot
+    try:
+        return map_snapshot_file()
+    except (OSError, ValueError):
+        # z. B. Datei gerade ersetzt oder falsche Version: alten Snapshot behalten
+        return snapshot
+
+
+def snapshot_state(lat, lon, radius_m):
+    """Antwort für /road_state aus dem In-Memory-Snapshot."""
+    snapshot = current_snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Snapshot not loaded")
+
+    with timing.span("nearest"):
+        hit = snapshot.nearest(lat, lon, radius_m)
+    if hit is None:
+        raise HTTPException(status_code=404, detail="No points within radius")
+
+    p = snapshot.point(hit[0])
+    code = p["condition_code"]
+    return {"state": state_name(code), "condition_code": code, "iri": p["iri"]}
+
+
+def check_position(lat, lon):
+    """422, wenn lat/lon keine endlichen Zahlen sind (FastAPI lässt "nan"/"inf" durch)."""
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        raise HTTPException(status_code=422, detail="lat/lon must be finite numbers")
+
+
+def bounding_box(lat, lon, radius_m):
+    """Grobe Bounding Box (min_lat, max_lat, min_lon, max_lon) um die Position."""
     lat_radius_deg = radius_m / 111_320.0
     lon_radius_deg = radius_m / (111_320.0 * math.cos(math.radians(lat)))
 
-    min_lat = lat - lat_radius_deg
-    max_lat = lat + lat_radius_deg
-    min_lon = lon - lon_radius_deg
-    max_lon = lon + lon_radius_deg
+    return (
+        lat - lat_radius_deg,
+        lat + lat_radius_deg,
+        lon - lon_radius_deg,
+        lon + lon_radius_deg,
+    )
 
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        # WICHTIG: Spaltennamen an deine Tabelle anpassen
-        cur.execute(
-            """
-            SELECT lat_matched, lon_matched, roughness
-            FROM track_point
-            WHERE lat_matched BETWEEN %s AND %s
-              AND lon_matched BETWEEN %s AND %s
-            """,
-            (min_lat, max_lat, min_lon, max_lon),
-        )
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
+def nearest_state(lat, lon, radius_m, rows):
+    """
+    Sucht in rows (lat, lon, condition_code, iri) den nächstgelegenen Punkt
+    und gibt die Antwort für /road_state zurück (404, wenn keiner im Radius).
+    """
     if not rows:
         raise HTTPException(status_code=404, detail="No points near this location")
 
-    # 2) exakten nächsten Punkt finden
     best_row = None
     best_dist = None
 
-    for r in rows:
-        lat_m = r[0]
-        lon_m = r[1]
-        roughness = r[2]  # hier steckt bei dir 'GOOD', 'FAIR', ...
-        dist = haversine_distance_m(lat, lon, lat_m, lon_m)
+    with timing.span("nearest"):
+        for r in rows:
+            lat_m = r[0]
+            lon_m = r[1]
+            dist = haversine_distance_m(lat, lon, lat_m, lon_m)
 
-        if best_dist is None or dist < best_dist:
-            best_dist = dist
-            best_row = roughness
+            if best_dist is None or dist < best_dist:
+                best_dist = dist
+                best_row = r
 
     if best_row is None or best_dist is None or best_dist > radius_m:
         raise HTTPException(status_code=404, detail="No points within radius")
 
-    # Zustand als Großbuchstaben zurückgeben
-    state = str(best_row).upper()
+    # condition_code: 0=NOT MEASURED .. 5=VERY POOR (siehe road_states.py)
+    code = best_row[2]
+    iri = best_row[3]
+
+    return {"state": state_name(code), "condition_code": code, "iri": iri}
+
+
+def corridor_probe_m(radius_m, heading_deg, length_m, width_m):
+    """Radius, der den gesamten Korridor abdeckt (ein einziger Index-Zugriff)."""
+    if heading_deg is None:
+        return radius_m
+    return math.hypot(radius_m if length_m is None else length_m, width_m)
+
+
+def consensus_state(codes, iri, dist):
+    """
+    Gewichteter Mehrheitszustand: jeder Punkt stimmt mit 1/Distanz (min. 1 m)
+    für seinen Code. NOT MEASURED zählt nur, wenn sonst nichts gemessen ist.
+    Bei Gleichstand gewinnt der schlechtere Zustand (wie choose_worse_state).
+    """
+    weights = 1.0 / np.maximum(dist, 1.0)
+    measured = codes != NOT_MEASURED
+    if not measured.any():
+        return {"state": state_name(NOT_MEASURED), "condition_code": NOT_MEASURED,
+                "support": 1.0, "iri": None}
+
+    codes, iri, weights = codes[measured], iri[measured], weights[measured]
+    totals = np.bincount(codes, weights=weights, minlength=len(STATE_NAMES))
+    code = len(totals) - 1 - int(np.argmax(totals[::-1]))
+
+    has_iri = ~np.isnan(iri)
+    iri_mean = None
+    if has_iri.any():
+        iri_mean = round(float(np.average(iri[has_iri], weights=weights[has_iri])), 3)
+
+    return {
+        "state": state_name(code),
+        "condition_code": code,
+        "support": round(float(totals[code] / totals.sum()), 3),
+        "iri": iri_mean,
+    }
+
+
+def corridor_result(snapshot, lat, lon, radius_m, k=None, heading_deg=None,
+                    length_m=None, width_m=10.0):
+    """
+    Punkte um (lat, lon) aus einem PointIndex, nach Distanz sortiert:
+      - ohne heading_deg: alle Punkte im Radius radius_m
+      - mit heading_deg (0 = Nord, im Uhrzeigersinn): nur Punkte im Rechteck
+        vor dem Fahrzeug, length_m lang (Standard radius_m), ±width_m breit
+    k begrenzt auf die k nächsten Treffer. Dazu ein gewichteter Konsens.
+    """
+    probe_m = corridor_probe_m(radius_m, heading_deg, length_m, width_m)
+
+    with timing.span("corridor"):
+        idx, dx, dy = snapshot.offsets(lat, lon, probe_m)
+
+        along = None
+        if heading_deg is not None:
+            length_m = radius_m if length_m is None else length_m
+            h = math.radians(heading_deg)
+            along = dx * math.sin(h) + dy * math.cos(h)
+            cross = dx * math.cos(h) - dy * math.sin(h)
+            mask = (along >= 0) & (along <= length_m) & (np.abs(cross) <= width_m)
+            idx, dx, dy, along = idx[mask], dx[mask], dy[mask], along[mask]
+
+        dist = np.hypot(dx, dy)
+        order = np.argsort(dist, kind="stable")
+        if k is not None:
+            order = order[:k]
+        idx, dist = idx[order], dist[order]
+        if along is not None:
+            along = along[order]
+
+    if not len(idx):
+        raise HTTPException(status_code=404, detail="No points within radius")
+
+    codes = snapshot.code[idx].astype("int64")
+    points = []
+    for j, i in enumerate(idx):
+        p = snapshot.point(i)
+        p["state"] = state_name(p["condition_code"])
+        p["distance_m"] = round(float(dist[j]), 2)
+        if along is not None:
+            p["along_m"] = round(float(along[j]), 2)
+        points.append(p)
+
+    return {
+        "count": len(points),
+        "points": points,
+        "consensus": consensus_state(codes, snapshot.iri[idx], dist),
+    }
+
+
+def points_payload(rows):
+    """Zeilen (lat, lon, condition_code, iri) -> JSON-Liste für /db_points."""
+    return [
+        {"lat": lat_m, "lon": lon_m, "condition_code": code or 0, "iri": iri}
+        for lat_m, lon_m, code, iri in rows
+    ]
+
+
+@app.get("/data_version")
+def data_version():
+    """
+    Aktueller Datenstand (ändert sich mit jedem Import bzw. Snapshot).
+    Clients hängen ihn an Cache-Schlüssel, damit alte Ergebnisse verfallen.
+    """
+    if SERVING_MODE in ("memory", "mmap"):
+        snapshot = current_snapshot()
+        return {"version": None if snapshot is None else snapshot.version}
+
+    rows = fetch_rows("data_version", DATA_VERSION_SQL, primary=True)
+    return {"version": rows[0][0] if rows else None}
+
+
+@app.get("/road_state")
+def road_state(lat: float, lon: float, radius_m: int = Query(50, ge=0, le=MAX_RADIUS_M)):
+    """
+    Gibt NUR den Zustand (state) des nächstgelegenen Messpunkts zurück.
+    Erwartet lat, lon, optional radius_m in Metern.
+    """
+    check_position(lat, lon)
+    if SERVING_MODE in ("memory", "mmap"):
+        return snapshot_state(lat, lon, radius_m)
+
+    # 1) grobe Bounding Box um die Anfrageposition
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_m)
+
+    rows = fetch_rows("road_state", BBOX_POINTS_SQL, (min_lat, max_lat, min_lon, max_lon))
+
+    # 2) exakten nächsten Punkt finden
+    return nearest_state(lat, lon, radius_m, rows)
+
 
-    return {"state": state}
+@app.get("/road_state/corridor")
+def road_state_corridor(
+    lat: float,
+    lon: float,
+    radius_m: int = Query(50, ge=0, le=MAX_RADIUS_M),
+    k: int = Query(None, ge=1, le=MAX_CORRIDOR_K),
+    heading_deg: float = Query(None, allow_inf_nan=False),
+    length_m: float = Query(None, gt=0, le=MAX_RADIUS_M, allow_inf_nan=False),
+    width_m: float = Query(10.0, gt=0, le=MAX_RADIUS_M, allow_inf_nan=False),
+):
+    """
+    Alle Punkte im Umkreis (oder im Korridor entlang heading_deg) mit
+    Distanzen und gewichtetem Konsens-Zustand, aus einem einzigen Zugriff
+    auf den Index bzw. einer einzigen Bounding-Box-Query.
+    """
+    check_position(lat, lon)
+    if SERVING_MODE in ("memory", "mmap"):
+        snapshot = current_snapshot()
+        if snapshot is None:
+            raise HTTPException(status_code=503, detail="Snapshot not loaded")
+    else:
+        probe_m = corridor_probe_m(radius_m, heading_deg, length_m, width_m)
+        rows = fetch_rows("corridor", BBOX_POINTS_SQL, bounding_box(lat, lon, probe_m))
+        snapshot = point_index.from_rows(rows)
+
+    return corridor_result(snapshot, lat, lon, radius_m, k, heading_deg, length_m, width_m)
+
+
+def load_area(lat, lon, area_m):
+    """PointIndex für das Quadrat mit halber Kantenlänge area_m um (lat, lon)."""
+    rows = fetch_rows("stream_area", BBOX_POINTS_SQL, bounding_box(lat, lon, area_m), primary=True)
+    return point_index.from_rows(rows)
+
+
+@app.websocket("/road_state/stream")
+async def road_state_stream(websocket: WebSocket, radius_m: int = Query(50, gt=0, le=MAX_RADIUS_M)):
+    """
+    Fortlaufende Abfrage für ein fahrendes Fahrzeug.
+    Client -> Server: {"lat": ..., "lon": ...} pro GPS-Fix
+    Server -> Client: {"fix", "state", "condition_code", "iri", "distance_m"},
+                      aber nur wenn sich der Zustand ändert (state=null: kein
+                      Punkt im Radius). Fehler: {"fix", "error"}, die
+                      Verbindung bleibt offen (auch bei kaputtem JSON).
+    Ungültiger radius_m: FastAPI schließt die Verbindung mit Code 1008.
+    """
+    await websocket.accept()
+    session = stream_session.StreamSession(radius_m)
+    with _stream_sessions_lock:
+        _stream_sessions.add(session)
+    STREAM_CONNECTIONS.inc()
+    try:
+        while True:
+            try:
+                # receive_text + json.loads statt receive_json: ein kaputter
+                # Frame darf die Verbindung nicht beenden
+                fix = json.loads(await websocket.receive_text())
+                lat = float(fix["lat"])
+                lon = float(fix["lon"])
+                if not (math.isfinite(lat) and math.isfinite(lon)):
+                    raise ValueError("non-finite lat/lon")
+            except (KeyError, TypeError, ValueError):
+                await websocket.send_json({"fix": session.fixes + 1, "error": "lat/lon required"})
+                continue
+
+            STREAM_FIXES.inc()
+            try:
+                if SERVING_MODE in ("memory", "mmap"):
+                    snapshot = current_snapshot()
+                    if snapshot is None:
+                        raise HTTPException(status_code=503, detail="Snapshot not loaded")
+                    if snapshot is not session.index:
+                        session.set_index(snapshot)
+                elif session.needs_area(lat, lon):
+                    index = await asyncio.to_thread(load_area, lat, lon, session.area_m)
+                    session.set_index(index, (lat, lon))
+                    STREAM_AREA_LOADS.inc()
+            except HTTPException as e:
+                await websocket.send_json({"fix": session.fixes + 1, "error": e.detail})
+                continue
+
+            change = session.update(lat, lon)
+            if change is not None:
+                STREAM_UPDATES.inc()
+                await websocket.send_json(change)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        with _stream_sessions_lock:
+            _stream_sessions.discard(session)
+        STREAM_CONNECTIONS.dec()
+
+
+class RouteIn(BaseModel):
+    coords: Optional[List[Tuple[float, float]]] = None   # [(lat, lon), ...]
+    polyline: Optional[str] = None             # alternativ: polyline6 (kompakter)
+    congestion: Optional[List[str]] = None     # pro Segment, z. B. "low"
+
+
+class RouteCostRequest(BaseModel):
+    routes: List[RouteIn]
+    price_per_km: Dict[str, float]
+    traffic_multipliers: Optional[Dict[str, float]] = None
+    max_dist_m: float = Field(50.0, gt=0, le=MAX_MATCH_DIST_M, allow_inf_nan=False)
+    render_map: bool = False
+
+
+def route_points(route):
+    """Punkte einer RouteIn als Array (n, 2) [lat, lon] – aus coords oder polyline."""
+    if (route.coords is None) == (route.polyline is None):
+        raise HTTPException(status_code=422, detail="Pro Route genau eins von 'coords' oder 'polyline'")
+    if route.polyline is not None:
+        try:
+            return polyline.decode(route.polyline)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Ungültige Polyline: {e}")
+    return polyline.as_coords(route.coords)
+
+
+def decode_routes(request):
+    """Routen des Requests prüfen und als Liste von Arrays (n, 2) [lat, lon] liefern."""
+    if not request.routes:
+        raise HTTPException(status_code=422, detail="Mindestens eine Route erforderlich")
+    with timing.span("decode"):
+        points = [route_points(r) for r in request.routes]
+    if any(len(p) < 2 for p in points):
+        raise HTTPException(status_code=422, detail="Jede Route braucht mindestens 2 Punkte")
+    if sum(len(p) for p in points) > MAX_ROUTE_POINTS:
+        raise HTTPException(status_code=413, detail=f"Max. {MAX_ROUTE_POINTS} Routenpunkte pro Request")
+    return points
+
+
+def route_bbox(routes, max_dist_m):
+    """Bounding Box (min_lat, max_lat, min_lon, max_lon) über alle Routen + max_dist_m."""
+    points = np.concatenate(routes)
+    min_lat, min_lon = points.min(axis=0)
+    max_lat, max_lon = points.max(axis=0)
+    min_lat, _, min_lon, _ = bounding_box(float(min_lat), float(min_lon), max_dist_m)
+    _, max_lat, _, max_lon = bounding_box(float(max_lat), float(max_lon), max_dist_m)
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def route_index(routes, max_dist_m):
+    """
+    PointIndex für die Klassifizierung: im memory/mmap-Modus der Snapshot,
+    sonst eine Bounding-Box-Query über alle Routen (+ max_dist_m).
+    routes: Liste von Arrays (n, 2) [lat, lon].
+    """
+    if SERVING_MODE in ("memory", "mmap"):
+        snapshot = current_snapshot()
+        if snapshot is None:
+            raise HTTPException(status_code=503, detail="Snapshot not loaded")
+        return snapshot
+
+    rows = fetch_rows("route_cost", BBOX_POINTS_SQL, route_bbox(routes, max_dist_m))
+    return point_index.from_rows(rows)
+
+
+@app.post("/route_cost")
+def route_cost(request: RouteCostRequest):
+    """
+    Kosten wie show_route2.show_route_and_cost, aber direkt neben den Daten:
+    Client schickt die Routen, bekommt pro Route Kosten, Distanz und
+    Aufschlüsselung nach Zustand zurück (optional die Karte als HTML).
+    """
+    points = decode_routes(request)
+    index = route_index(points, request.max_dist_m)
+    return price_routes(request, points, index)
+
+
+def price_routes(request, points, index):
+    """Antwort für /route_cost: Routen (decode_routes) mit index klassifizieren und bepreisen."""
+    results = []
+    priced_routes = []
+    for i, (route, coords) in enumerate(zip(request.routes, points)):
+        with timing.span("classify"):
+            codes = index.segment_codes(coords[:, 0], coords[:, 1], request.max_dist_m).tolist()
+        timing.count("segments_evaluated", len(codes))
+
+        with timing.span("price"):
+            priced = price_route(coords.tolist(), codes, route.congestion,
+                                 request.price_per_km, request.traffic_multipliers)
+        priced_routes.append(priced)
+
+        total_cost, total_dist_km, breakdown, _ = priced
+        results.append({
+            "name": f"Route {i + 1}",
+            "cost": total_cost,
+            "dist": total_dist_km,
+            "breakdown": breakdown,
+        })
+
+    response = {"results": results}
+    if request.render_map:
+        # folium nur laden, wenn wirklich eine Karte gewünscht ist
+        import show_route2
+
+        with timing.span("render"):
+            m, _ = show_route2.build_map([{"coords": p} for p in points], priced_routes)
+            response["map_html"] = m.get_root().render()
+    return response
+
+
+@app.get("/db_points")
+def db_points():
+    """
+    Alle Messpunkte kompakt: lat, lon, condition_code (SMALLINT) und iri.
+    Der Zustand wird als Code geliefert, Clients lösen den Namen nur bei
+    Bedarf über road_states.STATE_NAMES auf.
+    """
+    snapshot = current_snapshot()
+    if SERVING_MODE in ("memory", "mmap") and snapshot is not None:
+        return [snapshot.point(i) for i in range(len(snapshot))]
+
+    rows = fetch_rows("db_points", DB_POINTS_SQL, primary=True)
+    return points_payload(rows)
+
+
+@app.post("/snapshot/reload")
+def snapshot_reload():
+    """
+    Snapshot neu aus der DB laden (z. B. am Ende von import_roadlab_csv.py).
+    Während des Aufbaus beantwortet der alte Snapshot weiter alle Anfragen.
+    """
+    if SERVING_MODE not in ("memory", "mmap"):
+        raise HTTPException(status_code=409, detail="Serving mode is not 'memory' or 'mmap'")
+    if not _reload_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Reload already running")
+    try:
+        snapshot = load_snapshot()
+    finally:
+        _reload_lock.release()
+    return {"points": len(snapshot), "version": snapshot.version}
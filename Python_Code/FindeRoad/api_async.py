@@ -0,0 +1,274 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List
+
+import asyncpg
+from fastapi import FastAPI, HTTPException, Query, Response
+from pydantic import BaseModel, Field
+
+import api
+import db_replicas
+import metrics
+import point_index
+import timing
+
+# ============================================================
+# Async-Variante der Road State API (asyncpg + Connection-Pool)
+# ============================================================
+#
+# Start:  uvicorn api_async:app --host 0.0.0.0 --port 8000
+#
+# Gleiche Endpunkte und Antworten wie api.py, aber die Handler blockieren
+# keinen Threadpool-Thread mehr: DB-Zugriffe laufen über einen asyncpg-Pool,
+# jede Anfrage hat ein Zeitlimit (504 bei Überschreitung).
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+
+# Zeitlimit pro Request bzw. pro Query in Sekunden
+REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", "5"))
+DB_QUERY_TIMEOUT_S = float(os.getenv("DB_QUERY_TIMEOUT_S", "3"))
+
+# max. Anzahl Positionen pro Batch-Request
+MAX_BATCH_SIZE = 1000
+
+ROAD_STATE_SQL = f"""
+    SELECT lat_matched, lon_matched, condition_code, iri
+    FROM {api.POINT_TABLE}
+    WHERE lat_matched BETWEEN $1 AND $2
+      AND lon_matched BETWEEN $3 AND $4
+"""
+
+DB_POINTS_SQL = api.DB_POINTS_SQL
+
+
+async def create_pool(config, min_size, connect_timeout=60):
+    return await asyncpg.create_pool(
+        host=config["host"],
+        port=config["port"],
+        database=config["dbname"],
+        user=config["user"],
+        password=config["password"],
+        ssl=config["sslmode"],
+        min_size=min_size,
+        max_size=DB_POOL_MAX,
+        command_timeout=DB_QUERY_TIMEOUT_S,
+        timeout=connect_timeout,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.pool = await create_pool(api.DB_CONFIG, DB_POOL_MIN)
+    # Replikat-Pools verbinden erst bei Bedarf (min_size=0): ein beim Start
+    # nicht erreichbares Replikat verhindert so nicht den Start der API.
+    # Kurzer Verbindungs-Timeout wie beim Health-Check: ein unerreichbares
+    # Replikat wird schnell gemieden statt den Request aufzuhalten.
+    app.state.replica_pools = {
+        r.name: await create_pool(r.config, 0, db_replicas.CONNECT_TIMEOUT_S)
+        for r in api.REPLICAS.replicas
+    }
+    api.REPLICAS.start()
+    await asyncio.to_thread(api.init_snapshot)
+    api.start_change_listener()
+    try:
+        yield
+    finally:
+        api.stop_change_listener()
+        api.REPLICAS.stop()
+        for pool in app.state.replica_pools.values():
+            await pool.close()
+        await app.state.pool.close()
+
+
+app = FastAPI(title="Road State API (async)", lifespan=lifespan)
+
+# gleiche Middleware/Metriken wie die synchrone API
+app.middleware("http")(api.timing_middleware)
+app.middleware("http")(api.metrics_middleware)
+
+# Fahrzeug-Stream: DB-Zugriffe laufen dort ohnehin in einem Thread
+app.websocket("/road_state/stream")(api.road_state_stream)
+
+
+async def acquire_read():
+    """
+    Verbindung für eine Lese-Query: Pool des nächsten gesunden Replikats
+    (bei Fehler wird es gemieden und das nächste versucht), ohne gesundes
+    Replikat der Primary-Pool. Rückgabe: (pool, conn, Ziel-Name).
+    """
+    for _ in range(len(api.REPLICAS)):
+        replica = api.REPLICAS.next()
+        if replica is None:
+            break
+        pool = app.state.replica_pools[replica.name]
+        try:
+            return pool, await pool.acquire(), replica.name
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError):
+            api.REPLICAS.mark_down(replica)
+    pool = app.state.pool
+    return pool, await pool.acquire(), "primary"
+
+
+async def fetch_rows(query_name, sql, *args, primary=False):
+    """
+    Async-Gegenstück zu api.fetch_rows: Verbindung aus dem Pool, gleiche
+    Metriken. primary=True: immer aus dem Primary-Pool.
+    """
+    try:
+        with timing.span("db_connect"):
+            if primary:
+                pool = app.state.pool
+                conn, target = await pool.acquire(), "primary"
+            else:
+                pool, conn, target = await acquire_read()
+    except Exception as e:
+        api.DB_ERRORS.inc(query_name)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    api.DB_CONNECTIONS_IN_USE.inc()
+    api.DB_QUERIES.inc(target)
+    try:
+        t0 = time.perf_counter()
+        with timing.span("db_query"):
+            rows = await conn.fetch(sql, *args)
+        api.DB_QUERY_LATENCY.observe(time.perf_counter() - t0, query_name)
+    except asyncio.TimeoutError:
+        api.DB_ERRORS.inc(query_name)
+        raise HTTPException(status_code=504, detail="Database timeout")
+    except Exception as e:
+        api.DB_ERRORS.inc(query_name)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await pool.release(conn)
+        api.DB_CONNECTIONS_IN_USE.dec()
+
+    api.DB_ROWS_FETCHED.observe(len(rows), query_name)
+    timing.count("rows_fetched", len(rows))
+    return rows
+
+
+async def with_timeout(coro):
+    """Request-Zeitlimit: nach REQUEST_TIMEOUT_S abbrechen und 504 melden."""
+    try:
+        return await asyncio.wait_for(coro, REQUEST_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Request timeout")
+
+
+async def lookup_state(lat, lon, radius_m):
+    api.check_position(lat, lon)
+    if api.SERVING_MODE in ("memory", "mmap"):
+        return api.snapshot_state(lat, lon, radius_m)
+    rows = await fetch_rows("road_state", ROAD_STATE_SQL, *api.bounding_box(lat, lon, radius_m))
+    return api.nearest_state(lat, lon, radius_m, rows)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/data_version")
+async def data_version():
+    """Wie api.data_version, aber nicht-blockierend."""
+    if api.SERVING_MODE in ("memory", "mmap"):
+        return api.data_version()
+    rows = await with_timeout(fetch_rows("data_version", api.DATA_VERSION_SQL, primary=True))
+    return {"version": rows[0][0] if rows else None}
+
+
+@app.get("/road_state")
+async def road_state(lat: float, lon: float, radius_m: int = Query(50, ge=0, le=api.MAX_RADIUS_M)):
+    """Wie api.road_state, aber nicht-blockierend."""
+    return await with_timeout(lookup_state(lat, lon, radius_m))
+
+
+@app.get("/road_state/corridor")
+async def road_state_corridor(
+    lat: float,
+    lon: float,
+    radius_m: int = Query(50, ge=0, le=api.MAX_RADIUS_M),
+    k: int = Query(None, ge=1, le=api.MAX_CORRIDOR_K),
+    heading_deg: float = Query(None, allow_inf_nan=False),
+    length_m: float = Query(None, gt=0, le=api.MAX_RADIUS_M, allow_inf_nan=False),
+    width_m: float = Query(10.0, gt=0, le=api.MAX_RADIUS_M, allow_inf_nan=False),
+):
+    """Wie api.road_state_corridor, aber nicht-blockierend."""
+    api.check_position(lat, lon)
+    if api.SERVING_MODE in ("memory", "mmap"):
+        return api.road_state_corridor(lat, lon, radius_m, k, heading_deg, length_m, width_m)
+
+    probe_m = api.corridor_probe_m(radius_m, heading_deg, length_m, width_m)
+    rows = await with_timeout(
+        fetch_rows("corridor", ROAD_STATE_SQL, *api.bounding_box(lat, lon, probe_m)))
+    snapshot = point_index.from_rows(rows)
+    return api.corridor_result(snapshot, lat, lon, radius_m, k, heading_deg, length_m, width_m)
+
+
+@app.get("/db_points")
+async def db_points():
+    """Wie api.db_points, aber nicht-blockierend."""
+    if api.SERVING_MODE in ("memory", "mmap") and api.SNAPSHOT is not None:
+        return await asyncio.to_thread(api.db_points)
+    rows = await with_timeout(fetch_rows("db_points", DB_POINTS_SQL, primary=True))
+    return api.points_payload(rows)
+
+
+class Position(BaseModel):
+    lat: float
+    lon: float
+
+
+class RoadStateBatch(BaseModel):
+    points: List[Position]
+    radius_m: int = Field(50, ge=0, le=api.MAX_RADIUS_M)
+
+
+@app.post("/snapshot/reload")
+async def snapshot_reload():
+    return await asyncio.to_thread(api.snapshot_reload)
+
+
+@app.post("/route_cost")
+async def route_cost(request: api.RouteCostRequest):
+    """
+    Wie api.route_cost. Die Punkte kommen über den Pool (mit Zeitlimit, die
+    Query wird bei Überschreitung abgebrochen); nur Klassifizierung und
+    Preis laufen danach in einem Thread, ohne DB-Zugriff.
+    """
+    points = api.decode_routes(request)
+    if api.SERVING_MODE in ("memory", "mmap"):
+        index = api.route_index(points, request.max_dist_m)
+    else:
+        rows = await with_timeout(
+            fetch_rows("route_cost", ROAD_STATE_SQL, *api.route_bbox(points, request.max_dist_m)))
+        index = point_index.from_rows(rows)
+    return await asyncio.to_thread(api.price_routes, request, points, index)
+
+
+@app.post("/road_state/batch")
+async def road_state_batch(batch: RoadStateBatch):
+    """
+    Zustand für viele Positionen in einem Request. Die Abfragen laufen
+    parallel über den Pool; Positionen ohne Treffer liefern
+    {"error": ..., "status": 404} statt den ganzen Batch abzubrechen.
+    """
+    if len(batch.points) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Max. {MAX_BATCH_SIZE} Positionen pro Batch")
+
+    async def one(p):
+        try:
+            return await lookup_state(p.lat, p.lon, batch.radius_m)
+        except HTTPException as e:
+            return {"error": e.detail, "status": e.status_code}
+
+    results = await with_timeout(asyncio.gather(*(one(p) for p in batch.points)))
+    return {"results": results}
@@ -0,0 +1,411 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from urllib.parse import quote
+
+import numpy as np
+import requests
+
+import congestion_cache
+import point_index
+import polyline
+import show_route2
+import timing
+from road_states import STATE_NAMES
+from route_pricing import price_route
+
+# ============================================================
+# Batch-Preisberechnung für viele Fahrten (Start/Ziel-Matrix)
+# ============================================================
+#
+#   python batch_pricing.py trips.csv results.csv --workers 16
+#
+# trips.csv: trip_id, origin, destination [, waypoints]
+#   - origin/destination: Adresse ODER "lat,lon"
+#   - waypoints (optional): Zwischenstopps, getrennt mit "|"
+#
+# Ablauf:
+#   1. alle Adressen einmalig geocoden (dedupliziert, Cache-Datei)
+#   2. Routen parallel bei OSRM anfragen (max. --workers gleichzeitig,
+#      gleiche Wegpunktfolgen nur einmal)
+#   3. jede Route gegen EINEN gemeinsamen PointIndex klassifizieren und
+#      bepreisen (route_pricing.price_route)
+#   4. Ergebniszeile sofort an results.csv anhängen
+#
+# Verkehr: OSRM liefert keine Verkehrslage. Mit --congestion-cache werden
+# die Verkehrsklassen je Segment aus dem historischen Cache
+# (congestion_cache.py) zur Abfahrtszeit --depart genommen.
+#
+# Wird der Lauf abgebrochen, überspringt ein erneuter Start alle trip_ids,
+# die bereits mit status=ok in results.csv stehen. Fehlerzeilen früherer
+# Läufe werden dabei aus results.csv entfernt (die Fahrten laufen neu).
+#
+# Umgebung: MAPBOX_ACCESS_TOKEN (nur nötig, wenn Adressen statt "lat,lon"
+# vorkommen) und OSRM_BASE_URL (eigener OSRM-Server). Ohne OSRM_BASE_URL
+# wird der öffentliche Demo-Server benutzt, der Anfragen begrenzt: dann
+# routet nur ein Worker, mit Backoff bei 429/5xx.
+
+MAPBOX_ACCESS_TOKEN = os.getenv("MAPBOX_ACCESS_TOKEN")
+OSRM_DEMO_URL = "http://router.project-osrm.org"
+OSRM_BASE_URL = os.getenv("OSRM_BASE_URL", OSRM_DEMO_URL)
+
+# Wiederholungen bei 429/5xx (Wartezeit verdoppelt sich, Retry-After hat Vorrang)
+ROUTE_RETRIES = 4
+ROUTE_BACKOFF_S = 1.0
+
+DEFAULT_HEADERS = {
+    "User-Agent": "MalikRoadProject/1.0"
+}
+
+# Preise wie in der GUI (Standardwerte in LAT_LON_2.py / LAT_LON_2_copy.py)
+DEFAULT_PRICES = {
+    "VERY GOOD": 0.40, "GOOD": 0.50, "FAIR": 0.70, "POOR": 0.80,
+    "VERY POOR": 0.90, "NOT MEASURED": 0.30,
+}
+
+MAX_MATCH_DISTANCE_M = 50.0
+
+GEOCODE_CACHE_FILE = "geocode_cache.json"
+
+RESULT_COLUMNS = (
+    ["trip_id", "origin", "destination", "status", "dist_km", "cost", "vertices"]
+    + [f"km_{s}" for s in STATE_NAMES]
+    + [f"cost_{s}" for s in STATE_NAMES]
+    + ["error"]
+)
+
+
+# ============================================================
+# Eingabe / Fortsetzen
+# ============================================================
+def read_trips(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        trips = []
+        for row in csv.DictReader(f):
+            stops = [row["origin"].strip()]
+            if row.get("waypoints"):
+                stops += [w.strip() for w in row["waypoints"].split("|") if w.strip()]
+            stops.append(row["destination"].strip())
+            trips.append({"trip_id": row["trip_id"], "origin": row["origin"],
+                          "destination": row["destination"], "stops": stops})
+    return trips
+
+
+def done_trip_ids(path):
+    """
+    trip_ids, die in einem früheren Lauf schon erfolgreich waren. Fehlerzeilen
+    werden dabei aus der Datei entfernt: die Fahrten laufen erneut und
+    schreiben ihr neues Ergebnis, sonst stünde jeder Fehler nach jedem
+    Fortsetzen noch einmal in der Datei.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    ok_rows = [row for row in rows if row.get("status") == "ok"]
+
+    if len(ok_rows) < len(rows):
+        tmp = path + ".tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(ok_rows)
+        os.replace(tmp, path)
+    return {row["trip_id"] for row in ok_rows}
+
+
+# ============================================================
+# Geocoding (dedupliziert + Cache-Datei)
+# ============================================================
+def parse_latlon(text):
+    """'50.11,8.68' -> (50.11, 8.68), sonst None."""
+    parts = text.split(",")
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
+def geocode_address_to_latlon(session, address):
+    url = (
+        f"https://api.mapbox.com/geocoding/v5/mapbox.places/"
+        f"{quote(address)}.json?access_token={MAPBOX_ACCESS_TOKEN}&limit=1"
+    )
+    resp = session.get(url, headers=DEFAULT_HEADERS, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+
+    if not data.get("features"):
+        raise ValueError(f"Keine Koordinaten gefunden für: {address}")
+
+    lon, lat = data["features"][0]["center"]
+    return lat, lon
+
+
+def geocode_all(trips, pool, cache_file):
+    """
+    Alle Adressen aller Fahrten geocoden. Jede Adresse nur einmal, Ergebnisse
+    landen in cache_file und werden beim nächsten Lauf wiederverwendet.
+    Rückgabe: {adresse: (lat, lon)} (fehlgeschlagene Adressen fehlen).
+    """
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, encoding="utf-8") as f:
+            cache = {k: tuple(v) for k, v in json.load(f).items()}
+
+    todo = set()
+    for trip in trips:
+        for stop in trip["stops"]:
+            latlon = parse_latlon(stop)
+            if latlon is not None:
+                cache[stop] = latlon
+            elif stop not in cache:
+                todo.add(stop)
+
+    if todo and not MAPBOX_ACCESS_TOKEN:
+        raise RuntimeError(f"MAPBOX_ACCESS_TOKEN ist nicht gesetzt, {len(todo)} Adressen "
+                           "können nicht geocodet werden (ohne Token nur \"lat,lon\").")
+
+    timing.count("geocode_requests", len(todo))
+    session = requests.Session()
+    futures = {pool.submit(geocode_address_to_latlon, session, a): a for a in todo}
+    for fut, address in futures.items():
+        try:
+            cache[address] = fut.result()
+        except Exception as e:
+            print(f"Geocoding fehlgeschlagen: {address}: {e}")
+
+    if cache_file and todo:
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+    return cache
+
+
+# ============================================================
+# Routing (OSRM)
+# ============================================================
+def osrm_route(session, waypoints):
+    """Route über alle Wegpunkte [(lat, lon), ...] -> Array (n, 2) mit [lat, lon]."""
+    coordinates_str = ";".join(f"{lon},{lat}" for lat, lon in waypoints)
+    url = (
+        f"{OSRM_BASE_URL}/route/v1/driving/{coordinates_str}"
+        "?overview=full&geometries=polyline6"
+    )
+    for attempt in range(ROUTE_RETRIES + 1):
+        resp = session.get(url, headers=DEFAULT_HEADERS, timeout=30)
+        if (resp.status_code != 429 and resp.status_code < 500) or attempt == ROUTE_RETRIES:
+            break
+        retry_after = resp.headers.get("Retry-After", "")
+        time.sleep(float(retry_after) if retry_after.isdigit() else ROUTE_BACKOFF_S * 2 ** attempt)
+    resp.raise_for_status()
+    data = resp.json()
+
+    if not data.get("routes"):
+        raise ValueError("Keine Route von OSRM gefunden.")
+
+    return polyline.decode(data["routes"][0]["geometry"])
+
+
+# ============================================================
+# Gemeinsamer Punktindex
+# ============================================================
+def load_index(index_file=None):
+    """PointIndex aus einer mmap-Datei (build_point_index.py) oder über /db_points."""
+    if index_file:
+        return point_index.load(index_file)
+
+    db_points = show_route2.load_db_points()
+    n = len(db_points)
+    return point_index.PointIndex(
+        [p["lat"] for p in db_points],
+        [p["lon"] for p in db_points],
+        [p["code"] for p in db_points],
+        np.full(n, np.nan, dtype="float32"),
+    )
+
+
+def price_trip(trip, route_coords, index, price_per_km, max_dist_m,
+               traffic_multipliers=None, traffic_cache=None, depart=None):
+    codes = index.segment_codes(route_coords[:, 0], route_coords[:, 1], max_dist_m).tolist()
+
+    # Preis/Cache arbeiten segmentweise in Python -> einmal in eine Liste
+    coords = route_coords.tolist()
+    # OSRM liefert keine Verkehrsdaten -> historischer Cache oder "unknown"
+    congestion = congestion_cache.route_congestion(coords, None, traffic_cache, depart)
+    total_cost, total_dist_km, breakdown, _ = price_route(
+        coords, codes, congestion, price_per_km, traffic_multipliers)
+
+    row = {
+        "trip_id": trip["trip_id"], "origin": trip["origin"], "destination": trip["destination"],
+        "status": "ok", "dist_km": round(total_dist_km, 4), "cost": round(total_cost, 4),
+        "vertices": len(route_coords), "error": "",
+    }
+    for state in STATE_NAMES:
+        part = breakdown.get(state, {"dist_km": 0.0, "cost": 0.0})
+        row[f"km_{state}"] = round(part["dist_km"], 4)
+        row[f"cost_{state}"] = round(part["cost"], 4)
+    return row
+
+
+def error_row(trip, message):
+    return {"trip_id": trip["trip_id"], "origin": trip["origin"],
+            "destination": trip["destination"], "status": "error", "error": message}
+
+
+# ============================================================
+# Hauptablauf
+# ============================================================
+def run(trips_csv, results_csv, price_per_km, workers=8, max_dist_m=MAX_MATCH_DISTANCE_M,
+        index_file=None, cache_file=GEOCODE_CACHE_FILE, traffic_multipliers=None,
+        traffic_cache=None, depart=None):
+    trips = read_trips(trips_csv)
+    done = done_trip_ids(results_csv)
+    trips = [t for t in trips if t["trip_id"] not in done]
+    print(f"{len(done)} Fahrten bereits erledigt, {len(trips)} offen.")
+    if not trips:
+        return {"trips": 0}
+
+    # Demo-Server begrenzt Anfragen -> dort nur ein Routing-Worker
+    route_workers = workers
+    if OSRM_BASE_URL.rstrip("/") == OSRM_DEMO_URL and workers > 1:
+        print(f"OSRM_BASE_URL nicht gesetzt ({OSRM_DEMO_URL}): Routing mit 1 Worker statt {workers}.")
+        route_workers = 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=route_workers) as route_pool:
+        with timing.span("geocode"):
+            coords_by_address = geocode_all(trips, pool, cache_file)
+
+        with timing.span("load_index"):
+            index = load_index(index_file)
+        timing.count("db_points", len(index))
+
+        new_file = not os.path.exists(results_csv)
+        with open(results_csv, "a", newline="", encoding="utf-8") as out:
+            writer = csv.DictWriter(out, fieldnames=RESULT_COLUMNS)
+            if new_file:
+                writer.writeheader()
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=route_workers, pool_maxsize=route_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+
+            routes = {}      # Wegpunktfolge -> Future (gleiche Fahrten nur einmal routen)
+            pending = {}     # Future -> [Fahrten, die darauf warten]
+            max_pending = 4 * route_workers
+            ok = failed = 0
+
+            def write(row):
+                writer.writerow(row)
+                out.flush()
+
+            def drain(block_until):
+                nonlocal ok, failed
+                while len(pending) > block_until:
+                    finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        waiting = pending.pop(fut)
+                        try:
+                            route_coords = fut.result()
+                        except Exception as e:
+                            for trip in waiting:
+                                write(error_row(trip, f"Routing: {e}"))
+                            failed += len(waiting)
+                            continue
+                        with timing.span("price"):
+                            for trip in waiting:
+                                write(price_trip(trip, route_coords, index, price_per_km, max_dist_m,
+                                                 traffic_multipliers, traffic_cache, depart))
+                        ok += len(waiting)
+
+            for trip in trips:
+                missing = [s for s in trip["stops"] if s not in coords_by_address]
+                if missing:
+                    write(error_row(trip, f"Geocoding: {missing[0]}"))
+                    failed += 1
+                    continue
+
+                waypoints = tuple(coords_by_address[s] for s in trip["stops"])
+                fut = routes.get(waypoints)
+                if fut is not None and fut in pending:
+                    pending[fut].append(trip)
+                    continue
+                if fut is not None:
+                    # schon fertig geroutet -> direkt bepreisen
+                    try:
+                        write(price_trip(trip, fut.result(), index, price_per_km, max_dist_m,
+                                         traffic_multipliers, traffic_cache, depart))
+                        ok += 1
+                    except Exception as e:
+                        write(error_row(trip, f"Routing: {e}"))
+                        failed += 1
+                    continue
+
+                fut = route_pool.submit(osrm_route, session, waypoints)
+                routes[waypoints] = fut
+                pending[fut] = [trip]
+                drain(max_pending)
+
+            drain(0)
+
+    elapsed = time.perf_counter() - t0
+    summary = {
+        "trips": ok + failed, "ok": ok, "failed": failed,
+        "routes_requested": len(routes), "elapsed_s": round(elapsed, 2),
+        "trips_per_min": round((ok + failed) / elapsed * 60, 1) if elapsed else None,
+    }
+    timing.count("routes_requested", len(routes))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kosten für viele Fahrten aus einer CSV")
+    parser.add_argument("trips_csv", help="trip_id, origin, destination [, waypoints]")
+    parser.add_argument("results_csv", help="Ergebnis (wird fortgesetzt, falls vorhanden)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="max. gleichzeitige Anfragen (Routing auf dem OSRM-Demo-Server immer 1)")
+    parser.add_argument("--prices", help="JSON-Datei {Zustand: Preis pro km}")
+    parser.add_argument("--max-dist-m", type=float, default=MAX_MATCH_DISTANCE_M)
+    parser.add_argument("--index", help="Punktindex-Datei statt /db_points (build_point_index.py)")
+    parser.add_argument("--geocode-cache", default=GEOCODE_CACHE_FILE)
+    parser.add_argument("--traffic", help="JSON-Datei {Verkehrsklasse: Faktor}")
+    parser.add_argument("--congestion-cache", help="Verkehrs-Cache-Datei (congestion_cache.py)")
+    parser.add_argument("--depart", type=datetime.fromisoformat, default=None,
+                        help="Abfahrtszeit für den Verkehrs-Cache, z. B. 2025-12-01T08:00")
+    args = parser.parse_args()
+
+    price_per_km = dict(DEFAULT_PRICES)
+    if args.prices:
+        with open(args.prices, encoding="utf-8") as f:
+            price_per_km.update(json.load(f))
+
+    traffic_multipliers = None
+    if args.traffic:
+        with open(args.traffic, encoding="utf-8") as f:
+            traffic_multipliers = json.load(f)
+    traffic_cache = None
+    if args.congestion_cache:
+        traffic_cache = congestion_cache.CongestionCache.load(args.congestion_cache)
+
+    with timing.collect("batch_pricing") as t:
+        summary = run(args.trips_csv, args.results_csv, price_per_km, args.workers,
+                      args.max_dist_m, args.index, args.geocode_cache,
+                      traffic_multipliers, traffic_cache, args.depart)
+    print(json.dumps(summary, indent=2))
+    if t is not None:
+        print(json.dumps(t.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import time
+
+import api
+import point_index
+
+# ============================================================
+# Punktindex-Datei für ROAD_STATE_MODE=mmap bauen
+# ============================================================
+#
+# Liest alle Punkte aus api.POINT_TABLE und schreibt SNAPSHOT_FILE neu
+# (atomar per os.replace). Laufende API-Worker mappen die neue Datei
+# beim nächsten Check (SNAPSHOT_CHECK_S) automatisch.
+#
+#   python build_point_index.py --out /var/lib/road_api/points.idx
+#   ROAD_STATE_MODE=mmap SNAPSHOT_FILE=/var/lib/road_api/points.idx \
+#       gunicorn -k uvicorn.workers.UvicornWorker -w 8 api:app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Punktindex-Datei aus track_point(_tile) bauen")
+    parser.add_argument("--out", default=api.SNAPSHOT_FILE, help="Zieldatei")
+    parser.add_argument("--cell-m", type=float, default=point_index.DEFAULT_CELL_M,
+                        help="Kantenlänge einer Rasterzelle in Metern")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    rows = api.fetch_rows("snapshot", api.DB_POINTS_SQL)
+    index = point_index.from_rows(rows, cell_m=args.cell_m, version=time.time())
+    point_index.save(index, args.out)
+
+    print(f"{len(index)} Punkte, {len(index.cell_keys)} Zellen -> {args.out} "
+          f"({time.perf_counter() - t0:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
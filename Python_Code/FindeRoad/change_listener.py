@@ -0,0 +1,135 @@
+import json
+import logging
+import select
+import threading
+
+# ============================================================
+# Änderungs-Meldungen aus Postgres (LISTEN/NOTIFY)
+# ============================================================
+#
+# Die Trigger aus AWS_Creat/track_point_schema.sql schicken nach jeder
+# Änderung an track_point/track_point_tile ein JSON auf CHANNEL:
+#   {"table": "track_point", "op": "insert", "rows": 120, "version": 42,
+#    "bbox": [min_lat, max_lat, min_lon, max_lon]}      (bbox null = alles)
+# version ist der Datenstand (track_data_version) nach der Änderung; der
+# Trigger zählt ihn einmal pro Transaktion hoch.
+#
+# ChangeListener hält dafür eine eigene Verbindung offen und ruft
+# on_change(changes) auf – mit allen Meldungen, die seit dem letzten Aufruf
+# angekommen sind (ein Import mit vielen Einzel-INSERTs ergibt so einen
+# Aufruf statt tausender). Bricht die Verbindung ab, wird nach retry_s
+# neu verbunden.
+#
+# Zum Testen gegen eine lokale DB (gleiche DB_* Variablen wie api.py):
+#   python change_listener.py
+
+CHANNEL = "track_point_changed"
+
+DEFAULT_RETRY_S = 5.0
+
+logger = logging.getLogger("change_listener")
+
+
+def parse_payload(payload):
+    """NOTIFY-Payload -> dict mit table, op, rows, version, bbox (Tupel oder None)."""
+    data = json.loads(payload)
+    bbox = data.get("bbox")
+    return {
+        "table": data.get("table"),
+        "op": data.get("op"),
+        "rows": data.get("rows"),
+        "version": data.get("version"),
+        "bbox": None if bbox is None else tuple(float(v) for v in bbox),
+    }
+
+
+def bbox_overlaps(a, b):
+    """True, wenn sich die Boxen (min_lat, max_lat, min_lon, max_lon) schneiden."""
+    return a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]
+
+
+def merge_bboxes(bboxes):
+    """Umschließende Box aller bboxes; None, sobald eine davon None (= alles) ist."""
+    merged = None
+    for b in bboxes:
+        if b is None:
+            return None
+        if merged is None:
+            merged = b
+        else:
+            merged = (min(merged[0], b[0]), max(merged[1], b[1]),
+                      min(merged[2], b[2]), max(merged[3], b[3]))
+    return merged
+
+
+class ChangeListener(threading.Thread):
+    def __init__(self, connect, on_change, channel=CHANNEL, retry_s=DEFAULT_RETRY_S):
+        """
+        connect: Funktion, die eine neue psycopg2-Verbindung liefert.
+        on_change: wird im Listener-Thread mit einer Liste von Meldungen aufgerufen.
+        """
+        super().__init__(name="change_listener", daemon=True)
+        self.connect = connect
+        self.on_change = on_change
+        self.channel = channel
+        self.retry_s = retry_s
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning("LISTEN %s unterbrochen: %s", self.channel, e)
+                self._stopping.wait(self.retry_s)
+
+    def _listen(self):
+        conn = self.connect()
+        try:
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {self.channel};")
+            logger.info("LISTEN %s", self.channel)
+
+            while not self._stopping.is_set():
+                # kurzes Timeout, damit stop() zeitnah greift
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                changes = []
+                while conn.notifies:
+                    note = conn.notifies.pop(0)
+                    try:
+                        changes.append(parse_payload(note.payload))
+                    except (ValueError, TypeError):
+                        logger.warning("Unbekannte Meldung auf %s: %r", self.channel, note.payload)
+                if changes:
+                    try:
+                        self.on_change(changes)
+                    except Exception:
+                        logger.exception("Fehler beim Verarbeiten von %d Meldungen", len(changes))
+        finally:
+            conn.close()
+
+
+def main():
+    import api
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    def show(changes):
+        for change in changes:
+            print(json.dumps(change))
+
+    listener = ChangeListener(api.get_db_connection, show)
+    listener.start()
+    try:
+        listener.join()
+    except KeyboardInterrupt:
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
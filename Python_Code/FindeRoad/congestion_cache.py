@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import struct
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+# ============================================================
+# Historischer Verkehrs-Cache pro Kante und Zeitfenster
+# ============================================================
+#
+# Jede Route mit Mapbox-"congestion"-Annotation wird hier mitgeschrieben:
+# pro Kante (Hash aus Start- und Endkoordinate, fahrtrichtungsabhängig)
+# und Zeitfenster (Wochentag + Uhrzeit, Standard 30 min) ein Zähler je
+# Verkehrsklasse. Ältere Beobachtungen verlieren exponentiell an Gewicht
+# (Halbwertszeit), die Anzahl Einträge ist begrenzt (am längsten nicht
+# aktualisierte fliegen raus).
+#
+# Später kann die Preisberechnung die Verkehrsklasse pro Segment aus dem
+# Cache lesen, ohne Mapbox "driving-traffic" erneut zu fragen.
+
+# Verkehrsklassen wie in der Mapbox-Annotation "congestion"
+CONGESTION_CLASSES = ("unknown", "low", "moderate", "heavy", "severe")
+
+CACHE_FILE = os.getenv("CONGESTION_CACHE_FILE", "congestion_cache.json")
+
+DEFAULT_BUCKET_MIN = 30
+DEFAULT_HALF_LIFE_DAYS = 28.0
+DEFAULT_MAX_ENTRIES = 200_000
+
+# Mindestgewicht, ab dem ein Eintrag als Aussage gilt
+MIN_WEIGHT = 0.5
+
+# Rundung der Koordinaten für den Kanten-Hash (1e-5° ≈ 1 m)
+EDGE_PRECISION = 5
+
+FILE_FORMAT_VERSION = 1
+
+
+def edge_key(p1, p2):
+    """Stabiler Hash (hex) für die gerichtete Kante p1 -> p2, p = (lat, lon)."""
+    scale = 10 ** EDGE_PRECISION
+    packed = struct.pack(
+        "<4q",
+        round(p1[0] * scale), round(p1[1] * scale),
+        round(p2[0] * scale), round(p2[1] * scale),
+    )
+    return hashlib.blake2b(packed, digest_size=8).hexdigest()
+
+
+class CongestionCache:
+    def __init__(self, bucket_min=DEFAULT_BUCKET_MIN, half_life_days=DEFAULT_HALF_LIFE_DAYS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.bucket_min = int(bucket_min)
+        self.half_life_s = half_life_days * 86400.0
+        self.max_entries = int(max_entries)
+        # (edge_key, bucket) -> [letzte Aktualisierung (epoch s), [Gewicht je Klasse]]
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --------------------------------------------------------
+    # Zeitfenster / Verfall
+    # --------------------------------------------------------
+    def bucket(self, when):
+        """Zeitfenster-Nummer für datetime when (Wochentag * Fenster pro Tag + Fenster)."""
+        per_day = (24 * 60) // self.bucket_min
+        minute = when.hour * 60 + when.minute
+        return when.weekday() * per_day + minute // self.bucket_min
+
+    def _decay(self, entry, now):
+        age = now - entry[0]
+        if age > 0 and self.half_life_s > 0:
+            factor = 0.5 ** (age / self.half_life_s)
+            entry[1] = [w * factor for w in entry[1]]
+            entry[0] = now
+
+    # --------------------------------------------------------
+    # Schreiben / Lesen
+    # --------------------------------------------------------
+    def record(self, p1, p2, congestion, when=None):
+        """Eine Beobachtung (Verkehrsklasse) für die Kante p1 -> p2 eintragen."""
+        if congestion not in CONGESTION_CLASSES or congestion == "unknown":
+            return
+        when = when or datetime.now()
+        now = when.timestamp()
+        key = (edge_key(p1, p2), self.bucket(when))
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [now, [0.0] * len(CONGESTION_CLASSES)]
+        else:
+            self._decay(entry, now)
+            self._entries.move_to_end(key)
+        entry[1][CONGESTION_CLASSES.index(congestion)] += 1.0
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record_route(self, route_coords, congestion, when=None):
+        """Alle Segmente einer Route mit ihrer Mapbox-Annotation eintragen."""
+        when = when or datetime.now()
+        for i, cong in enumerate(congestion[:len(route_coords) - 1]):
+            self.record(route_coords[i], route_coords[i + 1], cong, when)
+
+    def lookup(self, p1, p2, when=None):
+        """Wahrscheinlichste Verkehrsklasse für p1 -> p2 zum Zeitpunkt when, sonst 'unknown'."""
+        when = when or datetime.now()
+        entry = self._entries.get((edge_key(p1, p2), self.bucket(when)))
+        if entry is None:
+            return "unknown"
+
+        age = max(0.0, time.time() - entry[0])
+        factor = 0.5 ** (age / self.half_life_s) if self.half_life_s > 0 else 1.0
+        weights = entry[1]
+        # bei Gleichstand die stärkere Verkehrsklasse (lieber zu teuer als zu billig)
+        best = max(range(len(weights)), key=lambda i: (weights[i], i))
+        if weights[best] * factor < MIN_WEIGHT:
+            return "unknown"
+        return CONGESTION_CLASSES[best]
+
+    def congestion_for_route(self, route_coords, when=None):
+        """Verkehrsklasse je Segment (gleiches Format wie route_entry['congestion'])."""
+        when = when or datetime.now()
+        return [self.lookup(route_coords[i], route_coords[i + 1], when)
+                for i in range(len(route_coords) - 1)]
+
+    # --------------------------------------------------------
+    # Datei
+    # --------------------------------------------------------
+    def save(self, path=CACHE_FILE):
+        data = {
+            "version": FILE_FORMAT_VERSION,
+            "bucket_min": self.bucket_min,
+            "entries": [[k[0], k[1], round(e[0], 1), [round(w, 4) for w in e[1]]]
+                        for k, e in self._entries.items()],
+        }
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CACHE_FILE, **kwargs):
+        """Cache aus Datei laden; fehlende/inkompatible Datei -> leerer Cache."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(**kwargs)
+
+        if data.get("version") != FILE_FORMAT_VERSION:
+            return cls(**kwargs)
+        kwargs.setdefault("bucket_min", data.get("bucket_min", DEFAULT_BUCKET_MIN))
+        cache = cls(**kwargs)
+        if cache.bucket_min != data.get("bucket_min"):
+            return cache  # andere Fenstergröße: alte Einträge passen nicht
+
+        for key, bucket, updated, weights in data["entries"]:
+            cache._entries[(key, bucket)] = [updated, weights]
+        while len(cache._entries) > cache.max_entries:
+            cache._entries.popitem(last=False)
+        return cache
+
+
+def route_congestion(route_coords, congestion, cache, when=None):
+    """
+    Verkehrsklassen für eine Route, pro Segment: der Live-Wert, wo einer
+    vorhanden ist, sonst (auch für live "unknown") der Wert aus dem Cache.
+    Passt die Live-Liste nicht zur Segmentanzahl, wird nur der Cache
+    verwendet (statt blind nach Index zuzuordnen).
+    """
+    n_seg = len(route_coords) - 1
+    live = congestion if congestion and len(congestion) == n_seg else None
+    if cache is None:
+        return list(live) if live else ["unknown"] * n_seg
+    if live is None:
+        return cache.congestion_for_route(route_coords, when)
+
+    # pro Segment: Live-Wert, nur "unknown" aus dem Cache auffüllen
+    when = when or datetime.now()
+    return [cong if cong != "unknown" else cache.lookup(route_coords[i], route_coords[i + 1], when)
+            for i, cong in enumerate(live)]
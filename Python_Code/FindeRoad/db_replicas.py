@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+
+import psycopg2
+
+import metrics
+
+# ============================================================
+# Lese-Replikate (Round-Robin mit Health-Check und Lag-Grenze)
+# ============================================================
+#
+# Konfiguration per Umgebung, alle übrigen Verbindungsdaten (DB-Name,
+# User, Passwort, SSL) wie beim Primary:
+#   DB_REPLICA_HOSTS=replica1.example.com,replica2.example.com:5433
+#   DB_REPLICA_MAX_LAG_S=10     # Replikate mit mehr Verzögerung werden gemieden
+#   DB_REPLICA_CHECK_S=5        # Abstand der Health-Checks
+#
+# Ein Hintergrund-Thread prüft jedes Replikat (Verbindung + Replikations-
+# Verzögerung). next() verteilt reine Lese-Queries reihum auf die gesunden
+# Replikate; ist keins gesund (oder keins konfiguriert), liefert es None
+# und der Aufrufer nimmt den Primary. Bis zum ersten Check gelten alle
+# Replikate als ungesund, d. h. nach dem Start wird zunächst der Primary
+# verwendet.
+
+DEFAULT_MAX_LAG_S = 10.0
+DEFAULT_CHECK_S = 5.0
+CONNECT_TIMEOUT_S = 2
+
+# Verzögerung in Sekunden; 0, wenn alles Empfangene schon eingespielt ist
+# (sonst wüchse der Wert bei einem ruhigen Primary ohne echte Verzögerung)
+LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+REPLICA_LAG = metrics.Gauge(
+    "road_api_db_replica_lag_seconds", "Replikations-Verzögerung (-1 = nicht erreichbar)", ("replica",))
+REPLICA_HEALTHY = metrics.Gauge(
+    "road_api_db_replica_healthy", "1 = Replikat wird für Lese-Queries genutzt", ("replica",))
+
+logger = logging.getLogger("db_replicas")
+
+
+class Replica:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.healthy = False
+        self.lag_s = None
+
+
+def parse_hosts(spec, base_config):
+    """'host1,host2:5433' -> Liste von Replica mit den übrigen Werten aus base_config."""
+    replicas = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
+        config = dict(base_config, host=host, port=int(port or base_config["port"]))
+        replicas.append(Replica(item, config))
+    return replicas
+
+
+class ReplicaSet:
+    def __init__(self, replicas, max_lag_s=DEFAULT_MAX_LAG_S, check_s=DEFAULT_CHECK_S):
+        self.replicas = list(replicas)
+        self.max_lag_s = max_lag_s
+        self.check_s = check_s
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, base_config):
+        return cls(
+            parse_hosts(os.getenv("DB_REPLICA_HOSTS", ""), base_config),
+            max_lag_s=float(os.getenv("DB_REPLICA_MAX_LAG_S", DEFAULT_MAX_LAG_S)),
+            check_s=float(os.getenv("DB_REPLICA_CHECK_S", DEFAULT_CHECK_S)),
+        )
+
+    def __len__(self):
+        return len(self.replicas)
+
+    # --------------------------------------------------------
+    # Auswahl
+    # --------------------------------------------------------
+    def next(self):
+        """Nächstes gesundes Replikat (Round-Robin) oder None -> Primary verwenden."""
+        with self._lock:
+            n = len(self.replicas)
+            for _ in range(n):
+                replica = self.replicas[self._next % n]
+                self._next += 1
+                if replica.healthy:
+                    return replica
+        return None
+
+    def mark_down(self, replica):
+        """Nach einem Verbindungsfehler bis zum nächsten Check nicht mehr verwenden."""
+        replica.healthy = False
+        REPLICA_HEALTHY.set(0, replica.name)
+
+    # --------------------------------------------------------
+    # Health-Check
+    # --------------------------------------------------------
+    def check(self, replica):
+        try:
+            conn = psycopg2.connect(connect_timeout=CONNECT_TIMEOUT_S, **replica.config)
+            try:
+                cur = conn.cursor()
+                cur.execute(LAG_SQL)
+                lag = float(cur.fetchone()[0] or 0.0)
+            finally:
+                conn.close()
+        except Exception as e:
+            if replica.healthy:
+                logger.warning("Replikat %s nicht erreichbar: %s", replica.name, e)
+            replica.lag_s = None
+            replica.healthy = False
+        else:
+            replica.lag_s = lag
+            replica.healthy = lag <= self.max_lag_s
+
+        REPLICA_LAG.set(-1 if replica.lag_s is None else replica.lag_s, replica.name)
+        REPLICA_HEALTHY.set(1 if replica.healthy else 0, replica.name)
+        return replica.healthy
+
+    def check_all(self):
+        for replica in self.replicas:
+            self.check(replica)
+
+    def start(self):
+        """Health-Check-Thread starten (nur wenn Replikate konfiguriert sind)."""
+        if not self.replicas or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="db_replica_check", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.check_all()
+            self._stopping.wait(self.check_s)
+
+    def status(self):
+        return [
+            {"replica": r.name, "healthy": r.healthy,
+             "lag_s": None if r.lag_s is None else round(r.lag_s, 3)}
+            for r in self.replicas
+        ]
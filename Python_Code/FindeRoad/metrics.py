@@ -0,0 +1,136 @@
+import bisect
+import threading
+
+# ============================================================
+# Minimale Prometheus-Metriken (ohne prometheus_client)
+# ============================================================
+#
+# Counter, Gauge und Histogram mit Labels, Ausgabe im Prometheus-Textformat
+# (Version 0.0.4) über render(). Die Werte liegen in einfachen Dicts und
+# werden unter einem Lock aktualisiert, damit auch die Threadpool-Handler
+# von FastAPI gefahrlos schreiben können.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Standard-Buckets in Sekunden (Request- und DB-Latenz)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Buckets für Zeilenanzahlen
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1_000, 5_000, 10_000, 100_000)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _escape(value, quote=True):
+    """Backslash, Zeilenumbruch (und in Labels ") nach dem Textformat escapen."""
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
+
+
+def _label_str(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, label_values):
+        if len(label_values) != len(self.labels):
+            raise ValueError(f"{self.name}: erwartet Labels {self.labels}")
+        return tuple(label_values)
+
+    def header(self):
+        return [f"# HELP {self.name} {_escape(self.help, quote=False)}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        key = self._key(label_values)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *label_values, amount=1):
+        key = self._key(label_values)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        key = self._key(label_values)
+        with _lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        key = self._key(label_values)
+        idx = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Zähler pro Bucket (nicht kumuliert) + [+Inf], Summe, Anzahl
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = self.header()
+        for key, (counts, total, n) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_str(self.labels, key, ('le', '+Inf'))} {n}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {n}")
+        return lines
+
+
+def render():
+    """Alle registrierten Metriken im Prometheus-Textformat."""
+    with _lock:
+        lines = []
+        for metric in _registry:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,368 @@
+import math
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# ============================================================
+# In-Memory-Punktindex (sortiertes Raster in Metern)
+# ============================================================
+#
+# Alle Messpunkte werden einmal in lokale Meter-Koordinaten (x, y)
+# projiziert (wie latlon_to_xy in show_route2.py) und nach Rasterzelle
+# sortiert. Pro Zelle gibt es einen Offset in die flachen Arrays
+# (CSR-Layout). Eine Abfrage mit Radius r liest nur die Zellen im Umkreis:
+# pro Rasterzeile ein zusammenhängender Bereich -> zwei np.searchsorted.
+
+EARTH_RADIUS_M = 6371000.0
+
+# Kantenlänge einer Rasterzelle in Metern (≈ typischer Suchradius)
+DEFAULT_CELL_M = 50.0
+
+# ------------------------------------------------------------
+# Dateiformat für den gemeinsam genutzten Snapshot (mmap)
+# ------------------------------------------------------------
+# Header (128 Byte, little endian), danach die Arrays direkt hintereinander,
+# jeweils auf 64 Byte ausgerichtet. Alle Worker-Prozesse mappen dieselbe
+# Datei nur lesend; das Betriebssystem hält die Seiten nur einmal im RAM.
+FILE_MAGIC = b"RSPIDX01"
+FILE_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sI4xqqddqqqd")
+_HEADER_SIZE = 128
+_ALIGN = 64
+
+# (Attribut, dtype, Länge: "n" = Punkte, "cells" = belegte Zellen, "cells+1")
+_FILE_ARRAYS = (
+    ("x", "<f8", "n"),
+    ("y", "<f8", "n"),
+    ("lat", "<f8", "n"),
+    ("lon", "<f8", "n"),
+    ("cell_keys", "<i8", "cells"),
+    ("cell_start", "<i8", "cells+1"),
+    ("iri", "<f4", "n"),
+    ("code", "i1", "n"),
+)
+
+
+class PointIndex:
+    """
+    Unveränderlicher Snapshot der Messpunkte.
+
+    Arrays (alle in Zellreihenfolge sortiert):
+        x, y        float64  Meter-Koordinaten
+        lat, lon    float64  Originalkoordinaten
+        code        int8     condition_code
+        iri         float32  IRI (NaN = nicht gemessen)
+    Raster:
+        cell_keys   int64    belegte Zellen, aufsteigend
+        cell_start  int64    Offset der ersten Punktzeile je Zelle (+ Ende)
+    """
+
+    def __init__(self, lat, lon, code, iri, cell_m=DEFAULT_CELL_M, lat0=None, version=None):
+        lat = np.asarray(lat, dtype="float64")
+        lon = np.asarray(lon, dtype="float64")
+        code = np.asarray(code, dtype="int8")
+        iri = np.asarray(iri, dtype="float32")
+
+        self.cell_m = float(cell_m)
+        self.lat0 = float(lat0 if lat0 is not None else (lat.mean() if len(lat) else 0.0))
+        self._cos0 = math.cos(math.radians(self.lat0))
+        self.version = version
+
+        x, y = self.project(lat, lon)
+        if len(x):
+            self.cx_min = int(np.floor(x.min() / self.cell_m))
+            self.cy_min = int(np.floor(y.min() / self.cell_m))
+            self.nx = int(np.floor(x.max() / self.cell_m)) - self.cx_min + 1
+        else:
+            self.cx_min = self.cy_min = 0
+            self.nx = 1
+
+        keys = self._cell_key(x, y)
+        order = np.argsort(keys, kind="stable")
+
+        self.x = x[order]
+        self.y = y[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.code = code[order]
+        self.iri = iri[order]
+
+        sorted_keys = keys[order]
+        self.cell_keys, first = np.unique(sorted_keys, return_index=True)
+        self.cell_start = np.append(first, len(sorted_keys)).astype("int64")
+
+    def __len__(self):
+        return len(self.x)
+
+    # --------------------------------------------------------
+    # Projektion / Raster
+    # --------------------------------------------------------
+    def project(self, lat, lon):
+        """(lat, lon) -> Meter (x, y) relativ zu lat0 (äquirektangular)."""
+        x = EARTH_RADIUS_M * np.radians(lon) * self._cos0
+        y = EARTH_RADIUS_M * np.radians(lat)
+        return x, y
+
+    def _cell_key(self, x, y):
+        cx = np.floor(x / self.cell_m).astype("int64") - self.cx_min
+        cy = np.floor(y / self.cell_m).astype("int64") - self.cy_min
+        return cy * self.nx + cx
+
+    # --------------------------------------------------------
+    # Abfragen
+    # --------------------------------------------------------
+    def candidates(self, lat, lon, radius_m):
+        """Indizes aller Punkte in den Zellen, die den Radius überdecken."""
+        qx = EARTH_RADIUS_M * math.radians(lon) * self._cos0
+        qy = EARTH_RADIUS_M * math.radians(lat)
+        return self._candidates_xy(qx, qy, radius_m)
+
+    def _candidates_xy(self, qx, qy, radius_m):
+        if not len(self.x):
+            return np.empty(0, dtype="int64")
+        # NaN/inf (z. B. leere GPS-Felder) treffen keine Zelle
+        if not (math.isfinite(qx) and math.isfinite(qy) and math.isfinite(radius_m)):
+            return np.empty(0, dtype="int64")
+
+        cx0 = max(int(math.floor((qx - radius_m) / self.cell_m)) - self.cx_min, 0)
+        cx1 = min(int(math.floor((qx + radius_m) / self.cell_m)) - self.cx_min, self.nx - 1)
+        cy0 = int(math.floor((qy - radius_m) / self.cell_m)) - self.cy_min
+        cy1 = int(math.floor((qy + radius_m) / self.cell_m)) - self.cy_min
+        if cx0 > cx1 or cy1 < 0:
+            return np.empty(0, dtype="int64")
+
+        ranges = []
+        for cy in range(max(cy0, 0), cy1 + 1):
+            lo = np.searchsorted(self.cell_keys, cy * self.nx + cx0, side="left")
+            hi = np.searchsorted(self.cell_keys, cy * self.nx + cx1, side="right")
+            if lo < hi:
+                ranges.append((self.cell_start[lo], self.cell_start[hi]))
+
+        if not ranges:
+            return np.empty(0, dtype="int64")
+        if len(ranges) == 1:
+            return np.arange(*ranges[0])
+        return np.concatenate([np.arange(a, b) for a, b in ranges])
+
+    def offsets(self, lat, lon, radius_m):
+        """
+        Ein Index-Zugriff: (Indizes, dx, dy) aller Punkte im Radius, mit dx/dy
+        in Metern relativ zur Abfrageposition (x nach Osten, y nach Norden).
+        """
+        idx = self.candidates(lat, lon, radius_m)
+        if not len(idx):
+            return idx, np.empty(0), np.empty(0)
+
+        qx = EARTH_RADIUS_M * math.radians(lon) * self._cos0
+        qy = EARTH_RADIUS_M * math.radians(lat)
+        dx = self.x[idx] - qx
+        dy = self.y[idx] - qy
+
+        mask = dx * dx + dy * dy <= radius_m * radius_m
+        return idx[mask], dx[mask], dy[mask]
+
+    def within(self, lat, lon, radius_m):
+        """(Indizes, Distanzen in m) aller Punkte im Radius, nach Distanz sortiert."""
+        idx, dx, dy = self.offsets(lat, lon, radius_m)
+        dist = np.hypot(dx, dy)
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def nearest(self, lat, lon, radius_m):
+        """(Index, Distanz) des nächstgelegenen Punkts im Radius oder None."""
+        idx = self.candidates(lat, lon, radius_m)
+        if not len(idx):
+            return None
+
+        qx = EARTH_RADIUS_M * math.radians(lon) * self._cos0
+        qy = EARTH_RADIUS_M * math.radians(lat)
+        dist = np.hypot(self.x[idx] - qx, self.y[idx] - qy)
+
+        k = int(np.argmin(dist))
+        if dist[k] > radius_m:
+            return None
+        return int(idx[k]), float(dist[k])
+
+    def segment_codes(self, lats, lons, max_dist_m):
+        """
+        Schlechtester condition_code je Routensegment (Punkt i -> i+1) über
+        alle Punkte mit Abstand <= max_dist_m zum Segment, -1 wenn keiner.
+        Gleiche Logik wie find_segment_state in show_route2.py, aber pro
+        Segment nur die Rasterzellen um das Segment statt aller Punkte.
+        """
+        lats = np.asarray(lats, dtype="float64")
+        lons = np.asarray(lons, dtype="float64")
+        if len(lats) < 2:
+            return np.full(0, -1, dtype="int16")
+        return self.edge_codes(lats[:-1], lons[:-1], lats[1:], lons[1:], max_dist_m)
+
+    def edge_codes(self, lat1, lon1, lat2, lon2, max_dist_m):
+        """Wie segment_codes, aber für beliebige Einzelstrecken (Arrays gleicher Länge)."""
+        x1s, y1s = self.project(np.asarray(lat1, dtype="float64"), np.asarray(lon1, dtype="float64"))
+        x2s, y2s = self.project(np.asarray(lat2, dtype="float64"), np.asarray(lon2, dtype="float64"))
+        n_seg = len(x1s)
+        codes = np.full(n_seg, -1, dtype="int16")
+        if not n_seg or not len(self.x):
+            return codes
+
+        for i in range(n_seg):
+            x1, y1, x2, y2 = x1s[i], y1s[i], x2s[i], y2s[i]
+            dx, dy = x2 - x1, y2 - y1
+            half = 0.5 * math.hypot(dx, dy)
+
+            # Kreis um die Segmentmitte, der den ganzen Puffer abdeckt
+            idx = self._candidates_xy(x1 + 0.5 * dx, y1 + 0.5 * dy, half + max_dist_m)
+            if not len(idx):
+                continue
+
+            px = self.x[idx] - x1
+            py = self.y[idx] - y1
+            seg_len2 = dx * dx + dy * dy
+            if seg_len2 == 0:
+                dist = np.hypot(px, py)
+            else:
+                t = np.clip((px * dx + py * dy) / seg_len2, 0.0, 1.0)
+                dist = np.hypot(px - t * dx, py - t * dy)
+
+            near = dist <= max_dist_m
+            if near.any():
+                codes[i] = self.code[idx[near]].max()
+
+        return codes
+
+    def point(self, i):
+        """Ein Punkt als Dict im Format von /db_points."""
+        iri = float(self.iri[i])
+        return {
+            "lat": float(self.lat[i]),
+            "lon": float(self.lon[i]),
+            "condition_code": int(self.code[i]),
+            "iri": None if math.isnan(iri) else iri,
+        }
+
+
+def save(index, path):
+    """
+    Schreibt den Index als mmap-fähige Datei. Es wird zuerst in eine
+    temporäre Datei geschrieben und dann per os.replace umbenannt: Leser
+    sehen entweder die alte oder die neue Datei, nie eine halbe.
+    Bereits gemappte alte Dateien bleiben gültig, bis sie freigegeben werden.
+    """
+    n = len(index)
+    n_cells = len(index.cell_keys)
+    header = _HEADER.pack(
+        FILE_MAGIC, FILE_FORMAT_VERSION, n, n_cells,
+        index.cell_m, index.lat0, index.cx_min, index.cy_min, index.nx,
+        float(index.version or 0.0),
+    )
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(_HEADER_SIZE, b"\0"))
+        for name, dtype, _ in _FILE_ARRAYS:
+            pad = -f.tell() % _ALIGN
+            f.write(b"\0" * pad)
+            f.write(np.ascontiguousarray(getattr(index, name), dtype=dtype).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """
+    Mappt eine mit save() geschriebene Datei nur lesend. Die Arrays des
+    zurückgegebenen PointIndex sind Sichten auf die gemappte Datei, es wird
+    nichts kopiert oder neu aufgebaut. ValueError bei falschem Format.
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        stat = os.fstat(f.fileno())
+
+    if len(buf) < _HEADER_SIZE:
+        raise ValueError(f"{path}: Datei zu kurz für einen Punktindex")
+    (magic, fmt, n, n_cells, cell_m, lat0,
+     cx_min, cy_min, nx, version) = _HEADER.unpack_from(buf, 0)
+    if magic != FILE_MAGIC:
+        raise ValueError(f"{path}: kein Punktindex (Magic {magic!r})")
+    if fmt != FILE_FORMAT_VERSION:
+        raise ValueError(f"{path}: Formatversion {fmt}, erwartet {FILE_FORMAT_VERSION}")
+
+    index = PointIndex.__new__(PointIndex)
+    index.cell_m = cell_m
+    index.lat0 = lat0
+    index._cos0 = math.cos(math.radians(lat0))
+    index.cx_min = cx_min
+    index.cy_min = cy_min
+    index.nx = nx
+    index.version = version
+
+    lengths = {"n": n, "cells": n_cells, "cells+1": n_cells + 1}
+    offset = _HEADER_SIZE
+    for name, dtype, length in _FILE_ARRAYS:
+        offset += -offset % _ALIGN
+        count = lengths[length]
+        arr = np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+        setattr(index, name, arr)
+        offset += arr.nbytes
+
+    if offset > len(buf):
+        raise ValueError(f"{path}: Datei unvollständig")
+
+    # Kennung der Datei, um später ein Ersetzen (os.replace) zu erkennen
+    index.file_id = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+    return index
+
+
+def file_id(path):
+    """(Gerät, Inode, mtime) der Datei oder None, wenn sie fehlt."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+
+def from_rows(rows, cell_m=DEFAULT_CELL_M, version=None):
+    """PointIndex aus DB-Zeilen (lat, lon, condition_code, iri)."""
+    n = len(rows)
+    lat = np.empty(n, dtype="float64")
+    lon = np.empty(n, dtype="float64")
+    code = np.zeros(n, dtype="int8")
+    iri = np.full(n, np.nan, dtype="float32")
+
+    for i, (la, lo, c, v) in enumerate(rows):
+        lat[i] = la
+        lon[i] = lo
+        if c is not None:
+            code[i] = c
+        if v is not None:
+            iri[i] = v
+
+    return PointIndex(lat, lon, code, iri, cell_m=cell_m, version=version)
+
+
+def replace_region(index, bbox, rows, version=None):
+    """
+    Neuer PointIndex: alle Punkte von index innerhalb bbox (min_lat, max_lat,
+    min_lon, max_lon, Grenzen eingeschlossen wie bei SQL BETWEEN) werden
+    durch rows (lat, lon, condition_code, iri) ersetzt, der Rest bleibt.
+    Für Teil-Aktualisierungen, ohne alle Punkte neu aus der DB zu lesen.
+    """
+    min_lat, max_lat, min_lon, max_lon = bbox
+    inside = ((index.lat >= min_lat) & (index.lat <= max_lat)
+              & (index.lon >= min_lon) & (index.lon <= max_lon))
+    keep = ~inside
+    fresh = from_rows(rows, cell_m=index.cell_m)
+
+    # lat0 nur übernehmen, wenn alte Punkte bleiben; war der Index leer,
+    # ist lat0 = 0 und muss aus den neuen Punkten berechnet werden
+    lat0 = index.lat0 if keep.any() else None
+    return PointIndex(
+        np.concatenate((index.lat[keep], fresh.lat)),
+        np.concatenate((index.lon[keep], fresh.lon)),
+        np.concatenate((index.code[keep], fresh.code)),
+        np.concatenate((index.iri[keep], fresh.iri)),
+        cell_m=index.cell_m, lat0=lat0, version=version,
+    )
@@ -0,0 +1,70 @@
+import numpy as np
+
+# ============================================================
+# Encoded Polyline (Google-Format, Standard: Genauigkeit 6 = "polyline6")
+# ============================================================
+#
+# OSRM und Mapbox liefern mit geometries=polyline6 die Routengeometrie als
+# einen kompakten String statt als GeoJSON-Koordinatenliste. decode()
+# wandelt ihn ohne Python-Schleife pro Zeichen direkt in ein NumPy-Array
+# (n, 2) mit Spalten lat, lon um.
+#
+# Alle Stellen, die Routen entgegennehmen (show_route2, /route_cost),
+# akzeptieren über as_coords() wahlweise einen solchen String, ein Array
+# oder eine Liste von (lat, lon).
+
+DEFAULT_PRECISION = 6
+
+
+def decode(encoded, precision=DEFAULT_PRECISION):
+    """Encoded Polyline -> float64-Array (n, 2) mit [lat, lon]. ValueError bei defektem String."""
+    if not encoded:
+        return np.empty((0, 2))
+    try:
+        raw = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        raise ValueError("Polyline enthält Nicht-ASCII-Zeichen")
+
+    b = raw.astype(np.int64) - 63
+    if b.min() < 0 or b.max() > 63:
+        raise ValueError("Polyline enthält ungültige Zeichen")
+
+    # Jeder Wert besteht aus 5-Bit-Blöcken; Bit 0x20 = "es folgt noch ein Block"
+    ends = np.flatnonzero((b & 0x20) == 0)
+    if len(ends) == 0 or ends[-1] != len(b) - 1 or len(ends) % 2:
+        raise ValueError("Polyline ist unvollständig")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    if lengths.max() > 7:
+        raise ValueError("Polyline enthält zu große Werte")
+
+    pos = np.arange(len(b)) - np.repeat(starts, lengths)
+    values = np.add.reduceat((b & 0x1F) << (5 * pos), starts)
+
+    # ZigZag: niedrigstes Bit = Vorzeichen
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10.0 ** precision
+
+
+def encode(coords, precision=DEFAULT_PRECISION):
+    """[(lat, lon), ...] bzw. Array (n, 2) -> Encoded Polyline."""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    scaled = np.round(coords * 10.0 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    out = []
+    for v in values.tolist():
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+def as_coords(value, precision=DEFAULT_PRECISION):
+    """Route als float64-Array (n, 2) [lat, lon]: aus Polyline-String, Array oder Liste."""
+    if isinstance(value, str):
+        return decode(value, precision)
+    coords = np.asarray(value, dtype=np.float64)
+    return coords.reshape(-1, 2)
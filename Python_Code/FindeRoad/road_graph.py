@@ -0,0 +1,405 @@
+import argparse
+import csv
+import heapq
+import json
+import math
+
+import numpy as np
+
+import point_index
+from congestion_cache import CONGESTION_CLASSES
+from road_states import NOT_MEASURED, STATE_NAMES
+from route_pricing import price_route
+
+# ============================================================
+# Lokaler Straßengraph + kostenoptimales Routing (offline)
+# ============================================================
+#
+# Bauen (aus gesammelten Routen-Geometrien, z. B. route_*.csv mit lat/lon):
+#   python road_graph.py build route_*.csv --index points.idx --out graph.npz
+#
+# Routen (billigste Route nach Zustand + Verkehr, nicht die schnellste):
+#   python road_graph.py route --graph graph.npz --start 50.14,8.67 --dest 50.17,8.66
+#
+# Knoten sind Routenpunkte, auf ~1 m gerundet (gleiche Kreuzung aus
+# verschiedenen Routen -> gleicher Knoten). Kanten sind ungerichtet und
+# liegen im CSR-Format vor: die Nachbarn von Knoten u stehen in
+# indices[indptr[u]:indptr[u+1]], mit Kantennummer edge[...].
+#
+# Kantengewicht = Länge_km * price_per_km[Zustand] * traffic_multipliers[Verkehr]
+# und wird erst pro Anfrage aus den Preistabellen berechnet (ein NumPy-Ausdruck).
+# Ungemessene Kanten (NOT MEASURED, Preis in der GUI am billigsten) gehen
+# für die Suche mindestens mit dem Preis von UNMEASURED_ROUTING_STATE ein,
+# sonst würde die billigste Route gezielt über Straßen ohne Messung führen.
+# Die ausgewiesenen Kosten der Route rechnet price_route weiter mit der
+# Preistabelle.
+
+# Rundung der Koordinaten für das Zusammenführen von Knoten (1e-5° ≈ 1 m)
+NODE_PRECISION = 5
+
+MAX_MATCH_DISTANCE_M = 50.0
+
+UNMEASURED_ROUTING_STATE = "FAIR"
+
+
+class RoadGraph:
+    """
+    Knoten:  lat, lon            float64
+    Kanten:  u, v                int32    (Knoten je Kante, ungerichtet)
+             length_km           float64
+             code                int8     condition_code (0 = NOT MEASURED)
+             cong                int8     Index in CONGESTION_CLASSES
+    CSR:     indptr              int64    len = Knoten + 1
+             indices             int32    Nachbarknoten
+             edge                int32    Kantennummer zu indices
+    """
+
+    def __init__(self, lat, lon, u, v, length_km, code, cong):
+        self.lat = np.asarray(lat, dtype="float64")
+        self.lon = np.asarray(lon, dtype="float64")
+        self.u = np.asarray(u, dtype="int32")
+        self.v = np.asarray(v, dtype="int32")
+        self.length_km = np.asarray(length_km, dtype="float64")
+        self.code = np.asarray(code, dtype="int8")
+        self.cong = np.asarray(cong, dtype="int8")
+        self._build_csr()
+
+    def _build_csr(self):
+        n_nodes = len(self.lat)
+        n_edges = len(self.u)
+        src = np.concatenate([self.u, self.v])
+        dst = np.concatenate([self.v, self.u])
+        edge = np.concatenate([np.arange(n_edges), np.arange(n_edges)]).astype("int32")
+
+        order = np.argsort(src, kind="stable")
+        self.indices = dst[order].astype("int32")
+        self.edge = edge[order]
+        self.indptr = np.zeros(n_nodes + 1, dtype="int64")
+        np.cumsum(np.bincount(src, minlength=n_nodes), out=self.indptr[1:])
+
+    def __len__(self):
+        return len(self.lat)
+
+    # --------------------------------------------------------
+    # Speichern / Laden
+    # --------------------------------------------------------
+    def save(self, path):
+        np.savez_compressed(
+            path, lat=self.lat, lon=self.lon, u=self.u, v=self.v,
+            length_km=self.length_km, code=self.code, cong=self.cong,
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["lat"], data["lon"], data["u"], data["v"],
+                   data["length_km"], data["code"], data["cong"])
+
+    # --------------------------------------------------------
+    # Gewichte / Suche
+    # --------------------------------------------------------
+    def edge_weights(self, price_per_km, traffic_multipliers=None):
+        """
+        Kosten je Kante in € (gleiche Regeln wie route_pricing.price_route),
+        ungemessene Kanten mindestens zum Preis von UNMEASURED_ROUTING_STATE.
+        """
+        if traffic_multipliers is None:
+            traffic_multipliers = {"unknown": 1.0}
+        prices = np.array([price_per_km.get(s, 0.0) for s in STATE_NAMES], dtype="float64")
+        prices[NOT_MEASURED] = max(prices[NOT_MEASURED], price_per_km.get(UNMEASURED_ROUTING_STATE, 0.0))
+        factors = np.array([traffic_multipliers.get(c, 1.0) for c in CONGESTION_CLASSES], dtype="float64")
+        return self.length_km * prices[self.code] * factors[self.cong]
+
+    def nearest_node(self, lat, lon):
+        """(Knoten, Abstand in m) des nächstgelegenen Knotens."""
+        cos0 = math.cos(math.radians(lat))
+        dx = np.radians(self.lon - lon) * cos0
+        dy = np.radians(self.lat - lat)
+        d2 = dx * dx + dy * dy
+        node = int(np.argmin(d2))
+        return node, float(math.sqrt(d2[node]) * point_index.EARTH_RADIUS_M)
+
+    def path_coords(self, nodes):
+        return [(float(self.lat[n]), float(self.lon[n])) for n in nodes]
+
+
+# ============================================================
+# Graph bauen
+# ============================================================
+def read_route_csv(path):
+    """Routen-CSV mit Spalten lat, lon (z. B. route_YYYYMMDD_HHMMSS.csv)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(float(r["lat"]), float(r["lon"])) for r in csv.DictReader(f)]
+
+
+def build_graph(polylines, index=None, max_dist_m=MAX_MATCH_DISTANCE_M, congestion=None):
+    """
+    Graph aus Polylinien [(lat, lon), ...]. congestion (optional): pro
+    Polylinie eine Liste mit einer Verkehrsklasse je Segment.
+    Zustands-Codes der Kanten kommen aus index (PointIndex), sonst 0.
+    """
+    lat = np.concatenate([np.asarray(p, dtype="float64")[:, 0] for p in polylines if len(p) >= 2])
+    lon = np.concatenate([np.asarray(p, dtype="float64")[:, 1] for p in polylines if len(p) >= 2])
+
+    # Knoten: gerundete Koordinaten zusammenführen
+    scale = 10 ** NODE_PRECISION
+    keys = np.round(lat * scale).astype("int64") * (360 * scale) + np.round(lon * scale).astype("int64")
+    uniq, first, node_of = np.unique(keys, return_index=True, return_inverse=True)
+
+    # Segmente i -> i+1 innerhalb jeder Polylinie
+    u_list, v_list, cong_list = [], [], []
+    offset = 0
+    for p_idx, p in enumerate(polylines):
+        n = len(p)
+        if n < 2:
+            continue
+        nodes = node_of[offset:offset + n]
+        u_list.append(nodes[:-1])
+        v_list.append(nodes[1:])
+        classes = np.zeros(n - 1, dtype="int8")
+        if congestion and p_idx < len(congestion) and congestion[p_idx]:
+            for i, c in enumerate(congestion[p_idx][:n - 1]):
+                if c in CONGESTION_CLASSES:
+                    classes[i] = CONGESTION_CLASSES.index(c)
+        cong_list.append(classes)
+        offset += n
+
+    u = np.concatenate(u_list)
+    v = np.concatenate(v_list)
+    cong = np.concatenate(cong_list)
+
+    # Schleifen raus, doppelte Kanten (auch in Gegenrichtung) nur einmal
+    keep = u != v
+    u, v, cong = u[keep], v[keep], cong[keep]
+    a, b = np.minimum(u, v), np.maximum(u, v)
+    _, edge_first = np.unique(a.astype("int64") * len(uniq) + b, return_index=True)
+    u, v, cong = a[edge_first], b[edge_first], cong[edge_first]
+
+    node_lat = lat[first]
+    node_lon = lon[first]
+    length_km = _haversine_km(node_lat[u], node_lon[u], node_lat[v], node_lon[v])
+
+    if index is not None:
+        code = index.edge_codes(node_lat[u], node_lon[u], node_lat[v], node_lon[v], max_dist_m)
+        code = np.where(code < 0, 0, code)
+    else:
+        code = np.zeros(len(u), dtype="int8")
+
+    return RoadGraph(node_lat, node_lon, u, v, length_km, code, cong)
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 6371.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+# ============================================================
+# Suche
+# ============================================================
+def _unpack(graph, weights):
+    # Python-Listen sind in der inneren Schleife deutlich schneller als NumPy-Skalare
+    return graph.indptr.tolist(), graph.indices.tolist(), graph.edge.tolist(), weights.tolist()
+
+
+def bidirectional_dijkstra(graph, weights, source, target):
+    """
+    Billigster Weg von source nach target (Knotennummern).
+    Rückgabe: (Kosten, Knotenliste, Kantenliste) oder None, wenn nicht verbunden.
+    """
+    if source == target:
+        return 0.0, [source], []
+
+    indptr, indices, edges, w = _unpack(graph, weights)
+    dist = ({source: 0.0}, {target: 0.0})
+    prev = ({source: None}, {target: None})      # Knoten -> (Vorgänger, Kante)
+    heaps = ([(0.0, source)], [(0.0, target)])
+    settled = (set(), set())
+    best, meet = math.inf, None
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        d, node = heapq.heappop(heaps[side])
+        if node in settled[side]:
+            continue
+        settled[side].add(node)
+
+        own, other = dist[side], dist[1 - side]
+        for k in range(indptr[node], indptr[node + 1]):
+            nxt = indices[k]
+            nd = d + w[edges[k]]
+            if nd < own.get(nxt, math.inf):
+                own[nxt] = nd
+                prev[side][nxt] = (node, edges[k])
+                heapq.heappush(heaps[side], (nd, nxt))
+            if nxt in other and own[nxt] + other[nxt] < best:
+                best = own[nxt] + other[nxt]
+                meet = nxt
+
+    if meet is None:
+        return None
+
+    nodes, path_edges = [meet], []
+    node = meet
+    while prev[0][node] is not None:
+        node, e = prev[0][node]
+        nodes.append(node)
+        path_edges.append(e)
+    nodes.reverse()
+    path_edges.reverse()
+
+    node = meet
+    while prev[1][node] is not None:
+        node, e = prev[1][node]
+        nodes.append(node)
+        path_edges.append(e)
+
+    return best, nodes, path_edges
+
+
+def astar(graph, weights, source, target):
+    """
+    A* mit Luftlinie * billigstem Preis pro km als Schätzung (unterschätzt
+    nie, daher optimal). Gleiche Rückgabe wie bidirectional_dijkstra.
+    """
+    indptr, indices, edges, w = _unpack(graph, weights)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_km = np.where(graph.length_km > 0, weights / graph.length_km, np.inf)
+    min_per_km = float(per_km.min()) if len(per_km) else 0.0
+    if not math.isfinite(min_per_km):
+        min_per_km = 0.0
+
+    h_all = (_haversine_km(graph.lat, graph.lon, graph.lat[target], graph.lon[target]) * min_per_km).tolist()
+
+    dist = {source: 0.0}
+    prev = {source: None}
+    heap = [(h_all[source], source)]
+    settled = set()
+
+    while heap:
+        _, node = heapq.heappop(heap)
+        if node == target:
+            break
+        if node in settled:
+            continue
+        settled.add(node)
+        d = dist[node]
+        for k in range(indptr[node], indptr[node + 1]):
+            nxt = indices[k]
+            nd = d + w[edges[k]]
+            if nd < dist.get(nxt, math.inf):
+                dist[nxt] = nd
+                prev[nxt] = (node, edges[k])
+                heapq.heappush(heap, (nd + h_all[nxt], nxt))
+
+    if target not in dist:
+        return None
+
+    nodes, path_edges = [target], []
+    node = target
+    while prev[node] is not None:
+        node, e = prev[node]
+        nodes.append(node)
+        path_edges.append(e)
+    nodes.reverse()
+    path_edges.reverse()
+    return dist[target], nodes, path_edges
+
+
+def cheapest_route(graph, start, dest, price_per_km, traffic_multipliers=None, method="bidirectional"):
+    """
+    Billigste Route zwischen zwei (lat, lon). Rückgabe:
+    {"coords", "congestion", "cost", "dist", "breakdown", "priced"} oder None;
+    "priced" ist das Ergebnis von price_route (für show_route2.build_map).
+    """
+    weights = graph.edge_weights(price_per_km, traffic_multipliers)
+    source, _ = graph.nearest_node(*start)
+    target, _ = graph.nearest_node(*dest)
+
+    search = astar if method == "astar" else bidirectional_dijkstra
+    found = search(graph, weights, source, target)
+    if found is None:
+        return None
+
+    _, nodes, path_edges = found
+    coords = graph.path_coords(nodes)
+    codes = graph.code[path_edges].tolist()
+    congestion = [CONGESTION_CLASSES[c] for c in graph.cong[path_edges]]
+    segment_km = graph.length_km[path_edges].tolist()
+
+    priced = price_route(coords, codes, congestion, price_per_km, traffic_multipliers,
+                         segment_km=segment_km)
+    total_cost, total_dist_km, breakdown, _ = priced
+    return {"coords": coords, "congestion": congestion, "cost": total_cost,
+            "dist": total_dist_km, "breakdown": breakdown, "priced": priced}
+
+
+# ============================================================
+# Kommandozeile
+# ============================================================
+def _latlon(text):
+    lat, lon = (float(v) for v in text.split(","))
+    return lat, lon
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler Straßengraph + billigste Route")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Graph aus Routen-CSVs (lat, lon) bauen")
+    p_build.add_argument("routes", nargs="+", help="Routen-CSV-Dateien")
+    p_build.add_argument("--index", help="Punktindex-Datei für die Zustände (build_point_index.py)")
+    p_build.add_argument("--max-dist-m", type=float, default=MAX_MATCH_DISTANCE_M)
+    p_build.add_argument("--out", default="road_graph.npz")
+
+    p_route = sub.add_parser("route", help="billigste Route berechnen")
+    p_route.add_argument("--graph", default="road_graph.npz")
+    p_route.add_argument("--start", type=_latlon, required=True, help="lat,lon")
+    p_route.add_argument("--dest", type=_latlon, required=True, help="lat,lon")
+    p_route.add_argument("--prices", help="JSON-Datei {Zustand: Preis pro km}")
+    p_route.add_argument("--traffic", help="JSON-Datei {Verkehrsklasse: Faktor}")
+    p_route.add_argument("--method", choices=["bidirectional", "astar"], default="bidirectional")
+    p_route.add_argument("--html", help="Karte zusätzlich als HTML speichern")
+
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        polylines = [read_route_csv(p) for p in args.routes]
+        index = point_index.load(args.index) if args.index else None
+        graph = build_graph(polylines, index, args.max_dist_m)
+        graph.save(args.out)
+        print(f"{len(graph)} Knoten, {len(graph.u)} Kanten -> {args.out}")
+        return
+
+    import batch_pricing  # nur für die Standardpreise
+
+    price_per_km = dict(batch_pricing.DEFAULT_PRICES)
+    if args.prices:
+        with open(args.prices, encoding="utf-8") as f:
+            price_per_km.update(json.load(f))
+    traffic_multipliers = None
+    if args.traffic:
+        with open(args.traffic, encoding="utf-8") as f:
+            traffic_multipliers = json.load(f)
+
+    graph = RoadGraph.load(args.graph)
+    route = cheapest_route(graph, args.start, args.dest, price_per_km, traffic_multipliers, args.method)
+    if route is None:
+        print("Keine Verbindung im Graphen gefunden.")
+        return
+
+    print(json.dumps({k: route[k] for k in ("cost", "dist", "breakdown")}, indent=2, ensure_ascii=False))
+
+    if args.html:
+        import show_route2
+
+        m, _ = show_route2.build_map([route], [route["priced"]])
+        m.save(args.html)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# ============================================================
+# Straßenzustände als kleine Integer-Codes
+# ============================================================
+#
+# In der DB (track_point.condition_code, SMALLINT) und in allen Matchern
+# wird nur noch der Code benutzt. Der Code ist gleichzeitig die Priorität:
+# höherer Code = schlechterer Zustand, d.h. "schlechtester Zustand" = max().
+# Namen (für Preise, Farben, Tooltips) werden nur an den Rändern aufgelöst.
+#
+# Reihenfolge muss zu CONDITION_CATEGORIES in Find_IRI/roadlab_reader.py
+# und zum Backfill in AWS_Creat/track_point_schema.sql passen.
+
+STATE_NAMES = (
+    "NOT MEASURED",  # 0
+    "VERY GOOD",     # 1
+    "GOOD",          # 2
+    "FAIR",          # 3
+    "POOR",          # 4
+    "VERY POOR",     # 5
+)
+
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+
+NOT_MEASURED = STATE_CODES["NOT MEASURED"]
+
+# Preistabellen, die einen Zustand nicht kennen (z. B. ältere API-Clients
+# ohne "POOR"), rechnen ihn mit dem Preis dieser Klasse statt mit 0 €
+PRICE_FALLBACK = {"POOR": "VERY POOR"}
+
+
+def state_code(value):
+    """
+    Wandelt einen Zustand (Code oder Name wie 'good') in den Integer-Code um.
+    Nur für Altdaten gedacht, die noch keinen condition_code haben.
+    """
+    if value is None:
+        return NOT_MEASURED
+    if isinstance(value, int):
+        return value
+    return STATE_CODES.get(str(value).strip().upper(), NOT_MEASURED)
+
+
+def state_price(price_per_km, state):
+    """Preis pro km für einen Zustandsnamen, fehlende Klassen über PRICE_FALLBACK."""
+    if state not in price_per_km and state in PRICE_FALLBACK:
+        state = PRICE_FALLBACK[state]
+    return price_per_km.get(state, 0.0)
+
+
+def state_name(code):
+    """Name zum Code, unbekannte Codes -> 'NOT MEASURED'."""
+    if code is None or not 0 <= code < len(STATE_NAMES):
+        return STATE_NAMES[NOT_MEASURED]
+    return STATE_NAMES[code]
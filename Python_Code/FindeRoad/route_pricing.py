@@ -0,0 +1,89 @@
+import math
+
+from road_states import STATE_NAMES, NOT_MEASURED, state_price
+
+# ============================================================
+# Preisberechnung für eine Route
+# ============================================================
+#
+# Gemeinsam genutzt von show_route2.py (Desktop) und api.py (/route_cost).
+# Eingabe sind die Routenpunkte und pro Segment (Punkt i -> i+1) ein
+# Zustands-Code (None/-1 = keine Messpunkte in der Nähe -> NOT MEASURED).
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def segment_lengths_km(route_coords):
+    """Länge jedes Segments (Punkt i -> i+1) in km."""
+    return [
+        haversine_km(route_coords[i][0], route_coords[i][1], route_coords[i + 1][0], route_coords[i + 1][1])
+        for i in range(len(route_coords) - 1)
+    ]
+
+
+def price_route(route_coords, segment_codes, congestion_data, price_per_km, traffic_multipliers=None,
+                segment_km=None):
+    """
+    Kosten einer Route aus den Zustands-Codes ihrer Segmente.
+    segment_km: bereits berechnete Segmentlängen (z. B. aus dem Cache).
+
+    Rückgabe: (total_cost, total_dist_km, breakdown, segments)
+      breakdown: {state: {"dist_km", "cost"}}
+      segments:  pro Segment {"p1", "p2", "state", "cong", "factor", "cost"}
+    """
+    if traffic_multipliers is None:
+        traffic_multipliers = {"unknown": 1.0}
+
+    total_cost = 0.0
+    total_dist_km = 0.0
+    breakdown = {}
+    segments = []
+
+    for i in range(len(route_coords) - 1):
+        lat1, lon1 = route_coords[i]
+        lat2, lon2 = route_coords[i + 1]
+
+        if segment_km is None:
+            dist_km = haversine_km(lat1, lon1, lat2, lon2)
+        else:
+            dist_km = segment_km[i]
+        total_dist_km += dist_km
+
+        # Zustand (Code -> Name nur einmal pro Segment)
+        segment_code = segment_codes[i]
+        if segment_code is None or segment_code < 0:
+            segment_code = NOT_MEASURED
+        segment_state = STATE_NAMES[segment_code]
+
+        base_price = state_price(price_per_km, segment_state)
+
+        # Traffic
+        traffic_factor = 1.0
+        cong_val = "unknown"
+        if congestion_data and i < len(congestion_data):
+            cong_val = congestion_data[i]
+            traffic_factor = traffic_multipliers.get(cong_val, 1.0)
+
+        # Kosten
+        segment_cost = dist_km * base_price * traffic_factor
+        total_cost += segment_cost
+
+        if segment_state not in breakdown: breakdown[segment_state] = {"dist_km": 0.0, "cost": 0.0}
+        breakdown[segment_state]["dist_km"] += dist_km
+        breakdown[segment_state]["cost"] += segment_cost
+
+        segments.append({
+            "p1": (lat1, lon1), "p2": (lat2, lon2),
+            "state": segment_state, "cong": cong_val,
+            "factor": traffic_factor, "cost": segment_cost
+        })
+
+    return total_cost, total_dist_km, breakdown, segments
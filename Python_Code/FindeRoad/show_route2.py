@@ -1,7 +1,14 @@
+import hashlib
 import math
-import folium
 import os
-import requests
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import timing
+from road_states import state_code
+from route_pricing import haversine_km, price_route, segment_lengths_km
 
 # ============================================================
 # API-Konfiguration
@@ -10,7 +17,7 @@ API_BASE_URL = os.getenv("API_BASE_URL", "http://100.25.221.124:8000")
 
 STATE_COLORS = {
     "VERY GOOD": "green", "GOOD": "lightgreen", "FAIR": "orange",
-    "VERY POOR": "red", "NOT MEASURED": "gray",
+    "POOR": "orangered", "VERY POOR": "red", "NOT MEASURED": "gray",
 }
 
 TRAFFIC_COLORS = {
@@ -18,39 +25,133 @@ TRAFFIC_COLORS = {
     "heavy": "#FF0000", "severe": "#8B0000",
 }
 
-STATE_PRIORITY = {
-    "NOT MEASURED": 0, "VERY GOOD": 1, "GOOD": 2, "FAIR": 3, "VERY POOR": 4,
-}
+# Zustände werden intern als Integer-Code geführt (road_states.py):
+# höherer Code = schlechterer Zustand
+
+# Anzahl gecachter Routen-Klassifizierungen (älteste fliegt zuerst raus)
+CLASSIFY_CACHE_SIZE = 128
+
+# So lange gilt ein abgefragter Datenstand (/data_version) ohne neue Anfrage
+DATA_VERSION_TTL_S = 10.0
+
+# folium (mit jinja2/branca) und requests werden erst bei Bedarf importiert:
+# der Import von show_route2 selbst kostet so nur wenige Millisekunden, die
+# GUI kann sofort erscheinen. warm_up() lädt beides im Hintergrund vor.
 
 # ============================================================
 # Hilfsfunktionen (Geometrie & DB)
 # ============================================================
 def load_db_points():
+    """
+    Alle Messpunkte über GET /db_points. Ist die API nicht erreichbar, gibt
+    es einen RuntimeError: mit einer leeren Punktliste wäre sonst jede
+    Route still "NOT MEASURED".
+    """
+    import requests
+
     url = f"{API_BASE_URL}/db_points"
     try:
         resp = requests.get(url, timeout=4)
         resp.raise_for_status()
         raw = resp.json()
-    except Exception:
-        return []
+    except Exception as e:
+        raise RuntimeError(f"DB-Punkte konnten nicht geladen werden ({url}): {e}") from e
 
     db_points = []
     for p in raw:
         try:
             lat = float(p.get("lat") or p.get("lat_matched"))
             lon = float(p.get("lon") or p.get("lon_matched"))
-            state_raw = p.get("state") or p.get("roughness") or "NOT MEASURED"
-            db_points.append({"lat": lat, "lon": lon, "state": str(state_raw).upper()})
+            code = p.get("condition_code")
+            if code is None:
+                # Altes API-Format ohne Code: Text einmalig beim Laden umwandeln
+                code = state_code(p.get("state") or p.get("roughness"))
+            db_points.append({"lat": lat, "lon": lon, "code": int(code)})
         except:
             continue
     return db_points
 
-def choose_worse_state(state1, state2):
-    if state1 is None: return state2
-    if state2 is None: return state1
-    p1 = STATE_PRIORITY.get(state1, 0)
-    p2 = STATE_PRIORITY.get(state2, 0)
-    return state1 if p1 >= p2 else state2
+def load_data_version():
+    """Datenstand der API (GET /data_version) oder None, wenn unbekannt."""
+    import requests
+
+    try:
+        resp = requests.get(f"{API_BASE_URL}/data_version", timeout=2)
+        resp.raise_for_status()
+        return resp.json().get("version")
+    except Exception:
+        return None
+
+# Zuletzt abgefragter Datenstand: (API_BASE_URL, version, Zeitpunkt der Abfrage)
+_data_version_cache = (None, None, None)
+_data_version_lock = threading.Lock()
+
+
+def current_data_version():
+    """
+    Datenstand, höchstens DATA_VERSION_TTL_S alt. Bei einem vollen
+    Cache-Treffer kostet die Klassifizierung so keine HTTP-Anfrage. Ist die
+    API kurz nicht erreichbar, gilt der zuletzt bekannte Stand weiter.
+    """
+    global _data_version_cache
+    with _data_version_lock:
+        base_url, version, fetched_at = _data_version_cache
+        now = time.monotonic()
+        if base_url != API_BASE_URL:
+            version, fetched_at = None, None
+        elif now - fetched_at < DATA_VERSION_TTL_S:
+            return version
+        fresh = load_data_version()
+        if fresh is not None or fetched_at is None:
+            version = fresh
+        _data_version_cache = (API_BASE_URL, version, now)
+        return version
+
+# Zuletzt geladene DB-Punkte, gültig solange sich der Datenstand nicht ändert
+_db_points_cache = (None, None)   # (data_version, db_points)
+_db_points_lock = threading.Lock()
+
+
+def db_points_for(data_version):
+    """
+    DB-Punkte zum Datenstand data_version; bei gleichem Datenstand aus dem
+    Speicher. Läuft gerade ein Laden (z. B. warm_up), wird darauf gewartet
+    statt ein zweites Mal zu laden.
+    """
+    global _db_points_cache
+    with _db_points_lock:
+        version, points = _db_points_cache
+        if data_version is not None and version == data_version:
+            return points
+        points = load_db_points()
+        if data_version is not None and points:
+            _db_points_cache = (data_version, points)
+        return points
+
+
+def warm_up(on_done=None):
+    """
+    Startet einen Hintergrund-Thread, der folium/requests importiert und die
+    DB-Punkte vorlädt. on_done (optional) wird danach im Thread aufgerufen.
+    """
+    def run():
+        try:
+            import folium  # noqa: F401
+            db_points_for(current_data_version())
+        except Exception:
+            pass  # API nicht erreichbar: Fehler kommt bei der ersten Berechnung
+        finally:
+            if on_done is not None:
+                on_done()
+
+    thread = threading.Thread(target=run, name="show_route2-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def choose_worse_state(code1, code2):
+    if code1 is None: return code2
+    if code2 is None: return code1
+    return code1 if code1 >= code2 else code2
 
 def latlon_to_xy(lat, lon, lat0):
     R = 6371000.0
@@ -74,39 +175,233 @@ def point_to_segment_distance_m(lat, lon, lat1, lon1, lat2, lon2, lat0):
     return math.hypot(x - projx, y - projy)
 
 def find_segment_state(lat1, lon1, lat2, lon2, db_points, lat0, max_dist_m):
-    best_state = None
+    """Schlechtester Zustands-Code der DB-Punkte nahe am Segment (oder None)."""
+    best_code = None
     for p in db_points:
         d = point_to_segment_distance_m(p["lat"], p["lon"], lat1, lon1, lat2, lon2, lat0)
         if d <= max_dist_m:
-            best_state = choose_worse_state(best_state, p["state"])
-    return best_state
-
-def haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+            best_code = choose_worse_state(best_code, p["code"])
+    return best_code
 
 # ============================================================
 # HAUPTFUNKTION (Robustere Anzeige)
 # ============================================================
-def show_route_and_cost(routes_data, price_per_km, 
+def show_route_and_cost(routes_data, price_per_km,
                         traffic_multipliers=None,
                         max_dist_m=50.0,
-                        output_html="route_map.html"):
-    
+                        output_html="route_map.html",
+                        return_timings=False,
+                        as_tour=False):
+    """
+    Berechnet Kosten + Karte für alle Routen und gibt results_summary zurück.
+    routes_data: [{"coords": ..., "congestion": [...]}, ...]; coords als Liste
+    (lat, lon), NumPy-Array oder polyline6-String.
+    Die Segment-Klassifizierung wird gecacht (siehe classify_routes); wer
+    nur neu bepreisen will und keine Karte braucht, nimmt price_routes().
+
+    as_tour=True: routes_data sind die Teilstrecken einer Tour (Wegpunkt i ->
+    i+1). Sie werden einzeln klassifiziert (und gecacht) und als eine Route
+    zusammengefasst.
+
+    Mit return_timings=True (oder ROUTE_TIMING=1) wird die Laufzeit pro
+    Abschnitt gemessen (load_db_points, classify, price, render, save) inkl.
+    Zählern; Rückgabe ist dann (results_summary, timings_dict).
+    """
+    owner = timing.current() is None
+    with timing.collect("show_route_and_cost", enabled=True if return_timings else None) as t:
+        results_summary = _show_route_and_cost(
+            routes_data, price_per_km, traffic_multipliers, max_dist_m, output_html, as_tour
+        )
+
+    if t is not None and owner and not return_timings:
+        t.log_json()
+    if return_timings:
+        return results_summary, t.as_dict()
+    return results_summary
+
+
+def route_coords(value):
+    """
+    Routenpunkte als Liste [(lat, lon), ...]. value darf auch ein
+    polyline6-String (geometries=polyline6 bei OSRM/Mapbox) oder ein
+    NumPy-Array (n, 2) sein; Listen werden unverändert zurückgegeben.
+    """
+    if isinstance(value, (list, tuple)):
+        return value
+    import polyline  # NumPy erst bei Bedarf (Kaltstart der GUI)
+
+    return polyline.as_coords(value).tolist()
+
+
+def with_route_coords(routes_data):
+    """routes_data mit coords als Liste (siehe route_coords)."""
+    return [dict(r, coords=route_coords(r['coords'])) for r in routes_data]
+
+
+def classify_route(route_coords, db_points, lat0, max_dist_m):
+    """Zustands-Code (oder None) je Segment der Route."""
+    codes = []
+    for i in range(len(route_coords) - 1):
+        lat1, lon1 = route_coords[i]
+        lat2, lon2 = route_coords[i + 1]
+        segment_code = None
+        if db_points:
+            segment_code = find_segment_state(lat1, lon1, lat2, lon2, db_points, lat0, max_dist_m)
+        codes.append(segment_code)
+    return codes
+
+
+# ============================================================
+# Stufe 1: Segment-Klassifizierung (gecacht)
+# ============================================================
+# Pro Route: Zustands-Code + Länge je Segment. Schlüssel ist der Hash der
+# Geometrie, max_dist_m und der Datenstand der API. Ist der Datenstand
+# unbekannt (ältere API ohne /data_version), wird nicht gecacht.
+_classify_cache = OrderedDict()
+
+
+def route_key(route_coords, max_dist_m, data_version):
+    flat = array("d", (v for point in route_coords for v in point))
+    geometry = hashlib.blake2b(flat.tobytes(), digest_size=16).hexdigest()
+    return (geometry, float(max_dist_m), data_version)
+
+
+def classify_routes(routes_data, max_dist_m):
+    """
+    Gibt pro Route {"codes": [...], "segment_km": [...]} zurück. Nur Routen,
+    die nicht im Cache sind, lösen das Laden der DB-Punkte und die
+    räumliche Suche aus.
+    """
+    routes_data = with_route_coords(routes_data)
+    data_version = current_data_version()
+    keys = [
+        None if data_version is None else route_key(r['coords'], max_dist_m, data_version)
+        for r in routes_data
+    ]
+
+    results = [_classify_cache.get(k) if k is not None else None for k in keys]
+    missing = [i for i, res in enumerate(results) if res is None]
+    timing.count("classify_cache_hits", len(results) - len(missing))
+    for k, res in zip(keys, results):
+        if res is not None:
+            _classify_cache.move_to_end(k)
+    if not missing:
+        return results
+
+    with timing.span("load_db_points"):
+        db_points = db_points_for(data_version)
+    timing.count("db_points", len(db_points))
+
+    for i in missing:
+        route_coords = routes_data[i]['coords']
+        lat0 = sum(lat for lat, _ in route_coords) / len(route_coords)
+
+        with timing.span("classify"):
+            codes = classify_route(route_coords, db_points, lat0, max_dist_m)
+            segment_km = segment_lengths_km(route_coords)
+        timing.count("segments_evaluated", len(codes))
+        timing.count("points_scanned", len(codes) * len(db_points))
+
+        results[i] = {"codes": codes, "segment_km": segment_km}
+        if keys[i] is not None:
+            _classify_cache[keys[i]] = results[i]
+            while len(_classify_cache) > CLASSIFY_CACHE_SIZE:
+                _classify_cache.popitem(last=False)
+
+    return results
+
+
+# ============================================================
+# Stufe 2: Preise (billig, ohne räumliche Suche)
+# ============================================================
+def price_routes(routes_data, price_per_km, traffic_multipliers=None, max_dist_m=50.0):
+    """
+    Kosten aller Routen ohne Karte.
+    Rückgabe: (results_summary, priced_routes) – priced_routes für build_map.
+    """
     if not routes_data:
         raise ValueError("Keine Routendaten übergeben.")
+    routes_data = with_route_coords(routes_data)
 
-    if traffic_multipliers is None:
-        traffic_multipliers = {"unknown": 1.0}
+    classified = classify_routes(routes_data, max_dist_m)
 
-    db_points = load_db_points()
+    results_summary = []
+    priced_routes = []
+    with timing.span("price"):
+        for idx, (route_entry, cls) in enumerate(zip(routes_data, classified)):
+            priced = price_route(route_entry['coords'], cls["codes"], route_entry.get('congestion'),
+                                 price_per_km, traffic_multipliers, segment_km=cls["segment_km"])
+            priced_routes.append(priced)
+
+            total_cost, total_dist_km, breakdown, _ = priced
+            results_summary.append({
+                "name": f"Route {idx+1}",
+                "cost": total_cost,
+                "dist": total_dist_km,
+                "breakdown": breakdown
+            })
+    return results_summary, priced_routes
+
+
+def _show_route_and_cost(routes_data, price_per_km, traffic_multipliers,
+                         max_dist_m, output_html, as_tour=False):
+    routes_data = with_route_coords(routes_data)  # Polylines nur einmal dekodieren
+    _, priced_routes = price_routes(routes_data, price_per_km, traffic_multipliers, max_dist_m)
+    if as_tour:
+        routes_data = [join_legs(routes_data)]
+        priced_routes = [merge_priced(priced_routes)]
+
+    m, results_summary = build_map(routes_data, priced_routes)
 
-    # Karte zentrieren
+    with timing.span("save"):
+        m.save(output_html)
+    if timing.current() is not None:
+        timing.count("bytes_written", os.path.getsize(output_html))
+    return results_summary
+
+
+# ============================================================
+# Touren: Teilstrecken zusammenfassen
+# ============================================================
+def join_legs(legs):
+    """Teilstrecken -> eine Route; der gemeinsame Punkt am Übergang steht nur einmal drin."""
+    coords, congestion = [], []
+    for leg in with_route_coords(legs):
+        leg_coords = leg['coords']
+        if coords and leg_coords and tuple(coords[-1]) == tuple(leg_coords[0]):
+            leg_coords = leg_coords[1:]
+        elif coords and leg_coords:
+            congestion.append("unknown")  # Verbindungssegment zwischen den Teilstrecken
+        coords.extend(leg_coords)
+        congestion.extend(leg.get('congestion') or ["unknown"] * max(len(leg['coords']) - 1, 0))
+    return {"coords": coords, "congestion": congestion}
+
+
+def merge_priced(priced_legs):
+    """Ergebnisse von price_route pro Teilstrecke -> ein Ergebnis für die ganze Tour."""
+    total_cost = 0.0
+    total_dist_km = 0.0
+    breakdown = {}
+    segments = []
+    for leg_cost, leg_dist_km, leg_breakdown, leg_segments in priced_legs:
+        total_cost += leg_cost
+        total_dist_km += leg_dist_km
+        for state, values in leg_breakdown.items():
+            entry = breakdown.setdefault(state, {"dist_km": 0.0, "cost": 0.0})
+            entry["dist_km"] += values["dist_km"]
+            entry["cost"] += values["cost"]
+        segments.extend(leg_segments)
+    return total_cost, total_dist_km, breakdown, segments
+
+
+def build_map(routes_data, priced_routes):
+    """
+    Folium-Karte aus den Ergebnissen von price_route (eins pro Route).
+    Rückgabe: (map, results_summary)
+    """
+    import folium
+
+    routes_data = with_route_coords(routes_data)
     first_route = routes_data[0]['coords']
     avg_lat = sum(lat for lat, _ in first_route) / len(first_route)
     avg_lon = sum(lon for _, lon in first_route) / len(first_route)
@@ -114,95 +409,45 @@ def show_route_and_cost(routes_data, price_per_km,
 
     results_summary = []
 
-    # --- Schritt 1: Erst alles berechnen, DANN Layer erstellen ---
-    # Damit der Name im Menü ("Route 1: 20€") sofort stimmt.
-    
-    for idx, route_entry in enumerate(routes_data):
-        route_coords = route_entry['coords']
-        congestion_data = route_entry['congestion']
-        
-        # --- A. Berechnung ---
-        total_cost = 0.0
-        total_dist_km = 0.0
-        breakdown = {}
-        
-        # Temporäre Liste für Segmente speichern, damit wir nicht 2x rechnen müssen
-        calculated_segments = []
-
-        for i in range(len(route_coords) - 1):
-            lat1, lon1 = route_coords[i]
-            lat2, lon2 = route_coords[i + 1]
-
-            dist_km = haversine_km(lat1, lon1, lat2, lon2)
-            total_dist_km += dist_km
-
-            # Zustand
-            segment_state = None
-            if db_points:
-                segment_state = find_segment_state(lat1, lon1, lat2, lon2, db_points, avg_lat, max_dist_m)
-            if not segment_state: segment_state = "NOT MEASURED"
-
-            base_price = price_per_km.get(segment_state, 0.0)
-
-            # Traffic
-            traffic_factor = 1.0
-            cong_val = "unknown"
-            if congestion_data and i < len(congestion_data):
-                cong_val = congestion_data[i]
-                traffic_factor = traffic_multipliers.get(cong_val, 1.0)
-            
-            # Kosten
-            segment_cost = dist_km * base_price * traffic_factor
-            total_cost += segment_cost
-
-            if segment_state not in breakdown: breakdown[segment_state] = {"dist_km": 0.0, "cost": 0.0}
-            breakdown[segment_state]["dist_km"] += dist_km
-            breakdown[segment_state]["cost"] += segment_cost
-
-            # Daten speichern für Visualisierung gleich
-            calculated_segments.append({
-                "p1": (lat1, lon1), "p2": (lat2, lon2),
-                "state": segment_state, "cong": cong_val,
-                "factor": traffic_factor, "cost": segment_cost
-            })
-
+    for idx, (total_cost, total_dist_km, breakdown, calculated_segments) in enumerate(priced_routes):
         # --- B. Visualisierung (FeatureGroups erstellen) ---
         # Jetzt kennen wir die Gesamtkosten und können den Namen bauen
+        with timing.span("render"):
+            name_prefix = f"Route {idx+1}"
+            label_cond = f"{name_prefix}: Zustand ({total_cost:.2f} € | {total_dist_km:.1f} km)"
+            label_traff = f"{name_prefix}: Verkehr"
         
-        name_prefix = f"Route {idx+1}"
-        label_cond = f"{name_prefix}: Zustand ({total_cost:.2f} € | {total_dist_km:.1f} km)"
-        label_traff = f"{name_prefix}: Verkehr"
-        
-        # Route 1 an, andere aus
-        is_visible = (idx == 0)
-
-        fg_condition = folium.FeatureGroup(name=label_cond, show=is_visible)
-        fg_traffic = folium.FeatureGroup(name=label_traff, show=is_visible)
-
-        for seg in calculated_segments:
-            tooltip_text = (
-                f"<b>{name_prefix}</b><br>"
-                f"Zustand: {seg['state']}<br>"
-                f"Traffic: {seg['cong']} (x{seg['factor']})<br>"
-                f"Abschnitt: {seg['cost']:.2f} €"
-            )
-
-            # Zustand-Linie (Dicker)
-            color_cond = STATE_COLORS.get(seg['state'], "gray")
-            folium.PolyLine(
-                [seg['p1'], seg['p2']],
-                weight=10, color=color_cond, opacity=0.6, tooltip=tooltip_text
-            ).add_to(fg_condition)
-
-            # Traffic-Linie (Dünner)
-            color_traff = TRAFFIC_COLORS.get(seg['cong'], "gray")
-            folium.PolyLine(
-                [seg['p1'], seg['p2']],
-                weight=4, color=color_traff, opacity=1.0, tooltip=tooltip_text
-            ).add_to(fg_traffic)
-
-        fg_condition.add_to(m)
-        fg_traffic.add_to(m)
+            # Route 1 an, andere aus
+            is_visible = (idx == 0)
+
+            fg_condition = folium.FeatureGroup(name=label_cond, show=is_visible)
+            fg_traffic = folium.FeatureGroup(name=label_traff, show=is_visible)
+
+            for seg in calculated_segments:
+                tooltip_text = (
+                    f"<b>{name_prefix}</b><br>"
+                    f"Zustand: {seg['state']}<br>"
+                    f"Traffic: {seg['cong']} (x{seg['factor']})<br>"
+                    f"Abschnitt: {seg['cost']:.2f} €"
+                )
+
+                # Zustand-Linie (Dicker)
+                color_cond = STATE_COLORS.get(seg['state'], "gray")
+                folium.PolyLine(
+                    [seg['p1'], seg['p2']],
+                    weight=10, color=color_cond, opacity=0.6, tooltip=tooltip_text
+                ).add_to(fg_condition)
+
+                # Traffic-Linie (Dünner)
+                color_traff = TRAFFIC_COLORS.get(seg['cong'], "gray")
+                folium.PolyLine(
+                    [seg['p1'], seg['p2']],
+                    weight=4, color=color_traff, opacity=1.0, tooltip=tooltip_text
+                ).add_to(fg_traffic)
+
+            fg_condition.add_to(m)
+            fg_traffic.add_to(m)
+        timing.count("polylines_emitted", 2 * len(calculated_segments))
 
         results_summary.append({
             "name": name_prefix,
@@ -230,6 +475,7 @@ def show_route_and_cost(routes_data, price_per_km,
        <i style="background:green;width:10px;height:10px;float:left;margin-right:5px;border-radius:50%"></i> Very Good<br>
        <i style="background:lightgreen;width:10px;height:10px;float:left;margin-right:5px;border-radius:50%"></i> Good<br>
        <i style="background:orange;width:10px;height:10px;float:left;margin-right:5px;border-radius:50%"></i> Fair<br>
+       <i style="background:orangered;width:10px;height:10px;float:left;margin-right:5px;border-radius:50%"></i> Poor<br>
        <i style="background:red;width:10px;height:10px;float:left;margin-right:5px;border-radius:50%"></i> Very Poor<br>
        <br>
        <b>2. Verkehr (Innere Linie)</b><br>
@@ -241,5 +487,4 @@ def show_route_and_cost(routes_data, price_per_km,
     """
     m.get_root().html.add_child(folium.Element(legend_html))
 
-    m.save(output_html)
-    return results_summary
\ No newline at end of file
+    return m, results_summary
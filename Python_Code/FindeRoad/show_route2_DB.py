@@ -1,8 +1,12 @@
 import math
 import folium
+import numpy as np
 import psycopg2
 from psycopg2 import OperationalError
 import os
+from collections import namedtuple
+
+from road_states import STATE_NAMES, NOT_MEASURED, state_price
 
 # ============================================================
 # DB-Konfiguration
@@ -20,33 +24,77 @@ DB_CONFIG = {
 LAT_COLUMN = "lat_matched"
 LON_COLUMN = "lon_matched"
 
+# track_point oder die verdichtete track_point_tile (gleiche Spaltennamen)
+POINT_TABLE = os.getenv("POINT_TABLE", "track_point")
+
+EARTH_RADIUS_M = 6371000.0
+
+# Zeilen pro fetchmany() des serverseitigen Cursors
+FETCH_SIZE = 10_000
+
+# Routenpunkte pro Bounding Box und max. Anzahl Boxen pro Abfrage
+BOX_POINTS = 200
+MAX_BOXES = 50
+
+# DB-Punkte als Arrays (statt eines Dicts pro Zeile)
+DbPoints = namedtuple("DbPoints", "lat lon code")
+
 # Zustand -> Farbe
 STATE_COLORS = {
     "VERY GOOD": "green",
     "GOOD": "lightgreen",
     "FAIR": "orange",
+    "POOR": "orangered",
     "VERY POOR": "red",
     "NOT MEASURED": "gray",
 }
 
-# „Schlechtere“ Zustände höher priorisieren
-STATE_PRIORITY = {
-    "NOT MEASURED": 0,
-    "VERY GOOD": 1,
-    "GOOD": 2,
-    "FAIR": 3,
-    "VERY POOR": 4,
-}
+# „Schlechtere“ Zustände haben höhere Codes (siehe road_states.py)
 
 
 # ============================================================
 # DB-Punkte laden
 # ============================================================
-def load_db_points():
+def route_bboxes(route_coords, buffer_m, lat0=None):
     """
-    Holt alle (lat, lon, roughness) aus track_point
-    und gibt eine Liste von Dicts zurück.
+    Bounding Boxen (min_lat, max_lat, min_lon, max_lon) für je BOX_POINTS
+    aufeinanderfolgende Routenpunkte, um buffer_m erweitert. Mehrere kleine
+    Boxen statt einer großen: bei langen, schrägen Routen wird so nur der
+    Streifen entlang der Route gelesen. Die Längengrad-Erweiterung nutzt die
+    gleiche Projektion (lat0) wie der Abstand in find_segment_state.
     """
+    n = len(route_coords)
+    if n == 0:
+        return []
+    if lat0 is None:
+        lat0 = sum(lat for lat, _ in route_coords) / n
+
+    dlat = math.degrees(buffer_m / EARTH_RADIUS_M)
+    dlon = math.degrees(buffer_m / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+    step = max(BOX_POINTS, math.ceil(n / MAX_BOXES))
+
+    boxes = []
+    for start in range(0, max(n - 1, 1), step):
+        # ein Punkt Überlappung, damit das Segment an der Nahtstelle abgedeckt ist
+        part = route_coords[start:start + step + 1]
+        lats = [lat for lat, _ in part]
+        lons = [lon for _, lon in part]
+        boxes.append((min(lats) - dlat, max(lats) + dlat, min(lons) - dlon, max(lons) + dlon))
+    return boxes
+
+
+def load_db_points(bboxes=None):
+    """
+    Holt (lat, lon, condition_code) aus POINT_TABLE als DbPoints (Arrays).
+    bboxes: Liste von (min_lat, max_lat, min_lon, max_lon), z. B. aus
+    route_bboxes(); der Filter läuft in SQL. None = alle Punkte.
+    Die Zeilen kommen über einen serverseitigen (benannten) Cursor in
+    Blöcken von FETCH_SIZE, Laufzeit und Speicher hängen also von der
+    Fläche um die Route ab, nicht von der Größe der Tabelle.
+    """
+    if bboxes is not None and not bboxes:
+        return DbPoints(np.empty(0), np.empty(0), np.empty(0, dtype=np.int8))
+
     try:
         conn = psycopg2.connect(**DB_CONFIG)
     except OperationalError as e:
@@ -55,42 +103,54 @@ def load_db_points():
             "Bitte Verbindung/DB-Konfiguration prüfen."
         ) from e
 
-    cur = conn.cursor()
+    box_filter = ""
+    params = []
+    if bboxes is not None:
+        box_filter = "AND (" + " OR ".join(
+            f"({LAT_COLUMN} BETWEEN %s AND %s AND {LON_COLUMN} BETWEEN %s AND %s)"
+            for _ in bboxes
+        ) + ")"
+        params = [v for box in bboxes for v in box]
 
     sql = f"""
-        SELECT {LAT_COLUMN}, {LON_COLUMN}, roughness
-        FROM track_point
+        SELECT {LAT_COLUMN}, {LON_COLUMN}, condition_code
+        FROM {POINT_TABLE}
         WHERE {LAT_COLUMN} IS NOT NULL
           AND {LON_COLUMN} IS NOT NULL
-          AND roughness IS NOT NULL;
+          AND condition_code IS NOT NULL
+          {box_filter};
     """
-    cur.execute(sql)
-
-    db_points = []
-    for lat, lon, roughness in cur.fetchall():
-        db_points.append(
-            {
-                "lat": float(lat),
-                "lon": float(lon),
-                "state": str(roughness).upper(),   # z.B. "VERY GOOD"
-            }
-        )
 
-    cur.close()
-    conn.close()
-
-    return db_points
-
-
-def choose_worse_state(state1, state2):
-    """Gibt den „schlechteren“ der beiden Zustände zurück."""
-    if state1 is None:
-        return state2
-    if state2 is None:
-        return state1
-    p1 = STATE_PRIORITY.get(state1, 0)
-    p2 = STATE_PRIORITY.get(state2, 0)
-    return state1 if p1 >= p2 else state2
+    # benannter Cursor = serverseitig: die DB schickt nur FETCH_SIZE Zeilen auf einmal
+    cur = conn.cursor(name="show_route2_db_points")
+    cur.itersize = FETCH_SIZE
+    chunks = []
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.float64))
+        cur.close()
+    finally:
+        conn.close()
+
+    data = np.concatenate(chunks) if chunks else np.empty((0, 3))
+    return DbPoints(
+        np.ascontiguousarray(data[:, 0]),
+        np.ascontiguousarray(data[:, 1]),
+        data[:, 2].astype(np.int8),   # z.B. 1 = VERY GOOD
+    )
+
+
+def choose_worse_state(code1, code2):
+    """Gibt den „schlechteren“ der beiden Zustands-Codes zurück."""
+    if code1 is None:
+        return code2
+    if code2 is None:
+        return code1
+    return code1 if code1 >= code2 else code2
 
 
 # ============================================================
@@ -137,19 +197,40 @@ def point_to_segment_distance_m(lat, lon, lat1, lon1, lat2, lon2, lat0):
 
 def find_segment_state(lat1, lon1, lat2, lon2, db_points, lat0, max_dist_m):
     """
-    Sucht alle DB-Punkte, die in der Nähe dieses Segments liegen,
-    und gibt den „schlechtesten“ gefundenen Zustand zurück.
+    Sucht alle DB-Punkte (DbPoints), die in der Nähe dieses Segments liegen,
+    und gibt den „schlechtesten“ gefundenen Zustands-Code zurück (oder None).
+    Gleiche Rechnung wie point_to_segment_distance_m, aber für alle Punkte
+    auf einmal; vorher grobe Auswahl über die Box um das Segment.
     """
-    best_state = None
+    dlat = math.degrees(max_dist_m / EARTH_RADIUS_M)
+    dlon = math.degrees(max_dist_m / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+    lat, lon = db_points.lat, db_points.lon
+    near = np.flatnonzero(
+        (lat >= min(lat1, lat2) - dlat) & (lat <= max(lat1, lat2) + dlat)
+        & (lon >= min(lon1, lon2) - dlon) & (lon <= max(lon1, lon2) + dlon)
+    )
+    if len(near) == 0:
+        return None
+
+    cos0 = math.cos(math.radians(lat0))
+    x = EARTH_RADIUS_M * np.radians(lon[near]) * cos0
+    y = EARTH_RADIUS_M * np.radians(lat[near])
+    x1, y1 = latlon_to_xy(lat1, lon1, lat0)
+    x2, y2 = latlon_to_xy(lat2, lon2, lat0)
 
-    for p in db_points:
-        d = point_to_segment_distance_m(
-            p["lat"], p["lon"], lat1, lon1, lat2, lon2, lat0
-        )
-        if d <= max_dist_m:
-            best_state = choose_worse_state(best_state, p["state"])
+    dx = x2 - x1
+    dy = y2 - y1
+    seg_len2 = dx * dx + dy * dy
+    if seg_len2 == 0:
+        t = 0.0
+    else:
+        t = np.clip(((x - x1) * dx + (y - y1) * dy) / seg_len2, 0.0, 1.0)
+    d = np.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
 
-    return best_state
+    hit = near[d <= max_dist_m]
+    if len(hit) == 0:
+        return None
+    return int(db_points.code[hit].max())
 
 
 # ============================================================
@@ -179,6 +260,7 @@ def show_route_and_cost(route_coords, price_per_km, max_dist_m=0.0,
           "VERY GOOD": 0.40,
           "GOOD": 0.50,
           "FAIR": 0.70,
+          "POOR": 0.80,
           "VERY POOR": 0.90,
           "NOT MEASURED": 0.30
         }
@@ -196,16 +278,14 @@ def show_route_and_cost(route_coords, price_per_km, max_dist_m=0.0,
     if not route_coords:
         raise ValueError("Keine Route übergeben.")
 
-    # DB-Punkte (RoadLab/OSRM) laden
-    db_points = load_db_points()
-    if not db_points:
-        # keine DB-Daten -> trotzdem Distanz berechnen, aber alles NOT MEASURED
-        pass
-
-    # Karte zentrieren
+    # Karte zentrieren (avg_lat ist auch die Referenzbreite der Projektion)
     avg_lat = sum(lat for lat, _ in route_coords) / len(route_coords)
     avg_lon = sum(lon for _, lon in route_coords) / len(route_coords)
 
+    # DB-Punkte (RoadLab/OSRM) laden – nur im Streifen max_dist_m um die Route
+    db_points = load_db_points(route_bboxes(route_coords, max_dist_m, avg_lat))
+    # keine DB-Daten -> trotzdem Distanz berechnen, aber alles NOT MEASURED
+
     m = folium.Map(location=[avg_lat, avg_lon], zoom_start=14)
 
     # Basisroute in hellgrau
@@ -232,17 +312,18 @@ def show_route_and_cost(route_coords, price_per_km, max_dist_m=0.0,
         dist_km = haversine_km(lat1, lon1, lat2, lon2)
         total_dist_km += dist_km
 
-        # Zustand aus DB-Punkten in Segmentnähe
-        segment_state = None
-        if db_points:
-            segment_state = find_segment_state(lat1, lon1, lat2, lon2,
-                                               db_points, avg_lat, max_dist_m)
+        # Zustand aus DB-Punkten in Segmentnähe (Code -> Name einmal pro Segment)
+        segment_code = None
+        if len(db_points.lat):
+            segment_code = find_segment_state(lat1, lon1, lat2, lon2,
+                                              db_points, avg_lat, max_dist_m)
 
-        if not segment_state:
-            segment_state = "NOT MEASURED"
+        if segment_code is None:
+            segment_code = NOT_MEASURED
+        segment_state = STATE_NAMES[segment_code]
 
         # Preis + Kosten
-        price = price_per_km.get(segment_state, 0.0)
+        price = state_price(price_per_km, segment_state)
         segment_cost = dist_km * price
         total_cost += segment_cost
 
@@ -301,6 +382,7 @@ def show_route_and_cost(route_coords, price_per_km, max_dist_m=0.0,
        <i style="background: green; width: 12px; height: 12px; float: left; margin-right: 5px;"></i> VERY GOOD<br>
        <i style="background: lightgreen; width: 12px; height: 12px; float: left; margin-right: 5px;"></i> GOOD<br>
        <i style="background: orange; width: 12px; height: 12px; float: left; margin-right: 5px;"></i> FAIR<br>
+       <i style="background: orangered; width: 12px; height: 12px; float: left; margin-right: 5px;"></i> POOR<br>
        <i style="background: red; width: 12px; height: 12px; float: left; margin-right: 5px;"></i> VERY POOR<br>
        <i style="background: gray; width: 12px; height: 12px; float: left; margin-right: 5px;"></i> NOT MEASURED<br>
      </div>
@@ -325,6 +407,7 @@ if __name__ == "__main__":
         "VERY GOOD": 0.40,
         "GOOD": 0.50,
         "FAIR": 0.70,
+        "POOR": 0.80,
         "VERY POOR": 0.90,
         "NOT MEASURED": 0.30,
     }
@@ -0,0 +1,83 @@
+import math
+
+from road_states import state_name
+
+# ============================================================
+# Zustand einer Fahrzeug-Verbindung (/road_state/stream)
+# ============================================================
+#
+# Ein Fahrzeug schickt fortlaufend GPS-Fixes. Statt jeden Fix einzeln in
+# der DB zu suchen, merkt sich die Session einen lokalen PointIndex für die
+# Umgebung (DB-Modus: Quadrat mit halber Kantenlänge area_m um den Fix,
+# der es ausgelöst hat; memory/mmap: der globale Snapshot). Neu geladen
+# wird erst, wenn der Suchkreis das Gebiet verlässt. Zurückgemeldet wird
+# nur, wenn sich der Zustand gegenüber dem letzten Fix ändert.
+
+EARTH_RADIUS_M = 6371000.0
+
+# halbe Kantenlänge des pro Verbindung geladenen Gebiets im DB-Modus
+DEFAULT_AREA_M = 500.0
+
+_UNSET = object()
+
+
+class StreamSession:
+    def __init__(self, radius_m=50, area_m=DEFAULT_AREA_M):
+        self.radius_m = radius_m
+        self.area_m = max(float(area_m), 2.0 * radius_m)
+        self.index = None
+        self.center = None       # (lat, lon) des geladenen Gebiets, None = global
+        self.stale = False       # Gebiet hat sich in der DB geändert -> neu laden
+        self.last_code = _UNSET
+        self.fixes = 0
+        self.area_loads = 0
+
+    def set_index(self, index, center=None):
+        """Neuen Index setzen; center=None heißt: deckt alle Punkte ab."""
+        self.index = index
+        self.center = center
+        self.stale = False
+        self.area_loads += 1
+
+    def invalidate(self):
+        """Geladenes Gebiet verwerfen; der nächste Fix lädt es neu (thread-sicher)."""
+        self.stale = True
+
+    def needs_area(self, lat, lon):
+        """True, wenn der Suchkreis um (lat, lon) nicht im geladenen Gebiet liegt."""
+        if self.index is None or self.stale:
+            return True
+        if self.center is None:
+            return False
+
+        lat0, lon0 = self.center
+        dy = EARTH_RADIUS_M * math.radians(lat - lat0)
+        dx = EARTH_RADIUS_M * math.radians(lon - lon0) * math.cos(math.radians(lat0))
+        limit = self.area_m - self.radius_m
+        return abs(dx) > limit or abs(dy) > limit
+
+    def update(self, lat, lon):
+        """
+        Fix verarbeiten. Gibt die neue Meldung zurück, wenn sich der Zustand
+        geändert hat (beim ersten Fix immer), sonst None.
+        """
+        self.fixes += 1
+        hit = self.index.nearest(lat, lon, self.radius_m)
+
+        if hit is None:
+            code, iri, distance = None, None, None
+        else:
+            p = self.index.point(hit[0])
+            code, iri, distance = p["condition_code"], p["iri"], round(hit[1], 2)
+
+        if code == self.last_code:
+            return None
+        self.last_code = code
+
+        return {
+            "fix": self.fixes,
+            "state": None if code is None else state_name(code),
+            "condition_code": code,
+            "iri": iri,
+            "distance_m": distance,
+        }
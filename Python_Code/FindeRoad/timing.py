@@ -0,0 +1,161 @@
+import contextvars
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+# ============================================================
+# Leichtgewichtige Zeitmessung (Spans + Zähler)
+# ============================================================
+#
+# Verwendung:
+#   with timing.collect() as t:          # Messung starten (z. B. pro Klick/Request)
+#       with timing.span("osrm"):        # Zeit für einen Abschnitt
+#           ...
+#       timing.count("points_scanned", n)
+#   t.as_dict()  /  t.log_json()
+#
+# Ist die Messung abgeschaltet (ROUTE_TIMING nicht "1") oder läuft gerade
+# kein collect(), sind span() und count() praktisch kostenlos: es wird nur
+# eine ContextVar gelesen und ein fertiger Null-Kontext zurückgegeben.
+
+ENABLED = os.getenv("ROUTE_TIMING", "0") == "1"
+
+logger = logging.getLogger("route_timing")
+
+_current = contextvars.ContextVar("route_timing", default=None)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Timings:
+    """Sammelt Dauer pro Span-Name (Summe + Anzahl) und Zähler."""
+
+    def __init__(self, name=""):
+        self.name = name
+        self.spans = {}      # name -> [total_s, calls]
+        self.counters = {}   # name -> int
+        self._t0 = time.perf_counter()
+        self.total_s = None
+
+    def add(self, name, seconds):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        self.total_s = time.perf_counter() - self._t0
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "total_ms": None if self.total_s is None else round(self.total_s * 1000, 3),
+            "spans_ms": {k: round(v[0] * 1000, 3) for k, v in self.spans.items()},
+            "span_calls": {k: v[1] for k, v in self.spans.items()},
+            "counters": dict(self.counters),
+        }
+
+    def log_json(self):
+        """Eine Zeile strukturiertes JSON ins Log (Logger 'route_timing')."""
+        logger.info(json.dumps(self.as_dict(), ensure_ascii=False))
+
+
+class _Span:
+    __slots__ = ("timings", "name", "t0")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+def current():
+    """Aktuell laufende Messung oder None."""
+    return _current.get()
+
+
+def span(name):
+    """Kontextmanager, der die Dauer unter name verbucht (falls gemessen wird)."""
+    t = _current.get()
+    if t is None:
+        return _NULL_SPAN
+    return _Span(t, name)
+
+
+def count(name, n=1):
+    """Zähler erhöhen (falls gemessen wird)."""
+    t = _current.get()
+    if t is not None:
+        t.count(name, n)
+
+
+@contextmanager
+def collect(name="", enabled=None):
+    """
+    Startet eine Messung für den umschlossenen Block. Gibt das Timings-Objekt
+    zurück, oder None wenn die Messung abgeschaltet ist. Verschachtelte
+    collect()-Aufrufe schreiben in die bereits laufende Messung.
+    """
+    if not (ENABLED if enabled is None else enabled):
+        yield None
+        return
+
+    outer = _current.get()
+    if outer is not None:
+        yield outer
+        return
+
+    t = Timings(name)
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        t.finish()
+        _current.reset(token)
+
+
+# ============================================================
+# Startbericht (Kaltstart der GUI)
+# ============================================================
+#
+# Zeitpunkte relativ zum Import dieses Moduls; timing daher als erstes
+# Modul im Startskript importieren. Ausgabe mit ROUTE_TIMING=1 als eine
+# JSON-Zeile, z. B.
+#   {"name": "startup", "marks_ms": {"imports": 12.1, "first_window": 85.4}}
+
+_startup_t0 = time.perf_counter()
+_startup_marks = {}
+
+
+def startup_mark(name):
+    """Zeit seit Programmstart unter name festhalten (in ms)."""
+    _startup_marks[name] = round((time.perf_counter() - _startup_t0) * 1000, 3)
+
+
+def log_startup(name="startup"):
+    """Bisherige Startzeitpunkte als eine JSON-Zeile loggen (falls ENABLED)."""
+    if ENABLED:
+        logger.info(json.dumps({"name": name, "marks_ms": dict(_startup_marks)}, ensure_ascii=False))